@@ -1,27 +1,43 @@
+import asyncio
+import hashlib
+import json
+import logging
 import os
-import getpass
-from langchain_google_genai import ChatGoogleGenerativeAI
-#from langchain_ollama.chat_models import ChatOllama #ollama LLM
-from langchain.agents import create_agent
+import time
 from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
 from ai.tools import search_knowledge_base
-from ai.prompt import SYSTEM_PROMPT
+from ai.prompt import GUEST_PROMPT, SYSTEM_PROMPT
 from mcp_client.mcp_client import get_mcp_client
+from mcp_servers import tracing
 
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 API_KEY = os.getenv("gemini_api_key")
 
-os.environ["GOOGLE_API_KEY"] = getpass.getpass(API_KEY)
+if API_KEY:
+    os.environ.setdefault("GOOGLE_API_KEY", API_KEY)
 
-def create_my_agent():
+# 多久重新向 MCP 伺服器確認一次工具清單 (秒)
+TOOL_REFRESH_INTERVAL = float(os.getenv("AGENT_TOOL_REFRESH_INTERVAL", "300"))
+# 只給營運人員的工具；對外 (LINE 遊客) 的 agent 不含這些
+STAFF_TOOLS = frozenset({
+    "push_message", "push_to_segment", "list_segments", "get_delivery_status", "get_push_metrics",
+})
+
+
+def create_llm():
+    # 模型 SDK 較重，用到時才載入，避免拖慢 app 啟動
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    #from langchain_ollama.chat_models import ChatOllama #ollama LLM
 
     # llm = ChatOllama(
     #     model="gemma4:e4b",
     #     temperature = 1.0
     # )
 
-    llm = ChatGoogleGenerativeAI(
+    return ChatGoogleGenerativeAI(
         model="gemini-3.1-pro-preview",
         api_key = API_KEY,
         temperature=1.0,  # Gemini 3.0+ defaults to 1.0
@@ -29,18 +45,192 @@ def create_my_agent():
     )
 
 
-    client = get_mcp_client()
+def tools_fingerprint(tools) -> str:
+    """工具名稱、說明與參數 schema 的摘要，任一伺服器的工具改變時就會不同"""
+    digest = hashlib.sha256()
+    for tool in sorted(tools, key=lambda t: t.name):
+        schema = tool.args_schema
+        if schema is not None and not isinstance(schema, dict):
+            schema = schema.model_json_schema()
+        digest.update(json.dumps(
+            [tool.name, tool.description, schema], ensure_ascii=False, sort_keys=True
+        ).encode())
+    return digest.hexdigest()
+
+
+class LLMTracer(BaseCallbackHandler):
+    """每次 LLM 呼叫一個 span，記錄首字時間 (ttft) 與 token 數"""
+
+    # 在模型呼叫的 context 中直接執行，span 才會掛在目前的 trace 下
+    run_inline = True
+
+    def __init__(self):
+        self._runs: dict = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or params.get("_type") or "llm"
+        self._runs[run_id] = [tracing.start_span("llm", key=str(model)), time.perf_counter(), None, 0]
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is None:
+            return
+        run[3] += 1
+        if run[2] is None:
+            run[2] = time.perf_counter() - run[1]
+            run[0].set(ttft_ms=round(run[2] * 1000, 1))
+            tracing.metrics.observe("llm.ttft", run[0].key, run[2])
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        generations = [g for batch in response.generations for g in batch]
+        usage = getattr(getattr(generations[0], "message", None), "usage_metadata", None) if generations else None
+        if usage:
+            run[0].set(input_tokens=usage.get("input_tokens"), output_tokens=usage.get("output_tokens"))
+        # 串流輸出的段數 (非串流呼叫為 0)
+        run[0].set(chunks=run[3])
+        run[0].finish()
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            run[0].error = type(error).__name__
+            run[0].finish()
+
+
+llm_tracer = LLMTracer()
+
+
+class AgentRuntime:
+    """
+    每個行程共用一份 LLM、MCP client 與 agent。
+    工具清單快取起來，定期在背景重新取得，只有內容改變時才重建 agent；
+    對話狀態放在 checkpointer，以 thread_id (聊天 session) 區隔。
+    另有一個不含 STAFF_TOOLS 的 guest agent 給對外的 LINE webhook 使用。
+    """
+
+    def __init__(self):
+        self._agent = None
+        self._guest_agent = None
+        self._tools: dict = {}
+        self._fingerprint = None
+        self._checked = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh_task: asyncio.Task | None = None
+        self._llm = None
+        self._client = None
+        self._checkpointer = None
+
+    async def get(self, guest: bool = False):
+        """
+        回傳目前的 agent；第一次呼叫時建立，之後只在背景檢查工具是否改變。
+        guest=True 時回傳沒有推播與分眾工具的 agent
+        """
+        if self._agent is None:
+            async with self._lock:
+                if self._agent is None:
+                    await self._refresh()
+        elif time.monotonic() - self._checked > TOOL_REFRESH_INTERVAL and not self._refresh_pending():
+            self._refresh_task = asyncio.create_task(self._background_refresh())
+        return self._guest_agent if guest else self._agent
 
-    async def build():
-        tools = await client.get_tools()
+    def start_warmup(self):
+        """在背景先建好 agent，第一則訊息不必等待；已建立時不做事"""
+        if self._agent is None and not self._refresh_pending():
+            self._refresh_task = asyncio.create_task(self._background_refresh())
+
+    def _refresh_pending(self) -> bool:
+        return self._refresh_task is not None and not self._refresh_task.done()
+
+    async def _background_refresh(self):
+        try:
+            async with self._lock:
+                await self._refresh()
+        except Exception:
+            # 伺服器暫時連不上時沿用舊工具，下次再試
+            logger.exception("重新取得 MCP 工具清單失敗")
+            self._checked = time.monotonic()
+
+    async def _refresh(self):
+        from langchain.agents import create_agent
+        from langgraph.checkpoint.memory import InMemorySaver
+
+        if self._client is None:
+            self._client = get_mcp_client()
+            self._checkpointer = InMemorySaver()
+
+        tools = await self._client.get_tools()
         tools.append(search_knowledge_base)
+        self._checked = time.monotonic()
+
+        fingerprint = tools_fingerprint(tools)
+        if fingerprint == self._fingerprint:
+            return
 
-        agent = create_agent(
-            llm,
+        self._tools = {tool.name: tool for tool in tools}
+        self._agent = create_agent(
+            self.llm,
             tools,
-            system_prompt=SYSTEM_PROMPT
+            system_prompt=SYSTEM_PROMPT,
+            checkpointer=self._checkpointer,
         )
+        self._guest_agent = create_agent(
+            self.llm,
+            [tool for tool in tools if tool.name not in STAFF_TOOLS],
+            system_prompt=GUEST_PROMPT,
+            checkpointer=self._checkpointer,
+        )
+        self._fingerprint = fingerprint
+        logger.info("agent 已建立，工具：%s", ", ".join(tool.name for tool in tools))
+
+    @property
+    def llm(self):
+        """共用的聊天模型 (不含工具)，給不需要 agent 迴圈的流程直接呼叫"""
+        if self._llm is None:
+            llm = create_llm()
+            llm.callbacks = [*(llm.callbacks or []), llm_tracer]
+            self._llm = llm
+        return self._llm
+
+    async def call_tool(self, name: str, args: dict):
+        """不經過 LLM 直接呼叫工具 (快速路徑用)"""
+        await self.get()
+        return await self._tools[name].ainvoke(args)
+
+    async def remember(self, thread_id: str, question: str, answer: str):
+        """把快速路徑的問答寫進對話狀態，agent 接手後續對話時仍看得到"""
+        agent = await self.get()
+        await agent.aupdate_state(
+            {"configurable": {"thread_id": thread_id}},
+            {"messages": [
+                {"role": "user", "content": question},
+                {"role": "assistant", "content": answer},
+            ]},
+            as_node="model",
+        )
+
+    async def history(self, thread_id: str) -> list:
+        """thread 目前的對話訊息"""
+        agent = await self.get()
+        state = await agent.aget_state({"configurable": {"thread_id": thread_id}})
+        return list(state.values.get("messages", []))
+
+    async def replace_history(self, thread_id: str, messages: list):
+        """丟掉 thread 所有的 checkpoint，只以 messages 重建對話狀態 (長期對話截短用)"""
+        self.end_session(thread_id)
+        if messages:
+            agent = await self.get()
+            await agent.aupdate_state(
+                {"configurable": {"thread_id": thread_id}}, {"messages": messages}, as_node="model",
+            )
+
+    def end_session(self, thread_id: str):
+        """聊天結束時清掉該 session 的對話狀態"""
+        if self._checkpointer is not None:
+            self._checkpointer.delete_thread(thread_id)
+
 
-        return agent
-    
-    return build
\ No newline at end of file
+agent_runtime = AgentRuntime()
@@ -0,0 +1,142 @@
+"""
+回答的語意快取。
+
+同一個預報時段內，營運決策類的問題答案幾乎相同。快取以問題向量的相似度比對，
+並綁定「地區 + 該地區目前天氣快照 + 手冊索引版本」：天氣或手冊一變，該地區的舊答案全部失效，
+其他地區的答案不受影響。
+問題中提到的天氣類型與地區 (topic) 必須完全相同才比相似度，
+「雨天…」與「颱風…」這類只差幾個字的問題不會共用答案。
+推播相關的訊息一律不讀也不寫快取。
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+from ai.router import parse_tool_result
+
+# 問題向量的 cosine 相似度門檻
+SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+TTL = float(os.getenv("ANSWER_CACHE_TTL", "1800"))
+
+# 天氣結果中每次呼叫都會變、但不代表天氣改變的欄位
+_VOLATILE = ("snapshot_age_s",)
+
+
+def weather_fingerprint(classification: dict) -> str:
+    weather = {
+        key: value
+        for key, value in classification.get("weather", {}).items()
+        if key not in _VOLATILE
+    }
+    body = json.dumps(
+        [classification.get("scenario"), weather], ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha256(body.encode()).hexdigest()[:16]
+
+
+@dataclass
+class _Entry:
+    vector: np.ndarray
+    context: str
+    topic: str
+    answer: str
+    created: float
+
+
+class AnswerCache:
+    def __init__(self, similarity: float = SIMILARITY, max_entries: int = MAX_ENTRIES, ttl: float = TTL):
+        self.similarity = similarity
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()
+        self._ids = 0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0, "expired": 0}
+
+    async def context(self, region: str, call_tool, index_version: str | None) -> str:
+        """目前的天氣快照 (依地區) 與手冊版本組成的 context key"""
+        classification = parse_tool_result(
+            await call_tool("classifyWeather", {"LocationName": region})
+        )
+        return f"{region}:{weather_fingerprint(classification)}:{index_version}"
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def _region(context: str) -> str:
+        return context.split(":", 1)[0]
+
+    def _evict(self, context: str):
+        """清掉過期的答案，以及同一地區中天氣或手冊版本已過時的答案 (其他地區不受影響)"""
+        now = time.monotonic()
+        region = self._region(context)
+        stale = [
+            key for key, entry in self._entries.items()
+            if (entry.context != context and self._region(entry.context) == region)
+            or now - entry.created > self.ttl
+        ]
+        for key in stale:
+            entry = self._entries.pop(key)
+            if entry.context != context and self._region(entry.context) == region:
+                self.stats["invalidations"] += 1
+            else:
+                self.stats["expired"] += 1
+
+    def lookup(self, vector, context: str, topic: str = "") -> str | None:
+        """context 與 topic 相同且問題夠相似時回傳快取的答案"""
+        # 這個地區的天氣或手冊改變後，舊 context 的答案不會再被用到，直接清掉
+        self._evict(context)
+        keys = [
+            key for key, entry in self._entries.items()
+            if entry.context == context and entry.topic == topic
+        ]
+        if not keys:
+            self.stats["misses"] += 1
+            return None
+
+        matrix = np.stack([self._entries[key].vector for key in keys])
+        scores = matrix @ self._normalize(vector)
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity:
+            self.stats["misses"] += 1
+            return None
+
+        self._entries.move_to_end(keys[best])
+        self.stats["hits"] += 1
+        return self._entries[keys[best]].answer
+
+    def put(self, vector, context: str, topic: str, answer: str):
+        if not answer.strip():
+            return
+        self._ids += 1
+        self._entries[self._ids] = _Entry(self._normalize(vector), context, topic, answer, time.monotonic())
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self.stats["stores"] += 1
+
+    def snapshot_stats(self) -> dict:
+        total = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "hit_rate": round(self.stats["hits"] / total, 3) if total else 0.0,
+        }
+
+
+def replay(answer: str, size: int = 40):
+    """快取命中時切成小段，和 LLM 串流走同一條訊息路徑"""
+    for i in range(0, len(answer), size):
+        yield answer[i:i + size]
+
+
+answer_cache = AnswerCache()
@@ -0,0 +1,117 @@
+"""
+情境 C 的營運決策報告流程。
+
+原本 agent 要先呼叫 classifyWeather、再呼叫 search_knowledge_base、最後才寫報告，
+至少三次依序的 LLM 呼叫。這裡直接並行取得天氣與手冊內容：
+手冊檢索用「預測的情境」先查，天氣結果回來若情境不同再補查一次 (檢索在本機，代價很小)，
+最後只呼叫一次 LLM，依手冊第二章的四個欄位串流輸出報告。
+"""
+
+import asyncio
+import json
+from collections import OrderedDict
+
+from ai.router import parse_tool_result
+from mcp_servers.weather_scenario import classify_text
+
+# 各情境的檢索問句，對應手冊 5.1～5.3 與第六章推播句型
+SCENARIO_QUERIES = {
+    "sunny": "晴天營運規範 開放設施 對外提醒 晴天推播",
+    "rainy": "雨天營運規範 關閉設施 條件式開放設施 雨天推播",
+    "typhoon": "颱風營運規範 全園停園 關閉設施 颱風推播",
+}
+SCENARIO_NAMES = {"sunny": "晴天", "rainy": "雨天", "typhoon": "颱風"}
+
+REPORT_PROMPT = """
+你是「樂園營運決策助手」。根據下方的天氣資料與營運手冊內容，以繁體中文輸出營運決策報告。
+只能使用提供的資料，手冊未定義的規則不可臆測；規則衝突時採用風險較高的決策。
+
+報告必須依序包含以下四個欄位 (手冊第二章)：
+1. **天氣摘要**
+2. **營運建議**：分別列出 開放／條件式開放／關閉 的設施
+3. **風險與理由**
+4. **工具呼叫紀錄**：{tools}
+
+{closing}
+"""
+
+# 營運人員：最後一行建議推播；對外 (LINE 遊客) 不提推播
+STAFF_CLOSING = "最後一行依手冊 6.2 的固定句型建議發送哪一種推播，但不可宣稱已推播。"
+GUEST_CLOSING = "讀者是一般遊客：不可提及推播、也不可建議發送任何通知。"
+
+DEFAULT_SCENARIO = "sunny"
+# 記住多少個對話的上一次情境
+MAX_THREADS = 4096
+
+# 各對話 (thread_id) 上一次實際判定到的情境，問題本身看不出情境時拿來預測
+_last_scenarios: OrderedDict[str, str] = OrderedDict()
+
+
+def predict_scenario(question: str, thread_id: str | None = None) -> str:
+    """從問題文字預測情境 (例如「下雨了怎麼辦」)；看不出來時沿用同一對話上一次的結果"""
+    scenario, keywords = classify_text(question)
+    if keywords:
+        return scenario
+    return _last_scenarios.get(thread_id, DEFAULT_SCENARIO) if thread_id else DEFAULT_SCENARIO
+
+
+def _remember_scenario(thread_id: str | None, scenario: str):
+    if not thread_id:
+        return
+    _last_scenarios[thread_id] = scenario
+    _last_scenarios.move_to_end(thread_id)
+    while len(_last_scenarios) > MAX_THREADS:
+        _last_scenarios.popitem(last=False)
+
+
+async def gather_context(question: str, region: str, call_tool, retrieve,
+                         thread_id: str | None = None) -> dict:
+    """並行取得天氣情境與手冊內容；call_tool / retrieve 由呼叫端提供"""
+    predicted = predict_scenario(question, thread_id)
+    weather_task = asyncio.create_task(call_tool("classifyWeather", {"LocationName": region}))
+    docs_task = asyncio.create_task(retrieve(SCENARIO_QUERIES[predicted]))
+
+    classification, docs = await asyncio.gather(weather_task, docs_task)
+    classification = parse_tool_result(classification)
+
+    scenario = classification.get("scenario", predicted)
+    if scenario != predicted:
+        docs = await retrieve(SCENARIO_QUERIES[scenario])
+    _remember_scenario(thread_id, scenario)
+
+    return {
+        "scenario": scenario,
+        "predicted": predicted,
+        "classification": classification,
+        "docs": docs,
+    }
+
+
+def build_messages(question: str, context: dict, format_docs, guest: bool = False) -> list[dict]:
+    classification = context["classification"]
+    weather = json.dumps(classification.get("weather", {}), ensure_ascii=False)
+    return [
+        {"role": "system", "content": REPORT_PROMPT.format(
+            tools="classifyWeather、search_knowledge_base",
+            closing=GUEST_CLOSING if guest else STAFF_CLOSING,
+        )},
+        {"role": "user", "content": (
+            f"問題：{question}\n\n"
+            f"【天氣資料】{weather}\n"
+            f"【手冊情境判定】{SCENARIO_NAMES.get(context['scenario'], context['scenario'])}"
+            f" (命中關鍵字：{'、'.join(classification.get('keywords', [])) or '無'})\n\n"
+            f"【營運手冊】\n{format_docs(context['docs'])}"
+        )},
+    ]
+
+
+async def stream_report(question: str, region: str, llm, call_tool, retrieve, format_docs,
+                        thread_id: str | None = None, guest: bool = False):
+    """
+    逐段產生報告文字；thread_id 用來沿用同一對話上一次的情境，
+    guest=True (對外) 時報告不含推播建議
+    """
+    context = await gather_context(question, region, call_tool, retrieve, thread_id)
+    async for chunk in llm.astream(build_messages(question, context, format_docs, guest)):
+        if chunk.text:
+            yield chunk.text
@@ -0,0 +1,114 @@
+"""
+一則使用者訊息的處理順序，app (Chainlit)、LINE webhook 與 benchmark 共用：
+
+1. 快速路徑：單純查天氣 / 明確指定類型的推播直接呼叫工具，不經過 LLM
+2. 情境 C：單一地區的營運決策先查語意快取，未命中時天氣與手冊並行取得，只呼叫一次 LLM
+3. agent：session 的第一個問題先查語意快取 (後續問題的答案取決於對話歷史)
+
+回覆文字以 write(text) 逐段交給呼叫端，串流到 UI 或收集起來都可以。
+"""
+
+from dataclasses import dataclass, field
+
+from ai import router, tools
+from ai.agent import agent_runtime
+from ai.answer_cache import answer_cache, replay
+from ai.decision_report import stream_report
+
+
+@dataclass
+class Reply:
+    text: str
+    # fast / cache / pipeline / agent
+    path: str
+    # agent 實際呼叫的工具
+    tools: list[str] = field(default_factory=list)
+
+
+async def _lookup(cache, text: str, region: str, call_tool, guest: bool = False):
+    """
+    查語意快取，回傳 (快取答案, 寫回用的 (向量, context, topic))。
+    推播相關訊息不使用快取；天氣查詢失敗時當作未命中也不寫回。
+    對外 (guest) 的回答內容不同 (不含推播建議)，與營運人員的分開快取。
+    """
+    if cache is None or router.mentions_push(text):
+        return None, None
+    try:
+        vector, version = await tools.embed_query(text)
+        context = await cache.context(region, call_tool, version)
+    except Exception:
+        return None, None
+    topic = ("guest|" if guest else "") + router.question_topic(text)
+    return cache.lookup(vector, context, topic), (vector, context, topic)
+
+
+async def respond(text: str, thread_id: str, write, *, first_turn: bool = True, guest: bool = False,
+                  shortcuts: bool = True, cache=answer_cache, call_tool=None, retrieve=None) -> Reply:
+    """
+    依序處理一則訊息並回傳完整回覆。
+    guest=True (對外) 時快速路徑不推播、決策報告不含推播建議、agent 沒有推播與分眾工具；
+    shortcuts=False 時一律交給 agent (benchmark 比較用)；cache=None 時不使用語意快取。
+    call_tool / retrieve 預設為 agent_runtime.call_tool 與 ai.tools.retrieve。
+    """
+    call_tool = call_tool or agent_runtime.call_tool
+    retrieve = retrieve or tools.retrieve
+
+    async def finish(reply: str, path: str) -> Reply:
+        await agent_runtime.remember(thread_id, text, reply)
+        return Reply(reply, path)
+
+    async def send_cached(reply: str) -> Reply:
+        for piece in replay(reply):
+            await write(piece)
+        return await finish(reply, "cache")
+
+    if shortcuts:
+        reply = await router.handle(text, call_tool, allow_push=not guest)
+        if reply is not None:
+            await write(reply)
+            return await finish(reply, "fast")
+
+        region = router.route_decision(text)
+        if region is not None:
+            cached, key = await _lookup(cache, text, region, call_tool, guest)
+            if cached is not None:
+                return await send_cached(cached)
+
+            parts = []
+            async for piece in stream_report(
+                text, region, agent_runtime.llm, call_tool, retrieve, tools.format_docs,
+                thread_id=thread_id, guest=guest,
+            ):
+                parts.append(piece)
+                await write(piece)
+            reply = "".join(parts)
+            if key is not None:
+                cache.put(*key, reply)
+            return await finish(reply, "pipeline")
+
+    key = None
+    if first_turn:
+        cached, key = await _lookup(cache, text, router.region_of(text), call_tool, guest)
+        if cached is not None:
+            return await send_cached(cached)
+
+    # 整個行程共用一個 agent，對話狀態以 thread id 區隔
+    agent = await agent_runtime.get(guest=guest)
+    parts, called = [], []
+    async for chunk, metadata in agent.astream(
+        {"messages": [{"role": "user", "content": text}]},
+        config={"configurable": {"thread_id": thread_id}},
+        stream_mode="messages",
+    ):
+        node = metadata.get("langgraph_node")
+        if node == "model" and chunk.text:
+            parts.append(chunk.text)
+            await write(chunk.text)
+        elif node == "tools":
+            called.append(getattr(chunk, "name", None))
+
+    reply = "".join(parts)
+    # 有實際推播的回覆不能重播給其他人
+    if key is not None and not router.PUSH_TOOLS.intersection(called):
+        cache.put(*key, reply)
+    return Reply(reply, "agent", called)
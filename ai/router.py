@@ -0,0 +1,335 @@
+"""
+agent 前的快速路徑。
+
+情境 A (單一地區查目前天氣) 與 D (明確指定類型的推播) 只對應一個工具、不需要推理，
+由關鍵字規則判斷意圖與參數，再以小型 naive Bayes 分類器複核；
+兩者一致且分類器夠有把握時直接呼叫工具並以模板回覆，否則交給 agent。
+"""
+
+import json
+import math
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+
+from rag.bm25 import tokenize
+
+DEFAULT_REGION = "霧峰區"
+# 分類器信心門檻，低於此值一律交給 agent
+CONFIDENCE = 0.8
+
+# 臺中市行政區 (F-D0047-073)
+DISTRICTS = (
+    "中區", "東區", "南區", "西區", "北區", "西屯區", "南屯區", "北屯區", "豐原區",
+    "東勢區", "大甲區", "清水區", "沙鹿區", "梧棲區", "后里區", "神岡區", "潭子區",
+    "大雅區", "新社區", "石岡區", "外埔區", "大安區", "烏日區", "大肚區", "龍井區",
+    "霧峰區", "太平區", "大里區", "和平區",
+)
+_DISTRICT = re.compile("|".join(sorted(DISTRICTS, key=len, reverse=True)))
+
+WEATHER_TYPES = {
+    "typhoon": ("颱風",),
+    "rainy": ("雨天", "下雨", "雨"),
+    "heat": ("高溫", "炎熱", "酷熱"),
+    "sunny": ("晴天", "晴"),
+}
+TYPE_NAMES = {"rainy": "雨天", "sunny": "晴天", "typhoon": "颱風", "heat": "高溫"}
+
+_PUSH_VERB = re.compile(r"發送|推播|推送|發布|發個|傳.{0,3}line|發.{0,2}通知", re.I)
+_WEATHER_WORD = re.compile(r"天氣|氣溫|溫度|會下雨嗎|有沒有下雨")
+# 問句、建議、指定對象、依天氣自動判斷等需要 agent 推理的訊號
+_PUSH_DEFER = re.compile(r"嗎|？|\?|要不要|該不該|是否|建議|只|分眾|人員|客服|員工|同仁|群組|目前天氣|依.{0,4}天氣|根據")
+# 否定、取消，以及只想看推播內容：快速路徑會直接發送，一律交給 agent
+_PUSH_NEGATE = re.compile(r"不要|別|不用|不必|取消|先不|停止|暫停|長怎樣|長什麼|內容|什麼|怎麼|如何|預覽|看一下")
+_WEATHER_DEFER = re.compile(
+    r"建議|營運|設施|開放|關閉|怎麼辦|應該|推播|發送|規則|手冊|"
+    r"未來|小時|明天|後天|晚上|下午|傍晚|何時|幾點|最高|最大|超過|這週|本週|"
+    r"昨天|前天|昨晚|上週|上星期|上個月|剛剛|剛才|之前|過去"
+)
+_FORCE = re.compile(r"再發|重發|再送|再推")
+# 快速路徑只接受從頭到尾都是祈使句的推播指令，例如「(請)(幫我)發送雨天推播(到大里區)」；
+# 多了時間 (明天、下午三點、剛剛)、主詞 (誰)、動貌或語氣助詞 (了、沒、的結果) 等任何字都交給 agent
+_WEATHER_WORDS = "|".join(sorted({w for words in WEATHER_TYPES.values() for w in words}, key=len, reverse=True))
+_PUSH_COMMAND = re.compile(
+    r"(?:請|麻煩)?(?:你)?(?:幫我|幫忙)?(?:再|重新)?(?:立即|立刻|馬上)?"
+    r"(?:發送|發布|推播|推送|傳送|重發|再發|再送|再推|發|傳)(?:一則|一個|個)?(?:line)?"
+    rf"(?:{_WEATHER_WORDS})天?(?:停園|警示|提醒)?(?:推播|通知|訊息|警報|公告)?"
+    rf"(?:(?:到|給)(?:{_DISTRICT.pattern}|遊客|所有人|大家))?[。!！]?",
+    re.I,
+)
+# 情境 C：依目前天氣要營運建議
+_DECISION = re.compile(r"建議|營運|決策|怎麼安排|該怎麼做|怎麼辦|停園|報告")
+_NOW = re.compile(r"天氣|今天|目前|現在")
+
+# 分類器訓練語料：weather=A、rules=B、decision=C、push=D、other=其他
+TRAINING = [
+    ("現在的天氣如何", "weather"),
+    ("今天天氣怎麼樣", "weather"),
+    ("霧峰區現在天氣", "weather"),
+    ("目前氣溫幾度", "weather"),
+    ("查一下大里區的天氣", "weather"),
+    ("現在外面會下雨嗎", "weather"),
+    ("今天的天氣狀況", "weather"),
+    ("太平區天氣如何", "weather"),
+    ("雨天時哪些設施要關閉", "rules"),
+    ("颱風天的營運規則是什麼", "rules"),
+    ("手冊對晴天有什麼規定", "rules"),
+    ("下雨的話摩天輪可以開嗎", "rules"),
+    ("條件式開放是什麼意思", "rules"),
+    ("室內設施有哪些", "rules"),
+    ("急流泛舟在什麼情況下要關", "rules"),
+    ("如果颱風來了要怎麼處理", "rules"),
+    ("根據目前天氣給我營運建議", "decision"),
+    ("今天該怎麼安排設施", "decision"),
+    ("依現在天氣哪些設施要關閉", "decision"),
+    ("給我今天的營運決策報告", "decision"),
+    ("現在天氣適合開放戶外設施嗎", "decision"),
+    ("今天要不要停園", "decision"),
+    ("幫我分析今天的營運狀況", "decision"),
+    ("目前天氣下的營運建議", "decision"),
+    ("發送雨天推播", "push"),
+    ("推播晴天通知", "push"),
+    ("幫我發颱風停園通知", "push"),
+    ("傳LINE雨天通知給遊客", "push"),
+    ("發布高溫警示推播", "push"),
+    ("推送雨天訊息", "push"),
+    ("發送晴天通知到霧峰區", "push"),
+    ("幫我推播颱風通知", "push"),
+    ("推播雨天通知", "push"),
+    ("再發晴天推播", "push"),
+    ("請發送高溫通知", "push"),
+    ("發布颱風推播", "push"),
+    ("推播高溫通知", "push"),
+    ("發送颱風推播", "push"),
+    ("推送晴天訊息", "push"),
+    ("幫我發送雨天通知", "push"),
+    ("發送高溫推播到大里區", "push"),
+    ("重發颱風通知", "push"),
+    ("先不要發", "other"),
+    ("別推播了", "other"),
+    ("取消剛才的通知", "other"),
+    ("不用發了", "other"),
+    ("停止推送", "other"),
+    # 詢問推播狀態、原因、過去或排定時間的推播，都不是立即發送的指令
+    ("颱風通知發了沒", "other"),
+    ("晴天推播好了沒", "other"),
+    ("高溫通知的發送狀態", "other"),
+    ("颱風推播的結果", "other"),
+    ("推播失敗了", "other"),
+    ("查詢推播狀態", "other"),
+    ("誰發的通知", "other"),
+    ("為什麼發了颱風通知", "other"),
+    ("剛剛發的晴天通知", "other"),
+    ("已經發過高溫通知", "other"),
+    ("昨天發的推播", "other"),
+    ("明天早上再發晴天通知", "other"),
+    ("下午三點發颱風通知", "other"),
+    ("一小時後推播高溫提醒", "other"),
+    ("推播的時間是幾點", "other"),
+    ("通知模板長怎樣", "rules"),
+    ("颱風通知的內容是什麼", "rules"),
+    ("昨天天氣如何", "other"),
+    ("前天有下雨嗎", "other"),
+    ("你好", "other"),
+    ("你是誰", "other"),
+    ("幫我寫一首詩", "other"),
+    ("股票明天會漲嗎", "other"),
+    ("推薦附近的餐廳", "other"),
+    ("謝謝", "other"),
+]
+
+
+class NaiveBayes:
+    """CJK bigram 的多項式 naive Bayes (Laplace 平滑)"""
+
+    def __init__(self, samples: list[tuple[str, str]]):
+        self._counts: dict[str, Counter] = defaultdict(Counter)
+        labels = Counter()
+        for text, label in samples:
+            labels[label] += 1
+            self._counts[label].update(tokenize(text))
+        self._vocab = {token for counts in self._counts.values() for token in counts}
+        self._prior = {label: math.log(n / len(samples)) for label, n in labels.items()}
+        self._totals = {label: sum(counts.values()) for label, counts in self._counts.items()}
+
+    def predict(self, text: str) -> tuple[str, float]:
+        """回傳 (最可能的類別, 後驗機率)"""
+        tokens = [token for token in tokenize(text) if token in self._vocab]
+        vocab = len(self._vocab)
+        scores = {
+            label: prior + sum(
+                math.log((self._counts[label][token] + 1) / (self._totals[label] + vocab))
+                for token in tokens
+            )
+            for label, prior in self._prior.items()
+        }
+        best = max(scores, key=scores.get)
+        norm = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1 / norm
+
+
+classifier = NaiveBayes(TRAINING)
+
+
+@dataclass
+class Route:
+    intent: str
+    tool: str
+    args: dict = field(default_factory=dict)
+    confidence: float = 0.0
+
+
+def _regions(text: str) -> list[str]:
+    return list(dict.fromkeys(_DISTRICT.findall(text)))
+
+
+def _weather_types(text: str) -> list[str]:
+    found = []
+    rest = text
+    # 長詞優先 (颱風 > 雨天 > 雨)，比對到就移除，避免「雨」重複算
+    for weather_type, words in WEATHER_TYPES.items():
+        for word in words:
+            if word in rest:
+                found.append(weather_type)
+                rest = rest.replace(word, "")
+                break
+    return found
+
+
+def _rule(text: str) -> Route | None:
+    regions = _regions(text)
+    if len(regions) > 1:
+        return None
+    region = regions[0] if regions else DEFAULT_REGION
+
+    if _PUSH_VERB.search(text) or _PUSH_COMMAND.fullmatch(text):
+        types = _weather_types(text)
+        if (
+            len(types) != 1
+            or not _PUSH_COMMAND.fullmatch(text)
+            or _PUSH_DEFER.search(text)
+            or _PUSH_NEGATE.search(text)
+        ):
+            return None
+        args = {"weather_type": types[0], "region": region}
+        if _FORCE.search(text):
+            args["force"] = True
+        return Route("push", "push_message", args)
+
+    if _WEATHER_WORD.search(text) and not _WEATHER_DEFER.search(text):
+        return Route("weather", "getWeather", {"LocationName": region})
+    return None
+
+
+def route(text: str) -> Route | None:
+    """可直接處理時回傳 Route，否則回傳 None 交給 agent"""
+    text = text.strip()
+    if not text or len(text) > 60:
+        return None
+    candidate = _rule(text)
+    if candidate is None:
+        return None
+    label, confidence = classifier.predict(text)
+    if label != candidate.intent or confidence < CONFIDENCE:
+        return None
+    candidate.confidence = confidence
+    return candidate
+
+
+def route_decision(text: str) -> str | None:
+    """單一地區的營運決策問題 (情境 C) 回傳地區，否則回傳 None"""
+    text = text.strip()
+    if not _DECISION.search(text) or not _NOW.search(text) or _PUSH_VERB.search(text):
+        return None
+    regions = _regions(text)
+    if len(regions) > 1:
+        return None
+    label, confidence = classifier.predict(text)
+    if label != "decision" or confidence < CONFIDENCE:
+        return None
+    return regions[0] if regions else DEFAULT_REGION
+
+
+# 會實際發出訊息的工具；呼叫過的回覆不能快取重播
+PUSH_TOOLS = frozenset({"push_message", "push_to_segment"})
+
+
+def mentions_push(text: str) -> bool:
+    """訊息與推播有關 (答案不可快取)"""
+    return bool(_PUSH_VERB.search(text))
+
+
+def question_topic(text: str) -> str:
+    """問題中的天氣類型與地區，答案快取只在兩者都相同的問題之間共用"""
+    return ",".join(sorted(_weather_types(text))) + "|" + ",".join(_regions(text))
+
+
+def region_of(text: str) -> str:
+    regions = _regions(text)
+    return regions[0] if len(regions) == 1 else DEFAULT_REGION
+
+
+def parse_tool_result(result):
+    """MCP 工具回傳的文字 (或 content blocks) 轉回 JSON"""
+    if isinstance(result, list):
+        result = "".join(
+            block.get("text", "") if isinstance(block, dict) else str(block)
+            for block in result
+        )
+    if isinstance(result, str):
+        return json.loads(result)
+    return result
+
+
+def render_weather(weather: dict) -> str:
+    if weather.get("error"):
+        raise ValueError(weather["error"])
+    lines = [f"**{weather.get('location', DEFAULT_REGION)} 目前天氣**"]
+    for label, key, unit in (
+        ("時段", "time", ""),
+        ("天氣現象", "天氣現象", ""),
+        ("溫度", "溫度", "°C"),
+        ("體感溫度", "體感溫度", "°C"),
+        ("降雨機率", "降雨機率", "%"),
+    ):
+        if weather.get(key) not in (None, ""):
+            lines.append(f"- {label}：{weather[key]}{unit}")
+    if weather.get("degraded"):
+        lines.append(f"- ⚠️ 氣象署暫時無法連線，以下為 {weather.get('snapshot_age_s', 0) // 60} 分鐘前的資料")
+    return "\n".join(lines)
+
+
+def render_push(result: dict, weather_type: str) -> str:
+    name = TYPE_NAMES.get(weather_type, weather_type)
+    status = result.get("status")
+    if status == "sent":
+        return f"✅ 已成功推播【{name}】通知"
+    if status == "queued":
+        return f"📨 已排入推播佇列【{name}】（{result.get('delivery_id')}）"
+    if status == "suppressed":
+        return "⏸️ 近期已發送過相同推播，未重複發送"
+    return f"❌ 推播失敗【{name}】：{result.get('error') or result.get('last_error') or status}"
+
+
+async def handle(text: str, call_tool, allow_push: bool = True) -> str | None:
+    """
+    走快速路徑時回傳回覆文字；不適用或工具呼叫失敗時回傳 None，由 agent 處理。
+    call_tool(name, args) 負責實際呼叫 MCP 工具；allow_push=False 時 (對外) 不走推播。
+    """
+    selected = route(text)
+    if selected is None or (selected.intent == "push" and not allow_push):
+        return None
+    try:
+        result = parse_tool_result(await call_tool(selected.tool, selected.args))
+    except Exception as exc:
+        # 推播不交給 agent 重試，避免重複發送；查天氣失敗則讓 agent 處理
+        if selected.intent == "push":
+            return render_push({"status": "failed", "error": str(exc)}, selected.args["weather_type"])
+        return None
+
+    if selected.intent == "push":
+        return render_push(result, selected.args["weather_type"])
+    try:
+        return render_weather(result)
+    except ValueError:
+        return None
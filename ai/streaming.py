@@ -0,0 +1,97 @@
+"""
+串流輸出的合併層。
+
+LLM 每個 chunk 都呼叫一次 stream_token 等於每個 chunk 一次 websocket 訊息。
+這裡先把 token 放進緩衝區，由背景 task 依時間 (預設 50 ms) 或字數 (預設 200 字)
+合併成一次 stream_token 增量送出；瀏覽器端太慢、緩衝區累積過多時，
+寫入端會等待送出完成 (backpressure)，不會無限制堆積。
+"""
+
+import asyncio
+import os
+
+FLUSH_INTERVAL = float(os.getenv("STREAM_FLUSH_INTERVAL_MS", "50")) / 1000
+FLUSH_CHARS = int(os.getenv("STREAM_FLUSH_CHARS", "200"))
+# 未送出的字數超過此值時暫停寫入端
+MAX_PENDING_CHARS = int(os.getenv("STREAM_MAX_PENDING_CHARS", "2000"))
+
+
+class TokenStream:
+    """
+    用法：
+        async with TokenStream(ui_msg) as stream:
+            async for text in ...:
+                await stream.write(text)
+    離開時送出剩餘內容並呼叫 message.update()。
+    """
+
+    def __init__(self, message, interval: float = FLUSH_INTERVAL,
+                 max_chars: int = FLUSH_CHARS, max_pending: int = MAX_PENDING_CHARS):
+        self.message = message
+        self.interval = interval
+        self.max_chars = max_chars
+        self.max_pending = max_pending
+        self._buffer: list[str] = []
+        self._pending = 0
+        self._wake = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._closed = False
+        self._task: asyncio.Task | None = None
+        self.tokens = 0
+        self.flushes = 0
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def write(self, text: str):
+        if not text:
+            return
+        if self._task is not None and self._task.done():
+            # 送出失敗時把錯誤交給寫入端
+            self._task.result()
+        self._buffer.append(text)
+        self._pending += len(text)
+        self.tokens += 1
+        if self._pending >= self.max_chars:
+            self._wake.set()
+        if self._pending >= self.max_pending:
+            self._drained.clear()
+            await self._drained.wait()
+
+    async def _flush(self):
+        if not self._buffer:
+            return
+        text = "".join(self._buffer)
+        self._buffer.clear()
+        self._pending = 0
+        await self.message.stream_token(text)
+        self.flushes += 1
+
+    async def _run(self):
+        try:
+            while not self._closed:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                await self._flush()
+                self._drained.set()
+        finally:
+            # 寫入端不可因背景 task 結束而卡住
+            self._drained.set()
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        if self._task is not None:
+            await self._task
+        await self._flush()
+        await self.message.update()
@@ -1,15 +1,155 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
 from langchain.tools import tool
-from rag.rag_service import load_vector_store
+from mcp_servers import tracing
 
-vector_store = load_vector_store()
+logger = logging.getLogger(__name__)
 
+# 每查詢幾次記錄一次快取命中率
+STATS_LOG_EVERY = 50
+# 重新載入失敗後多久再試 (秒)
+RELOAD_RETRY = 60
 
-@tool
-def search_knowledge_base(query: str) -> str:
-    """搜索樂園營運手冊知識庫，查詢不同天氣條件下的設施營運規則和決策建議。"""
-    docs = vector_store.similarity_search(query, k=3)
 
+class KnowledgeBase:
+    """
+    向量庫、BM25 與檢索快取。
+    嵌入模型與 FAISS 很重，改在背景執行緒載入；程式啟動時就開始暖機，
+    第一次查詢才等待就緒，UI 不會被卡住。
+    其他 worker 重建索引後 (manifest 版本與載入的 store 不同)，在背景重新載入，
+    完成前繼續用舊的 store 與它自己的版本。
+    """
+
+    def __init__(self):
+        self._future: Future | None = None
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._retry_at = 0.0
+        self.load_seconds: float | None = None
+
+    def start_warmup(self) -> Future:
+        with self._lock:
+            # 上次載入失敗時允許重試
+            if self._future is None or (self._future.done() and self._future.exception()):
+                self._future = Future()
+                threading.Thread(
+                    target=self._load, args=(self._future,), name="knowledge-base-warmup", daemon=True
+                ).start()
+            return self._future
+
+    @staticmethod
+    def _build(embeddings=None):
+        from rag.rag_service import load_vector_store, build_bm25_index
+        from rag.hybrid import HybridRetriever
+        from rag.retrieval_cache import RetrievalCache
+
+        vector_store = load_vector_store(embeddings)
+        # vector / bm25 / hybrid
+        retriever = HybridRetriever(
+            vector_store,
+            build_bm25_index(vector_store),
+            mode=os.getenv("RAG_RETRIEVAL_MODE", "hybrid"),
+        )
+        return RetrievalCache(
+            vector_store, version=vector_store.index_version, retrieve=retriever.retrieve,
+            needs_vector=retriever.mode != "bm25",
+        )
+
+    def _load(self, future: Future):
+        start = time.perf_counter()
+        try:
+            cache = self._build()
+        except BaseException as exc:
+            logger.exception("知識庫載入失敗")
+            future.set_exception(exc)
+            return
+
+        self.load_seconds = time.perf_counter() - start
+        logger.info("知識庫載入完成，耗時 %.1f 秒", self.load_seconds)
+        future.set_result(cache)
+
+    def _check_reload(self, cache):
+        from rag.rag_service import get_index_version
+
+        version = get_index_version()
+        if version is None or version == cache.index_version():
+            return
+        with self._lock:
+            if self._reloading or time.monotonic() < self._retry_at:
+                return
+            self._reloading = True
+        threading.Thread(
+            target=self._reload, args=(cache,), name="knowledge-base-reload", daemon=True
+        ).start()
+
+    def _reload(self, old):
+        try:
+            cache = self._build(old.store.embeddings)
+        except Exception:
+            logger.exception("知識庫重新載入失敗，繼續使用版本 %s", old.index_version())
+            self._retry_at = time.monotonic() + RELOAD_RETRY
+        else:
+            future = Future()
+            future.set_result(cache)
+            with self._lock:
+                self._future = future
+            logger.info("索引已更新，重新載入知識庫：%s -> %s", old.index_version(), cache.index_version())
+        finally:
+            with self._lock:
+                self._reloading = False
+
+    @property
+    def is_ready(self) -> bool:
+        future = self._future
+        return future is not None and future.done() and future.exception() is None
+
+    async def ready(self):
+        """等待載入完成並回傳檢索快取；尚未開始暖機時會先啟動"""
+        cache = await asyncio.wrap_future(self.start_warmup())
+        self._check_reload(cache)
+        return cache
+
+
+knowledge_base = KnowledgeBase()
+
+
+async def retrieve(query: str, k: int = 3) -> list:
+    """檢索手冊 (等待知識庫就緒)，同一節的片段合併後回傳"""
+    from rag.ingestion import expand_sections
+
+    with tracing.span("rag.retrieve", ready=knowledge_base.is_ready):
+        retrieval_cache = await knowledge_base.ready()
+        # 查詢向量的計算是 CPU 密集，放到執行緒避免卡住事件迴圈
+        docs = expand_sections(await asyncio.to_thread(retrieval_cache.search, query, k))
+
+    stats = retrieval_cache.snapshot_stats()
+    if (stats["result_hits"] + stats["result_misses"]) % STATS_LOG_EVERY == 0:
+        logger.info(
+            "知識庫快取命中率：向量 %.0f%%、結果 %.0f%%",
+            stats["embed_hit_rate"] * 100, stats["result_hit_rate"] * 100,
+        )
+    return docs
+
+
+async def embed_query(query: str) -> tuple[list[float], str | None]:
+    """回傳 (查詢向量, 目前索引版本)，向量走檢索快取的第一層"""
+    retrieval_cache = await knowledge_base.ready()
+    vector = await asyncio.to_thread(retrieval_cache.embed, query)
+    return vector, retrieval_cache.index_version()
+
+
+def format_docs(docs: list) -> str:
     return "\n\n".join(
-        f"【來源 {i+1}】\n{doc.page_content}"
+        f"【來源 {i+1}｜{doc.metadata.get('section_path', '')}】\n{doc.page_content}"
         for i, doc in enumerate(docs)
-    )
\ No newline at end of file
+    )
+
+
+@tool
+async def search_knowledge_base(query: str) -> str:
+    """搜索樂園營運手冊知識庫，查詢不同天氣條件下的設施營運規則和決策建議。"""
+    return format_docs(await retrieve(query, k=3))
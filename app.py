@@ -1,76 +1,18 @@
 import chainlit as cl
-from ai.agent import create_my_agent
-from langchain_core.messages import AIMessageChunk, ToolMessage
+from ai.agent import agent_runtime
+from ai.responder import respond
+from ai.streaming import TokenStream
+from mcp_servers import tracing
+from ai.tools import knowledge_base
 
-@cl.on_chat_start
-async def on_chat_start():
-    build_agent = create_my_agent()
-    agent = await build_agent()
-
-    cl.user_session.set("agent", agent)
-
-    welcome_message = """
-    **歡迎使用樂園營運決策助手系統**
-    我可以協助您：
-    A.查詢即時天氣資訊
-    B.根據天氣提供設施營運建議
-    C.推播營運決策通知
-
-    使用方式：
-    1. 直接詢問天氣狀況 例如：「現在的天氣如何？」
-    2. 詢問特定天氣的營運規則 例如：「雨天時哪些設施要關閉？」
-    3. 請求綜合建議 例如：「根據目前天氣，給我營運建議」
-    4. 推播LINE Notify通知
-    """
-
-    await cl.Message(content=welcome_message).send()
-
-
-@cl.on_message
-async def on_message(message: cl.Message):
-
-    agent = cl.user_session.get("agent")
-
-    ui_msg = cl.Message(content="思考中...")
-    await ui_msg.send()
-
-    final_text = ""
-
-    async for chunk in agent.astream(
-        {"messages": [{"role": "user", "content": message.content}]},
-        stream_mode="messages",
-    ):
-        msg = chunk[0]
-        if isinstance(msg, ToolMessage):
-            tool_name = msg.name
-            ui_msg.content = f"呼叫工具中：{tool_name}..."
-            await ui_msg.update()
-        elif isinstance(msg, AIMessageChunk):
-            if msg.content:
-                text = ""
-                for block in msg.content:
-                    if block["type"] == "text":
-                        text += block["text"]
-                if text:
-                    if final_text == "":
-                        ui_msg.content = "生成回應中...\n\n"
-
-                    final_text += text
-                    ui_msg.content = "回覆內容如下:\n\n" + final_text
-                    await ui_msg.update()
-                    
-    ui_msg.content = final_text
-    await ui_msg.update()
-import chainlit as cl
-from ai.agent import create_my_agent
+# 程式啟動就在背景載入嵌入模型與向量索引
+knowledge_base.start_warmup()
 
 
 @cl.on_chat_start
 async def on_chat_start():
-    build_agent = create_my_agent()
-    agent = await build_agent()
-
-    cl.user_session.set("agent", agent)
+    # 行程內第一個 session 觸發 agent 建立，之後的 session 直接共用
+    agent_runtime.start_warmup()
 
     welcome_message = """
     **歡迎使用樂園營運決策助手系統**
@@ -91,61 +33,28 @@ async def on_chat_start():
 
 @cl.on_message
 async def on_message(message: cl.Message):
+    # 一則訊息一個 trace：底下的 LLM、MCP 工具、檢索與外部 HTTP span 共用同一個 trace id
+    with tracing.span("chat.message", session=cl.context.session.id) as current:
+        current.key = await answer(message)
 
-    agent = cl.user_session.get("agent")
 
-    ui_msg = cl.Message(content="")
-    await ui_msg.send()
-
-    async for chunk, metadata in agent.astream(
-        {"messages": [{"role": "user", "content": message.content}]},
-        stream_mode="messages",
-    ):
-        if metadata.get("langgraph_node") == "model":
-            await ui_msg.stream_token(chunk.text)
-
-    await ui_msg.update()
-import chainlit as cl
-from ai.agent import create_my_agent
-
-
-@cl.on_chat_start
-async def on_chat_start():
-    build_agent = create_my_agent()
-    agent = await build_agent()
-
-    cl.user_session.set("agent", agent)
-
-    welcome_message = """
-    **歡迎使用樂園營運決策助手系統**
-    我可以協助您：
-    A.查詢即時天氣資訊
-    B.根據天氣提供設施營運建議
-    C.推播營運決策通知
-
-    使用方式：
-    1. 直接詢問天氣狀況 例如：「現在的天氣如何？」
-    2. 詢問特定天氣的營運規則 例如：「雨天時哪些設施要關閉？」
-    3. 請求綜合建議 例如：「根據目前天氣，給我營運建議」
-    4. 推播LINE Notify通知
-    """
-
-    await cl.Message(content=welcome_message).send()
-
-
-@cl.on_message
-async def on_message(message: cl.Message):
+async def answer(message: cl.Message) -> str:
+    """回覆訊息，回傳走的路徑 (fast / cache / pipeline / agent)"""
 
-    agent = cl.user_session.get("agent")
+    # 後續問題的答案取決於對話歷史，只有 session 的第一個問題可以共用快取；
+    # 每條路徑都會寫入對話歷史，所以一進來就標記
+    first_turn = not cl.user_session.get("asked")
+    cl.user_session.set("asked", True)
 
     ui_msg = cl.Message(content="")
     await ui_msg.send()
+    async with TokenStream(ui_msg) as stream:
+        reply = await respond(
+            message.content, cl.context.session.id, stream.write, first_turn=first_turn,
+        )
+    return reply.path
 
-    async for chunk, metadata in agent.astream(
-        {"messages": [{"role": "user", "content": message.content}]},
-        stream_mode="messages",
-    ):
-        if metadata.get("langgraph_node") == "model":
-            await ui_msg.stream_token(chunk.text)
 
-    await ui_msg.update()
\ No newline at end of file
+@cl.on_chat_end
+async def on_chat_end():
+    agent_runtime.end_session(cl.context.session.id)
@@ -0,0 +1,139 @@
+"""
+情境 C 決策報告：現行 agent 迴圈 vs 並行流程的端對端延遲。
+
+LLM 以固定延遲的假模型代替 (首字延遲 + 每段間隔)，天氣走離線回放的 MCP 伺服器，
+手冊檢索兩邊都用同一個本機 BM25 索引，量到的差異只來自流程編排：
+
+- agent：LLM 決定呼叫 classifyWeather → 工具 → LLM 決定檢索 → 檢索 → LLM 串流報告
+- pipeline：classifyWeather 與檢索並行 → 一次 LLM 串流報告
+
+    python benchmarks/bench_decision_report.py --runs 5 --llm-latency 0.8
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from ai.decision_report import SCENARIO_QUERIES, stream_report
+from benchmarks.bench_mcp_pool import URL, start_weather_server
+from mcp_client.session_pool import SessionPool
+from rag import ingestion
+from rag.bm25 import BM25Index
+
+QUESTION = "根據目前天氣給我營運建議"
+
+
+@dataclass
+class Chunk:
+    text: str
+
+
+class FakeLLM:
+    """首字前等待 latency 秒，之後每隔 interval 秒吐一段固定文字"""
+
+    def __init__(self, latency: float, interval: float = 0.02, chunks: int = 40):
+        self.latency = latency
+        self.interval = interval
+        self.chunks = chunks
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(self.latency)
+        return Chunk("")
+
+    async def astream(self, messages):
+        await asyncio.sleep(self.latency)
+        for _ in range(self.chunks):
+            await asyncio.sleep(self.interval)
+            yield Chunk("報告內容")
+
+
+def build_retriever():
+    sources = [str(ROOT / "樂園營運手冊Ver3.md"), str(ROOT / "樂園營運手冊.pdf")]
+    chunks = [
+        chunk
+        for section in ingestion.load_sections(sources)
+        for chunk in ingestion.split_section(section)
+    ]
+    by_id = {str(n): chunk for n, chunk in enumerate(chunks)}
+    bm25 = BM25Index(list(by_id), [chunk.page_content for chunk in chunks])
+
+    async def retrieve(query: str, k: int = 3):
+        return [by_id[doc_id] for doc_id, _ in bm25.search(query, k=k)]
+    return retrieve
+
+
+def format_docs(docs) -> str:
+    return "\n\n".join(doc.page_content for doc in docs)
+
+
+async def agent_loop(llm, call_tool, retrieve) -> tuple[float, float]:
+    start = time.perf_counter()
+    await llm.ainvoke([])
+    classification = await call_tool("classifyWeather", {"LocationName": "霧峰區"})
+    await llm.ainvoke([])
+    scenario = json.loads(classification[0]["text"]).get("scenario", "sunny")
+    await retrieve(SCENARIO_QUERIES[scenario])
+    first = None
+    async for _ in llm.astream([]):
+        first = first or time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+async def pipeline(llm, call_tool, retrieve) -> tuple[float, float]:
+    start = time.perf_counter()
+    first = None
+    async for _ in stream_report(QUESTION, "霧峰區", llm, call_tool, retrieve, format_docs):
+        first = first or time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+async def run(runs: int, latency: float) -> dict:
+    pool = SessionPool({"Weather": {"url": URL}})
+    proxy = pool.proxy("Weather")
+
+    async def call_tool(name, args):
+        result = await proxy.call_tool(name, args)
+        return [{"type": "text", "text": block.text} for block in result.content]
+
+    llm = FakeLLM(latency)
+    retrieve = build_retriever()
+    await call_tool("classifyWeather", {"LocationName": "霧峰區"})
+
+    report = {}
+    for name, flow in (("agent_loop", agent_loop), ("pipeline", pipeline)):
+        samples = [await flow(llm, call_tool, retrieve) for _ in range(runs)]
+        report[name] = {
+            "first_token_s": round(statistics.median(s[0] for s in samples), 3),
+            "total_s": round(statistics.median(s[1] for s in samples), 3),
+        }
+    await pool.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = start_weather_server(tmp)
+        try:
+            report = asyncio.run(run(args.runs, args.llm_latency))
+        finally:
+            server.terminate()
+            server.wait()
+    print(json.dumps({"llm_latency_s": args.llm_latency, **report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+離線端對端 benchmark：情境 A～D 走完整條訊息處理流程。
+
+- mcp_servers/weather.py 與 line_notify.py 以子行程啟動，連到本機假 CWA / LINE 伺服器
+  (stub_http 回放錄製的 F-D0047-073，LINE 一律回 200)
+- Gemini 換成照腳本呼叫工具的 ScriptedChatModel
+- 手冊檢索預設用本機 BM25 (不需下載嵌入模型)，--real-kb 時使用實際的知識庫
+- 每則訊息經過與 app.py 相同的 ai.responder.respond：快速路徑 → 情境 C 流程 → agent；
+  --path agent 時一律交給 agent，用來比較兩者；語意快取只在 --real-kb 時使用
+
+輸出各情境的延遲與首字時間 p50/p95/p99、工具 / LLM 呼叫數與整體吞吐量 (JSON)，
+附上 git commit 方便跨版本比較。
+
+    python benchmarks/bench_e2e.py --requests 20 --concurrency 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.fake_chat_model import ScriptedChatModel, usage
+from benchmarks.stub_http import cwa_routes, line_routes, start_stub_server
+
+REGION = "霧峰區"
+
+SCENARIOS = {
+    "A": "現在的天氣如何？",
+    "B": "雨天時哪些設施要關閉？",
+    "C": "根據目前天氣，給我營運建議",
+    "D": "發送雨天推播",
+}
+
+# agent 在各情境應呼叫的工具 (見 ai/prompt.py)
+SCRIPTS = {
+    SCENARIOS["A"]: [{"name": "getWeather", "args": {"LocationName": REGION}}],
+    SCENARIOS["B"]: [{"name": "search_knowledge_base", "args": {"query": "雨天 關閉設施"}}],
+    SCENARIOS["C"]: [
+        {"name": "classifyWeather", "args": {"LocationName": REGION}},
+        {"name": "search_knowledge_base", "args": {"query": "雨天營運規範 關閉設施"}},
+    ],
+    SCENARIOS["D"]: [{"name": "push_message", "args": {"weather_type": "rainy", "region": REGION}}],
+}
+
+SERVERS = (("weather.py", 8002), ("line_notify.py", 8001))
+
+
+def start_mcp_server(script: str, port: int, env: dict) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, script], cwd=ROOT / "mcp_servers", env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{script} 啟動失敗 (exit {proc.returncode})")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{script} 沒有在 port {port} 啟動")
+
+
+def server_env(base_url: str, tmp: str) -> dict:
+    env = dict(
+        os.environ,
+        CWA_API_BASE=f"{base_url}/api/v1/rest/datastore",
+        Weather_API_KEY="bench",
+        WEATHER_SNAPSHOT_DB=os.path.join(tmp, "snapshots.db"),
+        LINE_API_BASE=f"{base_url}/v2/bot",
+        CHANNEL_ACCESS_TOKEN="bench",
+        LINE_OUTBOX_DB=os.path.join(tmp, "outbox.db"),
+        LINE_SEGMENT_FILE=os.path.join(tmp, "segments.json"),
+        # 每次推播都實際送出，不被去重抑制
+        PUSH_DEDUP_WINDOW="0",
+    )
+    env.pop("WEATHER_FIXTURE", None)
+    return env
+
+
+def percentiles(samples: list[float]) -> dict:
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None}
+    samples = sorted(samples)
+
+    def rank(q):
+        return round(samples[min(int(q * len(samples)), len(samples) - 1)], 4)
+    return {"p50": rank(0.5), "p95": rank(0.95), "p99": rank(0.99)}
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Harness:
+    def __init__(self, path: str, cache=None):
+        from ai.agent import agent_runtime
+        from ai.responder import respond
+        from ai import tools
+
+        self.path = path
+        self.cache = cache
+        self.runtime = agent_runtime
+        self.respond = respond
+        self.tools = tools
+
+    async def handle(self, text: str, thread_id: str) -> dict:
+        """經過與 app.py 相同的 ai.responder.respond，回傳延遲、首字時間與呼叫數"""
+        counter = Counter()
+        usage.set(counter)
+        start = time.perf_counter()
+        first = None
+
+        async def call_tool(name, args):
+            counter["tool_calls"] += 1
+            return await self.runtime.call_tool(name, args)
+
+        async def retrieve(query, k=3):
+            counter["tool_calls"] += 1
+            return await self.tools.retrieve(query, k)
+
+        async def write(piece):
+            nonlocal first
+            if piece and first is None:
+                first = time.perf_counter() - start
+
+        reply = await self.respond(
+            text, thread_id, write, shortcuts=self.path == "app", cache=self.cache,
+            call_tool=call_tool, retrieve=retrieve,
+        )
+        counter["tool_calls"] += len(reply.tools)
+
+        latency = time.perf_counter() - start
+        self.runtime.end_session(thread_id)
+        return {
+            "path": reply.path,
+            "latency_s": latency,
+            "ttft_s": first if first is not None else latency,
+            **counter,
+        }
+
+
+def bm25_retrieve():
+    from benchmarks.bench_decision_report import build_retriever
+    return build_retriever()
+
+
+async def run(args) -> dict:
+    import ai.agent
+    import ai.tools
+
+    llm = ScriptedChatModel(
+        scripts=SCRIPTS,
+        first_token_latency=args.llm_latency,
+        token_interval=args.token_interval,
+        answer_tokens=args.answer_tokens,
+    )
+    ai.agent.create_llm = lambda: llm
+    if not args.real_kb:
+        ai.tools.retrieve = bm25_retrieve()
+
+    # 語意快取要用實際的嵌入模型，只在 --real-kb 時開啟
+    from ai.answer_cache import answer_cache
+    harness = Harness(args.path, cache=answer_cache if args.real_kb else None)
+    scenarios = args.scenarios.split(",")
+
+    # 暖機：建立 agent、MCP 連線與伺服器端快取
+    for name in scenarios:
+        await harness.handle(SCENARIOS[name], f"warmup-{name}")
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    results = {name: [] for name in scenarios}
+    errors = Counter()
+
+    async def one(n: int, name: str):
+        async with semaphore:
+            try:
+                results[name].append(await harness.handle(SCENARIOS[name], f"bench-{n}"))
+            except Exception:
+                errors[name] += 1
+
+    jobs = [(n, scenarios[n % len(scenarios)]) for n in range(args.requests * len(scenarios))]
+    start = time.perf_counter()
+    await asyncio.gather(*(one(n, name) for n, name in jobs))
+    wall = time.perf_counter() - start
+
+    report = {}
+    for name, samples in results.items():
+        report[name] = {
+            "question": SCENARIOS[name],
+            "requests": len(samples),
+            "errors": errors[name],
+            "paths": dict(Counter(s["path"] for s in samples)),
+            "latency_s": percentiles([s["latency_s"] for s in samples]),
+            "ttft_s": percentiles([s["ttft_s"] for s in samples]),
+            "tool_calls": round(sum(s.get("tool_calls", 0) for s in samples) / max(len(samples), 1), 2),
+            "llm_calls": round(sum(s.get("llm_calls", 0) for s in samples) / max(len(samples), 1), 2),
+        }
+    done = sum(len(samples) for samples in results.values())
+    return {
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(done / wall, 2) if wall else None,
+        "scenarios": report,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", default="A,B,C,D")
+    parser.add_argument("--requests", type=int, default=20, help="每個情境的請求數")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--path", choices=("app", "agent"), default="app")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="假模型每次呼叫的首字延遲 (秒)")
+    parser.add_argument("--token-interval", type=float, default=0.02)
+    parser.add_argument("--answer-tokens", type=int, default=40)
+    parser.add_argument("--upstream-delay", type=float, default=0.05, help="假 CWA / LINE 的回應延遲 (秒)")
+    parser.add_argument("--real-kb", action="store_true", help="使用實際的向量知識庫")
+    args = parser.parse_args()
+
+    stub, base_url = start_stub_server(cwa_routes() | line_routes(), delay=args.upstream_delay)
+    servers = []
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            env = server_env(base_url, tmp)
+            servers = [start_mcp_server(script, port, env) for script, port in SERVERS]
+            report = asyncio.run(run(args))
+        finally:
+            for proc in servers:
+                proc.terminate()
+                proc.wait()
+            stub.shutdown()
+
+    print(json.dumps({
+        "commit": git_commit(),
+        "config": vars(args),
+        "upstream_requests": len(stub.requests),
+        **report,
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+比較每次重建 Flex dict + json.dumps 與預先序列化模板的 bytes 拼接。
+
+    python benchmarks/bench_flex_templates.py --n 20000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "mcp_servers"))
+# 匯入 line_notify 時就會開啟推播 outbox，放到暫存目錄，不在專案裡留下資料庫
+os.environ["LINE_OUTBOX_DB"] = os.path.join(tempfile.mkdtemp(), "outbox.db")
+
+from flex_templates import TemplateRegistry, build_flex_message
+from line_notify import TEMPLATES
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=20000)
+    args = parser.parse_args()
+
+    registry = TemplateRegistry(TEMPLATES)
+    template = {**TEMPLATES["rainy"], "title": TEMPLATES["rainy"]["title"].replace("{region}", "霧峰區")}
+
+    def rebuild():
+        return json.dumps({"messages": [build_flex_message(template)]}).encode()
+
+    def splice():
+        return registry.render("rainy", region="霧峰區", weather="短暫陣雨 25°C")
+
+    rebuild_s = timeit.timeit(rebuild, number=args.n)
+    splice_s = timeit.timeit(splice, number=args.n)
+
+    print(json.dumps({
+        "n": args.n,
+        "rebuild_us": round(rebuild_s / args.n * 1e6, 2),
+        "splice_us": round(splice_s / args.n * 1e6, 2),
+        "speedup": round(rebuild_s / splice_s, 1),
+        "payload_bytes": len(splice()),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
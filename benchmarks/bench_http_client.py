@@ -0,0 +1,69 @@
+"""
+比較阻塞式 requests 與共用非同步連線池在併發工具呼叫下的表現。
+
+    python benchmarks/bench_http_client.py --calls 20 --delay 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_http import cwa_routes, start_stub_server
+from mcp_servers import http_client
+
+
+def run_blocking(url: str, calls: int) -> float:
+    # 同步 tool handler 會卡住事件迴圈，效果等同逐一呼叫
+    start = time.perf_counter()
+    for _ in range(calls):
+        requests.get(url, params={"LocationName": "霧峰區"}).json()
+    return time.perf_counter() - start
+
+
+async def run_pooled(url: str, calls: int) -> float:
+    start = time.perf_counter()
+    responses = await asyncio.gather(
+        *(http_client.get(url, params={"LocationName": "霧峰區"}) for _ in range(calls))
+    )
+    for response in responses:
+        response.json()
+    elapsed = time.perf_counter() - start
+    await http_client.aclose()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--delay", type=float, default=0.1, help="假伺服器每次回應延遲 (秒)")
+    args = parser.parse_args()
+
+    path = "/api/v1/rest/datastore/F-D0047-073"
+    # 兩種模式各用一台假伺服器，避免前一輪殘留的連線互相干擾
+    server, base_url = start_stub_server(cwa_routes(), delay=args.delay)
+    pooled = asyncio.run(run_pooled(base_url + path, args.calls))
+    server.shutdown()
+
+    server, base_url = start_stub_server(cwa_routes(), delay=args.delay)
+    blocking = run_blocking(base_url + path, args.calls)
+    server.shutdown()
+
+    print(json.dumps({
+        "calls": args.calls,
+        "upstream_delay_s": args.delay,
+        "per_host_limit": http_client.PER_HOST_LIMIT,
+        "blocking_s": round(blocking, 3),
+        "pooled_s": round(pooled, 3),
+        "speedup": round(blocking / pooled, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
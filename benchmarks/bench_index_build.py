@@ -0,0 +1,112 @@
+"""
+建索引與載入索引的量測。
+
+1. 以手冊各節複製出一份大型多手冊語料，比較單一行程與行程池批次嵌入的 chunks/s
+2. 在子行程中分別以一般載入與唯讀 mmap 開啟同一份索引，比較每個 worker 的私有記憶體 (RssAnon)
+
+    python benchmarks/bench_index_build.py --copies 200 --workers 4
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from rag import ingestion
+from rag.embedding_pool import embed_documents
+from rag.rag_service import EMBEDDING_MODEL, SOURCES
+
+MEMORY_PROBE = """
+import json, sys
+import faiss
+from langchain_community.vectorstores import FAISS
+from langchain_huggingface import HuggingFaceEmbeddings
+
+def rss():
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("Rss"):
+                name, value = line.split(":")
+                fields[name] = int(value.split()[0]) / 1024
+    return fields
+
+folder, mmap = sys.argv[1], sys.argv[2] == "1"
+embeddings = HuggingFaceEmbeddings(model_name=sys.argv[3])
+before = rss()
+flags = (faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY) if mmap else 0
+db = FAISS.load_local(folder, embeddings, allow_dangerous_deserialization=True, io_flags=flags)
+db.similarity_search("雨天哪些設施要關閉", k=3)
+after = rss()
+print(json.dumps({k: round(after[k] - before[k], 1) for k in ("RssAnon", "RssFile")}))
+"""
+
+
+def synthetic_corpus(copies: int) -> list[str]:
+    os.chdir(ROOT)
+    chunks = [
+        chunk.page_content
+        for section in ingestion.load_sections(SOURCES)
+        for chunk in ingestion.split_section(section)
+    ]
+    return [f"第{n}園區\n{text}" for n in range(copies) for text in chunks]
+
+
+def probe_memory(folder: str, mmap: bool) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", MEMORY_PROBE, folder, "1" if mmap else "0", EMBEDDING_MODEL],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--copies", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    from langchain_community.vectorstores import FAISS
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    texts = synthetic_corpus(args.copies)
+
+    throughput = {}
+    for workers in sorted({1, args.workers}):
+        start = time.perf_counter()
+        vectors = embed_documents(embeddings, texts, EMBEDDING_MODEL, workers=workers,
+                                  batch_size=args.batch_size)
+        elapsed = time.perf_counter() - start
+        throughput[f"workers_{workers}"] = {
+            "seconds": round(elapsed, 2),
+            "chunks_per_s": round(len(texts) / elapsed, 1),
+        }
+
+    with tempfile.TemporaryDirectory() as folder:
+        db = FAISS.from_embeddings(list(zip(texts, vectors)), embeddings)
+        db.save_local(folder)
+        memory = {
+            "load_mb": probe_memory(folder, mmap=False),
+            "mmap_mb": probe_memory(folder, mmap=True),
+        }
+        index_mb = round(os.path.getsize(os.path.join(folder, "index.faiss")) / 2**20, 1)
+
+    print(json.dumps({
+        "chunks": len(texts),
+        "index_mb": index_mb,
+        "embedding": throughput,
+        "worker_memory": memory,
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+對本機假 LINE 端點驗證推播管線：限流、429 重試與真實狀態回報。
+
+    python benchmarks/bench_line_delivery.py --pushes 20 --throttle-first 3
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "mcp_servers"))
+
+from benchmarks.stub_http import line_routes, start_stub_server
+
+
+async def run(pushes: int) -> dict:
+    import http_client
+    import line_notify
+
+    start = time.perf_counter()
+    queued = [await line_notify.push_message("rainy", force=True) for _ in range(pushes)]
+    enqueue_s = time.perf_counter() - start
+
+    results = [await line_notify.outbox.wait(q["delivery_id"]) for q in queued]
+    total_s = time.perf_counter() - start
+
+    # 冪等：時間窗內重複的推播應被抑制
+    first = await line_notify.push_message("sunny", wait=True)
+    duplicate = await line_notify.push_message("sunny")
+    await line_notify.outbox.stop()
+    await http_client.aclose()
+
+    return {
+        "pushes": pushes,
+        "enqueue_ms": round(enqueue_s * 1000, 2),
+        "delivered_s": round(total_s, 3),
+        "sent": sum(r["status"] == "sent" for r in results),
+        "failed": sum(r["status"] == "failed" for r in results),
+        "max_attempts": max(r["attempts"] for r in results),
+        "request_ids": sorted({r.get("request_id") for r in results})[:5],
+        "duplicate_suppressed": duplicate["status"] == "suppressed"
+        and duplicate["delivery_id"] == first["delivery_id"],
+        "metrics": line_notify.outbox.metrics,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pushes", type=int, default=20)
+    parser.add_argument("--throttle-first", type=int, default=3, help="前幾個請求回 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    server, base_url = start_stub_server(line_routes(args.throttle_first, args.retry_after))
+    os.environ["LINE_API_BASE"] = f"{base_url}/v2/bot"
+    os.environ["LINE_OUTBOX_DB"] = os.path.join(tempfile.mkdtemp(), "outbox.db")
+    print(json.dumps(asyncio.run(run(args.pushes)), indent=2, ensure_ascii=False))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
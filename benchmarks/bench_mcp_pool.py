@@ -0,0 +1,117 @@
+"""
+比較每次工具呼叫都重新建立 MCP session (MultiServerMCPClient 的預設行為)
+與連線池長駐 session 的單次呼叫成本。天氣伺服器以錄製檔離線回放。
+
+    python benchmarks/bench_mcp_pool.py --calls 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from mcp import ClientSession
+from mcp_client.session_pool import SessionPool, streamable_http_client
+
+URL = "http://127.0.0.1:8002/mcp"
+FIXTURE = ROOT / "mcp_servers" / "fixtures" / "F-D0047-073.json"
+ARGS = {"LocationName": "霧峰區"}
+
+
+def start_weather_server(tmp: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        WEATHER_FIXTURE=str(FIXTURE),
+        WEATHER_SNAPSHOT_DB=os.path.join(tmp, "snapshots.db"),
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "weather.py"], cwd=ROOT / "mcp_servers", env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", 8002), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("天氣 MCP 伺服器沒有啟動")
+
+
+async def fresh_call():
+    async with streamable_http_client(URL) as (read, write, _):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            return await session.call_tool("getWeather", ARGS)
+
+
+def summarize(samples: list[float]) -> dict:
+    samples = sorted(samples)
+    return {
+        "mean_ms": round(statistics.mean(samples), 2),
+        "p50_ms": round(samples[len(samples) // 2], 2),
+        "p95_ms": round(samples[max(int(len(samples) * 0.95) - 1, 0)], 2),
+    }
+
+
+async def timed(call) -> float:
+    start = time.perf_counter()
+    await call()
+    return (time.perf_counter() - start) * 1000
+
+
+async def run(calls: int, concurrency: int) -> dict:
+    # 先暖一次伺服器端快取，兩邊量到的都是快取命中
+    await fresh_call()
+    fresh = [await timed(fresh_call) for _ in range(calls)]
+
+    pool = SessionPool({"Weather": {"url": URL}})
+    proxy = pool.proxy("Weather")
+    await proxy.call_tool("getWeather", ARGS)
+    pooled = [await timed(lambda: proxy.call_tool("getWeather", ARGS)) for _ in range(calls)]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(proxy.call_tool("getWeather", ARGS) for _ in range(concurrency)))
+    burst_s = time.perf_counter() - start
+
+    stats = pool.stats()
+    await pool.close()
+    return {
+        "calls": calls,
+        "fresh_session": summarize(fresh),
+        "pooled_session": summarize(pooled),
+        "speedup": round(statistics.mean(fresh) / statistics.mean(pooled), 1),
+        f"pooled_burst_{concurrency}_s": round(burst_s, 3),
+        "pool": stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = start_weather_server(tmp)
+        try:
+            report = asyncio.run(run(args.calls, args.concurrency))
+        finally:
+            server.terminate()
+            server.wait()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
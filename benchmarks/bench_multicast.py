@@ -0,0 +1,67 @@
+"""
+分眾推播 fan-out 驗證：產生大量假 user ID，對本機假 LINE 端點送出 multicast，
+確認每位收件人剛好收到一次，並量測總耗時。
+
+    python benchmarks/bench_multicast.py --recipients 50000 --delay 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "mcp_servers"))
+
+from benchmarks.stub_http import line_routes, start_stub_server
+
+
+async def run(segment_file: str) -> dict:
+    import http_client
+    import line_notify
+
+    line_notify.segments = line_notify.SegmentStore(segment_file)
+    start = time.perf_counter()
+    result = await line_notify.push_to_segment("bench", "rainy")
+    elapsed = time.perf_counter() - start
+    await http_client.aclose()
+    return {"elapsed_s": round(elapsed, 3), **result}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipients", type=int, default=50000)
+    parser.add_argument("--delay", type=float, default=0.05, help="假 LINE 每次回應延遲 (秒)")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    user_ids = [f"U{i:032x}" for i in range(args.recipients)]
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump({"bench": user_ids}, f)
+
+    server, base_url = start_stub_server(line_routes(), delay=args.delay)
+    os.environ["LINE_API_BASE"] = f"{base_url}/v2/bot"
+    os.environ["LINE_OUTBOX_DB"] = os.path.join(tempfile.mkdtemp(), "outbox.db")
+    result = asyncio.run(run(f.name))
+    server.shutdown()
+    os.unlink(f.name)
+
+    received = Counter(
+        uid for req in server.requests for uid in json.loads(req["body"])["to"]
+    )
+    result["stub_requests"] = len(server.requests)
+    result["delivered_exactly_once"] = (
+        len(received) == args.recipients and set(received.values()) == {1}
+    )
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
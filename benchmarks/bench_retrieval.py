@@ -0,0 +1,82 @@
+"""
+手冊檢索的離線評估：vector / bm25 / hybrid 三種模式的 recall@k 與每題延遲
+(含查詢嵌入，bm25 不需要嵌入)。
+每題的 expected 是章節編號 (第X章 / X.Y)，前 k 筆結果中任一筆屬於該節即算命中。
+
+    python benchmarks/bench_retrieval.py --k 3
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from rag.hybrid import MODES, HybridRetriever
+from rag.ingestion import section_key
+from rag.rag_service import build_bm25_index, load_vector_store
+
+EVAL_FILE = Path(__file__).resolve().parent / "data" / "manual_eval.jsonl"
+
+
+def load_eval(path: Path) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(retriever: HybridRetriever, embeddings, cases: list[dict], k: int) -> dict:
+    """延遲是每題完整檢索的時間；只有 bm25 不需要查詢向量，不計嵌入時間"""
+    hits, latencies, search_latencies, misses = 0, [], [], []
+    for case in cases:
+        start = time.perf_counter()
+        vector = embeddings.embed_query(case["question"]) if retriever.mode != "bm25" else None
+        searched = time.perf_counter()
+        docs = retriever.retrieve(case["question"], vector, k=k)
+        end = time.perf_counter()
+        latencies.append((end - start) * 1000)
+        search_latencies.append((end - searched) * 1000)
+
+        found = {label for doc in docs for label in section_key(doc)}
+        if found & set(case["expected"]):
+            hits += 1
+        else:
+            misses.append(case["question"])
+
+    latencies.sort()
+    return {
+        f"recall@{k}": round(hits / len(cases), 3),
+        "mean_ms": round(statistics.mean(latencies), 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        # 不含嵌入，只有檢索本身
+        "search_mean_ms": round(statistics.mean(search_latencies), 2),
+        "misses": misses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--eval-file", default=str(EVAL_FILE))
+    args = parser.parse_args()
+
+    # 索引路徑是相對於專案根目錄
+    os.chdir(ROOT)
+    store = load_vector_store()
+    bm25 = build_bm25_index(store)
+    cases = load_eval(Path(args.eval_file))
+
+    results = {
+        mode: evaluate(HybridRetriever(store, bm25, mode=mode), store.embeddings, cases, args.k)
+        for mode in MODES
+    }
+    print(json.dumps({"questions": len(cases), "chunks": len(bm25), **results},
+                     ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
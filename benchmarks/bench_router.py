@@ -0,0 +1,134 @@
+"""
+快速路徑量測：
+
+1. 路由判斷本身的耗時，以及一組標註好的問句中有多少被正確分流 (不該走快速路徑的絕不能被攔下)
+2. 對離線天氣 MCP 伺服器跑「現在的天氣如何」的完整快速路徑 (路由 + 工具 + 模板)
+
+    python benchmarks/bench_router.py --calls 50
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from ai import router
+from benchmarks.bench_mcp_pool import URL, start_weather_server
+from mcp_client.session_pool import SessionPool
+
+# (問句, 預期的快速路徑意圖；None 表示應交給 agent)
+CASES = [
+    ("現在的天氣如何", "weather"),
+    ("今天天氣怎麼樣？", "weather"),
+    ("大里區現在天氣", "weather"),
+    ("目前氣溫幾度", "weather"),
+    ("發送雨天推播", "push"),
+    ("幫我推播颱風停園通知", "push"),
+    ("發布高溫推播到太平區", "push"),
+    ("推播晴天通知", "push"),
+    ("請幫我發送颱風通知", "push"),
+    ("再發雨天推播", "push"),
+    ("傳LINE雨天通知給遊客", "push"),
+    ("霧峰區跟大里區的天氣", None),
+    ("未來三小時會下雨嗎", None),
+    ("雨天時哪些設施要關閉", None),
+    ("根據目前天氣給我營運建議", None),
+    ("今天天氣適合開放戶外設施嗎", None),
+    ("要不要發送雨天推播？", None),
+    ("依目前天氣發送推播", None),
+    ("只發給設施人員雨天通知", None),
+    ("不要發送雨天推播", None),
+    ("先別推播雨天通知", None),
+    ("取消雨天推播", None),
+    ("不用發送颱風通知", None),
+    ("推播雨天模板長怎樣", None),
+    ("發送雨天推播了沒", None),
+    ("雨天推播發送了沒", None),
+    ("發送雨天推播好了沒", None),
+    ("雨天推播發送狀態", None),
+    ("發送雨天推播的結果", None),
+    ("發送雨天推播失敗了", None),
+    ("查詢雨天推播", None),
+    ("誰發送了雨天推播", None),
+    ("為何發送雨天推播", None),
+    ("剛剛發送雨天推播", None),
+    ("已經發送雨天推播", None),
+    ("昨天發送雨天推播", None),
+    ("明天發送雨天推播", None),
+    ("下午三點發送雨天推播", None),
+    ("一小時後發送雨天推播", None),
+    ("發送雨天推播的時間", None),
+    ("昨天天氣如何", None),
+    ("你好", None),
+]
+
+
+def evaluate() -> dict:
+    correct, false_routes = 0, []
+    for text, expected in CASES:
+        selected = router.route(text)
+        intent = selected.intent if selected else None
+        correct += intent == expected
+        if expected is None and intent is not None:
+            false_routes.append(text)
+    n = 2000
+    route_us = timeit.timeit(lambda: [router.route(text) for text, _ in CASES], number=n)
+    return {
+        "cases": len(CASES),
+        "accuracy": round(correct / len(CASES), 3),
+        "false_routes": false_routes,
+        "route_us": round(route_us / (n * len(CASES)) * 1e6, 2),
+    }
+
+
+async def fast_path(calls: int) -> dict:
+    pool = SessionPool({"Weather": {"url": URL}})
+    proxy = pool.proxy("Weather")
+
+    async def call_tool(name, args):
+        result = await proxy.call_tool(name, args)
+        return [{"type": "text", "text": block.text} for block in result.content]
+
+    await router.handle("現在的天氣如何", call_tool)
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        reply = await router.handle("現在的天氣如何", call_tool)
+        samples.append((time.perf_counter() - start) * 1000)
+    await pool.close()
+
+    samples.sort()
+    return {
+        "calls": calls,
+        "mean_ms": round(statistics.mean(samples), 2),
+        "p95_ms": round(samples[max(int(len(samples) * 0.95) - 1, 0)], 2),
+        "reply": reply,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=50)
+    args = parser.parse_args()
+
+    report = {"routing": evaluate()}
+    with tempfile.TemporaryDirectory() as tmp:
+        server = start_weather_server(tmp)
+        try:
+            report["weather_fast_path"] = asyncio.run(fast_path(args.calls))
+        finally:
+            server.terminate()
+            server.wait()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
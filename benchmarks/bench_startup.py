@@ -0,0 +1,73 @@
+"""
+冷啟動量測：每種模式各開一個全新的 Python 行程。
+
+- eager：舊流程，import 時同步載入嵌入模型與 FAISS，之後才能送出歡迎訊息
+- lazy：背景暖機，import 後立刻可以送歡迎訊息，第一次檢索才等待就緒
+
+輸出 time-to-first-welcome 與 time-to-first-retrieval (秒，從行程啟動開始算)。
+
+    python benchmarks/bench_startup.py --runs 3
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+QUERY = "雨天哪些設施要關閉"
+
+EAGER = f"""
+import time, json
+t0 = time.perf_counter()
+from rag.rag_service import load_vector_store
+vector_store = load_vector_store()
+welcome = time.perf_counter() - t0
+vector_store.similarity_search({QUERY!r}, k=3)
+retrieval = time.perf_counter() - t0
+print(json.dumps({{"welcome": welcome, "retrieval": retrieval}}))
+"""
+
+LAZY = f"""
+import asyncio, time, json
+t0 = time.perf_counter()
+from ai.tools import knowledge_base, search_knowledge_base
+knowledge_base.start_warmup()
+welcome = time.perf_counter() - t0
+asyncio.run(search_knowledge_base.ainvoke({{"query": {QUERY!r}}}))
+retrieval = time.perf_counter() - t0
+print(json.dumps({{"welcome": welcome, "retrieval": retrieval}}))
+"""
+
+
+def run(code: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    # 先跑一次確保索引已建好，量到的是載入而不是建索引
+    run(EAGER)
+
+    report = {}
+    for mode, code in (("eager", EAGER), ("lazy", LAZY)):
+        samples = [run(code) for _ in range(args.runs)]
+        report[mode] = {
+            "time_to_first_welcome_s": round(statistics.median(s["welcome"] for s in samples), 3),
+            "time_to_first_retrieval_s": round(statistics.median(s["retrieval"] for s in samples), 3),
+        }
+    print(json.dumps({"runs": args.runs, **report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+LINE webhook 壓力測試：本機事件產生器以固定併發送出簽章過的 delivery，
+量 webhook 的回應 (ack) 延遲、持續的每秒事件數，以及事件全部回覆完成的時間。
+
+webhook 與假 LINE (stub_http) 各在一個子行程執行，彼此與事件產生器都不搶 GIL；
+agent 以固定延遲的假回答代替，天氣選單以固定的 classifyWeather 結果代替。
+事件混合圖文選單按鈕、自由文字與一定比例的重送 (相同 webhookEventId)。
+
+    python benchmarks/bench_webhook.py --duration 10 --concurrency 32 --events-per-delivery 3
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+import uvicorn
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.stub_http import line_routes, start_stub_server
+
+SECRET = "bench-secret"
+MENU_ACTIONS = ("天氣", "客服", "場地", "最新消息", "營業資訊", "優惠活動")
+QUESTIONS = ("雨天時哪些設施要關閉？", "摩天輪今天有開嗎", "根據目前天氣，給我營運建議")
+CLASSIFICATION = {
+    "scenario": "rainy",
+    "keywords": ["雨"],
+    "weather": {"location": "霧峰區", "天氣現象": "短暫陣雨", "溫度": 24, "降雨機率": 70},
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def sign(body: bytes) -> str:
+    return base64.b64encode(hmac.new(SECRET.encode(), body, hashlib.sha256).digest()).decode()
+
+
+def make_event(users: int, menu_ratio: float) -> dict:
+    text = random.choice(MENU_ACTIONS) if random.random() < menu_ratio else random.choice(QUESTIONS)
+    return {
+        "type": "message",
+        "mode": "active",
+        "timestamp": int(time.time() * 1000),
+        "webhookEventId": uuid.uuid4().hex,
+        "deliveryContext": {"isRedelivery": False},
+        "replyToken": uuid.uuid4().hex,
+        "source": {"type": "user", "userId": f"U{random.randrange(users):032d}"},
+        "message": {"id": uuid.uuid4().hex, "type": "text", "text": text},
+    }
+
+
+def serve_stub(port: int):
+    """子行程：假 LINE reply API"""
+    start_stub_server(line_routes(), port=port)
+    while True:
+        time.sleep(3600)
+
+
+def serve(port: int, line_port: int, answer_latency: float, workers: int, queue_size: int):
+    """子行程：webhook 伺服器"""
+    from line_api.webhook_server import WebhookServer, create_app
+
+    os.environ["LINE_API_BASE"] = f"http://127.0.0.1:{line_port}/v2/bot"
+
+    async def answer(user_id, text):
+        await asyncio.sleep(answer_latency)
+        return f"**回覆**：{text}"
+
+    async def call_tool(name, tool_args):
+        return json.dumps(CLASSIFICATION, ensure_ascii=False)
+
+    server = WebhookServer(answer, call_tool, secret=SECRET, workers=workers, queue_size=queue_size)
+    uvicorn.run(create_app(server), host="127.0.0.1", port=port, log_level="warning")
+
+
+def wait_ready(base: str):
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{base}/health").raise_for_status()
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError("webhook 伺服器沒有啟動")
+
+
+def wait_drained(base: str, timeout: float = 60) -> dict:
+    """等佇列中的事件全部回覆完，回傳伺服器統計"""
+    deadline = time.monotonic() + timeout
+    while True:
+        stats = httpx.get(f"{base}/stats").json()
+        if stats.get("processed", 0) >= stats.get("accepted", 0) or time.monotonic() > deadline:
+            return stats
+        time.sleep(0.05)
+
+
+def quantiles(samples: list[float]) -> dict:
+    if not samples:
+        return {}
+    samples = sorted(samples)
+
+    def rank(q):
+        return round(samples[min(int(q * len(samples)), len(samples) - 1)] * 1000, 2)
+    return {"p50_ms": rank(0.5), "p95_ms": rank(0.95), "p99_ms": rank(0.99)}
+
+
+async def load(url: str, args) -> dict:
+    acks, statuses = [], {}
+    sent_events = 0
+    recent: list[list[dict]] = []
+    stop_at = time.monotonic() + args.duration
+
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=args.concurrency)) as client:
+        async def producer():
+            nonlocal sent_events
+            while time.monotonic() < stop_at:
+                # 一部分 delivery 是重送：沿用先前事件的 webhookEventId
+                if recent and random.random() < args.redelivery_ratio:
+                    events = [
+                        dict(event, deliveryContext={"isRedelivery": True})
+                        for event in random.choice(recent)
+                    ]
+                else:
+                    events = [make_event(args.users, args.menu_ratio) for _ in range(args.events_per_delivery)]
+                    recent.append(events)
+                    del recent[:-100]
+                body = json.dumps({"destination": "Ubench", "events": events}, ensure_ascii=False).encode()
+                start = time.perf_counter()
+                response = await client.post(
+                    url, content=body,
+                    headers={"Content-Type": "application/json", "X-Line-Signature": sign(body)},
+                )
+                acks.append(time.perf_counter() - start)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                sent_events += len(events)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(producer() for _ in range(args.concurrency)))
+        load_s = time.perf_counter() - start
+
+        # 簽章錯誤應被拒絕
+        bad = await client.post(url, content=b'{"events":[]}', headers={"X-Line-Signature": "invalid"})
+
+    return {
+        "load_s": load_s,
+        "deliveries": len(acks),
+        "events_sent": sent_events,
+        "statuses": statuses,
+        "ack_latency": quantiles(acks),
+        "bad_signature_status": bad.status_code,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--events-per-delivery", type=int, default=3)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--menu-ratio", type=float, default=0.6, help="圖文選單按鈕的比例")
+    parser.add_argument("--redelivery-ratio", type=float, default=0.05)
+    parser.add_argument("--answer-latency", type=float, default=0.5, help="假 agent 的回答時間 (秒)")
+    parser.add_argument("--workers", type=int, default=64)
+    parser.add_argument("--queue-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    port, line_port = free_port(), free_port()
+    base = f"http://127.0.0.1:{port}"
+    children = [
+        multiprocessing.Process(target=serve_stub, args=(line_port,), daemon=True),
+        multiprocessing.Process(
+            target=serve, args=(port, line_port, args.answer_latency, args.workers, args.queue_size),
+            daemon=True,
+        ),
+    ]
+    for child in children:
+        child.start()
+    try:
+        wait_ready(base)
+        report = asyncio.run(load(f"{base}/callback", args))
+        drain_start = time.perf_counter()
+        stats = wait_drained(base)
+        drain_s = time.perf_counter() - drain_start
+    finally:
+        for child in children:
+            child.terminate()
+            child.join()
+
+    load_s = report.pop("load_s")
+    processed = stats.get("processed", 0)
+    print(json.dumps({
+        "config": vars(args),
+        "deliveries_per_s": round(report["deliveries"] / load_s, 1),
+        "events_per_s": round(report["events_sent"] / load_s, 1),
+        "processed_events_per_s": round(processed / (load_s + drain_s), 1),
+        "load_s": round(load_s, 2),
+        "drain_s": round(drain_s, 2),
+        **report,
+        "server": {
+            **stats,
+            "mean_queue_wait_ms": round(stats.get("queue_wait_ms", 0) / max(stats.get("batches", 0), 1), 1),
+        },
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+照腳本回應的假聊天模型，取代 Gemini 供 benchmark 使用。
+
+依對話中最後一則使用者訊息找到腳本，腳本是依序要呼叫的工具；
+每收到一個工具結果就走下一步，工具都呼叫完後以固定延遲串流最終答案。
+延遲參數模擬首字延遲與每段輸出間隔，量到的差異只來自系統本身。
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# 每個請求各自的計數 (LLM 呼叫次數)，由 benchmark 在請求開始時設定
+usage: ContextVar[Counter | None] = ContextVar("fake_llm_usage", default=None)
+
+
+class ScriptedChatModel(BaseChatModel):
+    # 問題關鍵字 → 依序呼叫的工具 [{"name": ..., "args": {...}}]
+    scripts: dict[str, list[dict]] = {}
+    first_token_latency: float = 0.8
+    token_interval: float = 0.02
+    answer_tokens: int = 40
+    token: str = "報告內容"
+    # 只有 bind_tools 後 (agent) 才照腳本呼叫工具；直接呼叫時一律回答
+    tools_bound: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={"tools_bound": True})
+
+    def _next_call(self, messages) -> dict | None:
+        if not self.tools_bound:
+            return None
+        question, done = "", 0
+        for message in reversed(messages):
+            if isinstance(message, ToolMessage):
+                done += 1
+            elif isinstance(message, HumanMessage):
+                question = message.text
+                break
+        for keyword, script in self.scripts.items():
+            if keyword in question:
+                return script[done] if done < len(script) else None
+        return None
+
+    def _count(self):
+        counter = usage.get()
+        if counter is not None:
+            counter["llm_calls"] += 1
+
+    @staticmethod
+    def _tool_call(step: dict) -> dict:
+        return {"name": step["name"], "args": step.get("args", {}), "id": f"call_{uuid.uuid4().hex[:12]}"}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._count()
+        time.sleep(self.first_token_latency + self.token_interval * self.answer_tokens)
+        step = self._next_call(messages)
+        if step is not None:
+            message = AIMessage(content="", tool_calls=[self._tool_call(step)])
+        else:
+            message = AIMessage(content=self.token * self.answer_tokens)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        chunks = [chunk async for chunk in self._astream(messages, stop, run_manager, **kwargs)]
+        message = chunks[0].message
+        for chunk in chunks[1:]:
+            message += chunk.message
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(
+            content=message.content, tool_calls=message.tool_calls,
+        ))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._count()
+        await asyncio.sleep(self.first_token_latency)
+        step = self._next_call(messages)
+        if step is not None:
+            call = self._tool_call(step)
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[{
+                "name": call["name"],
+                "args": json.dumps(call["args"], ensure_ascii=False),
+                "id": call["id"],
+                "index": 0,
+            }]))
+            return
+        for _ in range(self.answer_tokens):
+            await asyncio.sleep(self.token_interval)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=self.token))
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(self.token, chunk=chunk)
+            yield chunk
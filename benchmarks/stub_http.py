@@ -0,0 +1,116 @@
+"""
+本機假 CWA / LINE HTTP 伺服器，供 benchmark 與離線驗證使用。
+
+    server, base_url = start_stub_server(cwa_routes(FIXTURE) | line_routes(), delay=0.1)
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+CWA_FIXTURE = ROOT / "mcp_servers" / "fixtures" / "F-D0047-073.json"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支援 keep-alive
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        for (route_method, prefix), handler in self.server.routes.items():
+            if route_method == method and url.path.startswith(prefix):
+                break
+        else:
+            handler = lambda *_: (404, {}, b"{}")
+
+        if self.server.delay:
+            time.sleep(self.server.delay)
+
+        request = {
+            "method": method,
+            "path": url.path,
+            "query": {k: v[0] for k, v in parse_qs(url.query).items()},
+            "headers": dict(self.headers),
+            "body": body,
+        }
+        with self.server.lock:
+            self.server.requests.append(request)
+
+        status, headers, payload = handler(request)
+        self.send_response(status)
+        headers = {"Content-Type": "application/json", **headers}
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def log_message(self, *args):
+        pass
+
+
+def cwa_routes(fixture_path=CWA_FIXTURE) -> dict:
+    """回放錄製的 F-D0047-073，依 LocationName 篩選"""
+    raw = Path(fixture_path).read_text(encoding="utf-8")
+    payloads = {}
+
+    def handle(request):
+        wanted = frozenset(request["query"].get("LocationName", "").split(","))
+        if wanted not in payloads:
+            data = json.loads(raw)
+            for locations in data["records"]["Locations"]:
+                locations["Location"] = [
+                    loc for loc in locations["Location"] if loc["LocationName"] in wanted
+                ]
+            payloads[wanted] = json.dumps(data, ensure_ascii=False).encode()
+        return 200, {}, payloads[wanted]
+
+    return {("GET", "/api/v1/rest/datastore/"): handle}
+
+
+def line_routes(throttle_first: int = 0, retry_after: int = 1) -> dict:
+    """
+    接受 LINE Messaging API 的推播。
+    前 throttle_first 個請求回 429 (附 Retry-After)，用來驗證限流與重試。
+    """
+    counter = {"n": 0}
+    lock = threading.Lock()
+
+    def handle(request):
+        with lock:
+            counter["n"] += 1
+            n = counter["n"]
+        request_id = f"stub-{n}"
+        if n <= throttle_first:
+            return (
+                429,
+                {"X-Line-Request-Id": request_id, "Retry-After": str(retry_after)},
+                b'{"message":"The API rate limit has been exceeded. Try again later."}',
+            )
+        return 200, {"X-Line-Request-Id": request_id}, b"{}"
+
+    return {("POST", "/v2/bot/"): handle}
+
+
+def start_stub_server(routes: dict, delay: float = 0.0, port: int = 0):
+    """在背景執行緒啟動假伺服器，回傳 (server, base_url)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+    server.daemon_threads = True
+    server.routes = routes
+    server.delay = delay
+    server.requests = []
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
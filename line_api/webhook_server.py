@@ -0,0 +1,476 @@
+"""
+LINE Messaging API webhook。
+
+LINE 要求 webhook 在期限內回應，所以 HTTP 處理只做三件事：驗證 X-Line-Signature、
+依 webhookEventId 去掉重送的事件、把這次 delivery 的事件整批放進有上限的佇列，
+然後立即回 200。佇列滿時回 503，LINE 會稍後重送。
+
+背景 worker 從佇列取出整批事件，以 reply API 回覆：
+- 圖文選單的固定按鈕 (天氣、客服、場地、最新消息、營業資訊、優惠活動) 用預先算好的回覆，
+  天氣相關的兩個依 classifyWeather 結果定期重算
+- 其他文字交給 agent；同一位使用者在同一批內的多則訊息依序回答，合併成一次 reply
+
+任何加好友的人都能傳訊息，所以這裡用的是沒有推播與分眾工具的 guest agent，
+快速路徑也不走推播。
+
+    python line_api/webhook_server.py
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import sys
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import httpx
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from rag.ingestion import load_markdown
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+CHANNEL_SECRET = os.getenv("CHANNEL_SECRET")
+PORT = int(os.getenv("WEBHOOK_PORT", "8003"))
+QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+# 記住最近多少個 webhookEventId 來判斷重送
+DEDUP_SIZE = int(os.getenv("WEBHOOK_DEDUP_SIZE", "10000"))
+# reply token 約一分鐘內有效，agent 超過此時間就改回覆忙碌訊息
+ANSWER_TIMEOUT = float(os.getenv("WEBHOOK_ANSWER_TIMEOUT", "45"))
+# LINE 的對話不會結束：每個 thread 只留最後幾則訊息，閒置超過 TTL (秒) 就整個刪除
+HISTORY_MESSAGES = int(os.getenv("WEBHOOK_HISTORY_MESSAGES", "20"))
+HISTORY_TTL = float(os.getenv("WEBHOOK_HISTORY_TTL", "86400"))
+# 天氣相關選單回覆的重算間隔 (秒)
+MENU_TTL = float(os.getenv("WEBHOOK_MENU_TTL", "300"))
+MENU_FILE = os.getenv("LINE_MENU_REPLIES", str(Path(__file__).with_name("menu_replies.json")))
+MANUAL_FILE = ROOT / "樂園營運手冊Ver3.md"
+DEFAULT_REGION = "霧峰區"
+
+# reply API 的限制：每次最多 5 則訊息、每則文字最多 5000 字
+MAX_MESSAGES = 5
+MAX_TEXT = 5000
+
+BUSY_TEXT = "目前詢問人數較多，請稍後再試一次。"
+ERROR_TEXT = "系統暫時無法回覆，請稍後再試一次。"
+SCENARIO_SECTIONS = {"sunny": "5.1", "rainy": "5.2", "typhoon": "5.3"}
+
+_MARKDOWN = re.compile(r"\*\*|`|^#+\s*", re.M)
+
+
+def verify_signature(body: bytes, signature: str | None, secret: str) -> bool:
+    """X-Line-Signature = base64(HMAC-SHA256(channel secret, request body))"""
+    if not signature or not secret:
+        return False
+    digest = hmac.new(secret.encode(), body, hashlib.sha256).digest()
+    return hmac.compare_digest(base64.b64encode(digest), signature.encode())
+
+
+def plain_text(markdown: str) -> str:
+    """LINE 不支援 Markdown，去掉粗體、程式碼與標題符號"""
+    return _MARKDOWN.sub("", markdown).strip()
+
+
+def text_messages(text: str) -> list[bytes]:
+    """文字轉成 LINE text message (預先序列化)，過長時切成多則"""
+    text = plain_text(text) or "…"
+    return [
+        json.dumps({"type": "text", "text": text[i:i + MAX_TEXT]}, ensure_ascii=False).encode()
+        for i in range(0, len(text), MAX_TEXT)
+    ]
+
+
+def reply_body(token: str, messages: list[bytes]) -> bytes:
+    return b'{"replyToken":%s,"messages":[%s]}' % (json.dumps(token).encode(), b",".join(messages))
+
+
+class EventDeduper:
+    """最近看過的 webhookEventId (有上限的 LRU)"""
+
+    def __init__(self, size: int = DEDUP_SIZE):
+        self.size = size
+        self._seen: OrderedDict[str, None] = OrderedDict()
+
+    def seen(self, event_id: str | None) -> bool:
+        return event_id is not None and event_id in self._seen
+
+    def add(self, event_id: str | None):
+        if event_id is None:
+            return
+        self._seen[event_id] = None
+        self._seen.move_to_end(event_id)
+        while len(self._seen) > self.size:
+            self._seen.popitem(last=False)
+
+
+class MenuReplies:
+    """
+    圖文選單按鈕的回覆，全部預先序列化成 message bytes。
+    客服 / 最新消息 / 優惠活動 讀 menu_replies.json，場地取自手冊第四章；
+    天氣 / 營業資訊 依 classifyWeather 的結果，每 MENU_TTL 秒重算一次。
+    """
+
+    DYNAMIC = ("天氣", "營業資訊")
+
+    def __init__(self, call_tool, replies_file: str = MENU_FILE, manual: Path = MANUAL_FILE,
+                 ttl: float = MENU_TTL, region: str = DEFAULT_REGION):
+        self._call_tool = call_tool
+        self.ttl = ttl
+        self.region = region
+        sections = {doc.metadata["section_path"]: doc.page_content for doc in load_markdown(str(manual))}
+        self._rules = {
+            scenario: self._section(sections, number)
+            for scenario, number in SCENARIO_SECTIONS.items()
+        }
+
+        with open(replies_file, encoding="utf-8") as f:
+            static = json.load(f)
+        static["場地"] = "園區設施一覽\n\n" + "\n\n".join(
+            f"{path.split(' > ')[-1]}\n{text}"
+            for path, text in sections.items()
+            if path.startswith("第四章")
+        )
+        self._static = {action: text_messages(text) for action, text in static.items()}
+        self._dynamic: dict[str, list[bytes]] = {}
+        self._expires = 0.0
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _section(sections: dict, number: str) -> str:
+        for path, text in sections.items():
+            title = path.split(" > ")[-1]
+            if title.startswith(number):
+                # 推播工具名稱是給 agent 看的，不對外顯示
+                return f"{title}\n{text.split('【推播工具】')[0].strip()}"
+        return ""
+
+    def actions(self) -> list[str]:
+        return [*self._static, *self.DYNAMIC]
+
+    async def _refresh(self):
+        from ai.router import parse_tool_result, render_weather
+
+        classification = parse_tool_result(
+            await self._call_tool("classifyWeather", {"LocationName": self.region})
+        )
+        weather = classification.get("weather", {})
+        self._dynamic = {
+            "天氣": text_messages(render_weather(weather)),
+            "營業資訊": text_messages(
+                f"{self.region} 目前天氣：{weather.get('天氣現象', '')} {weather.get('溫度', '')}°C\n\n"
+                + self._rules.get(classification.get("scenario"), "")
+            ),
+        }
+        self._expires = time.monotonic() + self.ttl
+
+    async def get(self, text: str) -> list[bytes] | None:
+        text = text.strip()
+        if text in self._static:
+            return self._static[text]
+        if text not in self.DYNAMIC:
+            return None
+        if time.monotonic() >= self._expires:
+            async with self._lock:
+                if time.monotonic() >= self._expires:
+                    try:
+                        await self._refresh()
+                    except Exception:
+                        # 天氣服務暫時失敗時沿用上一份；完全沒有資料就交給 agent
+                        logger.exception("選單天氣回覆更新失敗")
+                        self._expires = time.monotonic() + min(self.ttl, 30)
+        return self._dynamic.get(text)
+
+
+class ReplyClient:
+    """LINE reply API；body 由呼叫端預先組好"""
+
+    def __init__(self, max_connections: int = 50):
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(10, connect=3),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def reply(self, body: bytes) -> int:
+        url = os.getenv("LINE_API_BASE", "https://api.line.me/v2/bot") + "/message/reply"
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {os.getenv('CHANNEL_ACCESS_TOKEN')}",
+        }
+        for attempt in range(2):
+            try:
+                response = await self._client.post(url, headers=headers, content=body)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                # reply token 只能用一次，只在請求沒送出去的連線錯誤時重試
+                if attempt:
+                    raise
+                continue
+            return response.status_code
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+class LineThreads:
+    """
+    LINE 使用者的 agent 對話 (thread_id = line:{userId})。
+    - 同一位使用者的訊息依序處理，不會有兩個回答同時改寫同一個 thread
+    - 每次回答後只留最後 max_messages 則訊息 (從使用者訊息開始，工具呼叫與結果不會被拆開)，
+      並丟掉舊的 checkpoint；送給模型的歷史與記憶體用量都有上限
+    - 閒置超過 ttl 的 thread 整個刪除
+    runtime 需提供 history / replace_history / end_session (預設為 agent_runtime)。
+    """
+
+    def __init__(self, runtime=None, max_messages: int = HISTORY_MESSAGES, ttl: float = HISTORY_TTL,
+                 sweep_interval: float = 60):
+        self._runtime = runtime
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        # thread_id -> 最後使用時間，越舊越前面
+        self._active: OrderedDict[str, float] = OrderedDict()
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._swept = time.monotonic()
+        self.stats = defaultdict(int)
+
+    @property
+    def runtime(self):
+        if self._runtime is None:
+            from ai.agent import agent_runtime
+            self._runtime = agent_runtime
+        return self._runtime
+
+    def __len__(self):
+        return len(self._active)
+
+    @asynccontextmanager
+    async def turn(self, user_id: str):
+        """async with threads.turn(user_id) as thread_id: ... (回答一則訊息)"""
+        thread_id = f"line:{user_id}"
+        lock = self._locks.setdefault(thread_id, asyncio.Lock())
+        async with lock:
+            try:
+                yield thread_id
+            finally:
+                self._active[thread_id] = time.monotonic()
+                self._active.move_to_end(thread_id)
+            await self.trim(thread_id)
+        self.sweep()
+
+    async def trim(self, thread_id: str):
+        messages = await self.runtime.history(thread_id)
+        if len(messages) <= self.max_messages:
+            return
+        start = len(messages) - self.max_messages
+        while start < len(messages) and getattr(messages[start], "type", None) != "human":
+            start += 1
+        await self.runtime.replace_history(thread_id, messages[start:])
+        self.stats["trimmed"] += 1
+
+    def sweep(self, now: float | None = None):
+        """刪除閒置超過 ttl 的 thread；每 sweep_interval 秒最多做一次"""
+        now = time.monotonic() if now is None else now
+        if now - self._swept < self.sweep_interval:
+            return
+        self._swept = now
+        while self._active:
+            thread_id, used = next(iter(self._active.items()))
+            if now - used < self.ttl:
+                break
+            del self._active[thread_id]
+            lock = self._locks.get(thread_id)
+            if lock is not None and lock.locked():
+                # 正在回答，結束時會重新記錄
+                continue
+            self._locks.pop(thread_id, None)
+            self.runtime.end_session(thread_id)
+            self.stats["expired"] += 1
+
+
+line_threads = LineThreads()
+
+
+async def agent_answer(user_id: str, text: str) -> str:
+    """與 app.py 相同的處理順序 (ai.responder)，對外一律用 guest 模式"""
+    from ai.responder import respond
+
+    # reply API 只能整段送出，不需要逐段處理
+    async def skip(piece: str):
+        pass
+
+    async with line_threads.turn(user_id) as thread_id:
+        # LINE 的對話不會結束，沒有「第一個問題」，agent 的回答不共用快取
+        reply = await respond(text, thread_id, skip, first_turn=False, guest=True)
+    return reply.text
+
+
+async def agent_call_tool(name: str, args: dict):
+    from ai.agent import agent_runtime
+    return await agent_runtime.call_tool(name, args)
+
+
+class WebhookServer:
+    def __init__(self, answer=agent_answer, call_tool=agent_call_tool, secret: str | None = CHANNEL_SECRET,
+                 workers: int = WORKERS, queue_size: int = QUEUE_SIZE, reply_client: ReplyClient | None = None):
+        self.answer = answer
+        self.secret = secret
+        self.workers = workers
+        self.queue: asyncio.Queue | None = None
+        self.queue_size = queue_size
+        self.menu = MenuReplies(call_tool)
+        self.deduper = EventDeduper()
+        self.reply_client = reply_client or ReplyClient()
+        self._tasks: list[asyncio.Task] = []
+        self.stats = defaultdict(int)
+
+    async def start(self):
+        self.queue = asyncio.Queue(self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.reply_client.aclose()
+
+    async def callback(self, request):
+        body = await request.body()
+        if not verify_signature(body, request.headers.get("X-Line-Signature"), self.secret):
+            self.stats["bad_signature"] += 1
+            return Response(status_code=401)
+        try:
+            events = json.loads(body).get("events", [])
+        except ValueError:
+            return Response(status_code=400)
+
+        fresh = [event for event in events if not self.deduper.seen(event.get("webhookEventId"))]
+        self.stats["events"] += len(events)
+        self.stats["duplicates"] += len(events) - len(fresh)
+        if not fresh:
+            return Response(status_code=200)
+        try:
+            self.queue.put_nowait((time.monotonic(), fresh))
+        except asyncio.QueueFull:
+            # 不記錄為已處理，LINE 重送時可以再收
+            self.stats["rejected"] += len(fresh)
+            return Response(status_code=503)
+        for event in fresh:
+            self.deduper.add(event.get("webhookEventId"))
+        self.stats["accepted"] += len(fresh)
+        return Response(status_code=200)
+
+    async def _worker(self):
+        while True:
+            received, events = await self.queue.get()
+            try:
+                await self.handle_batch(events)
+            except Exception:
+                logger.exception("webhook 事件處理失敗")
+            finally:
+                self.stats["processed"] += len(events)
+                self.stats["batches"] += 1
+                self.stats["queue_wait_ms"] += int((time.monotonic() - received) * 1000)
+                self.queue.task_done()
+
+    async def _respond(self, user_id: str, text: str) -> list[bytes]:
+        messages = await self.menu.get(text)
+        if messages is not None:
+            self.stats["menu_replies"] += 1
+            return messages
+        try:
+            reply = await asyncio.wait_for(self.answer(user_id, text), ANSWER_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            reply = BUSY_TEXT
+        except Exception:
+            # 仍要用掉 reply token，使用者才不會沒有任何回應
+            logger.exception("回答失敗：%s", text)
+            self.stats["answer_errors"] += 1
+            reply = ERROR_TEXT
+        self.stats["agent_replies"] += 1
+        return text_messages(reply)
+
+    async def _answer_user(self, user_id: str, events: list[dict]):
+        """同一位使用者的訊息依序回答，用第一個 reply token 合併回覆 (超過 5 則再用下一個)"""
+        messages = []
+        for event in events:
+            messages.extend(await self._respond(user_id, event["message"]["text"]))
+        tokens = [event["replyToken"] for event in events]
+        for n, start in enumerate(range(0, len(messages), MAX_MESSAGES)):
+            if n >= len(tokens):
+                break
+            try:
+                status = await self.reply_client.reply(reply_body(tokens[n], messages[start:start + MAX_MESSAGES]))
+            except httpx.HTTPError as exc:
+                # 一位使用者回覆失敗不影響同批的其他人
+                logger.warning("LINE reply 失敗：%s", exc)
+                status = None
+            self.stats["replies" if status is not None and status < 300 else "reply_errors"] += 1
+
+    async def handle_batch(self, events: list[dict]):
+        by_user: dict[str, list[dict]] = defaultdict(list)
+        for event in events:
+            if event.get("type") != "message" or event.get("message", {}).get("type") != "text":
+                continue
+            source = event.get("source", {})
+            user = source.get("userId") or source.get("groupId") or source.get("roomId") or ""
+            by_user[user].append(event)
+        await asyncio.gather(*(self._answer_user(user, items) for user, items in by_user.items()))
+
+    async def health(self, request):
+        return JSONResponse({"status": "ok", "queue": self.queue.qsize() if self.queue else 0})
+
+    async def stats_endpoint(self, request):
+        return JSONResponse({
+            **self.stats,
+            "queue": self.queue.qsize(),
+            "menu_actions": self.menu.actions(),
+            "line_threads": {"active": len(line_threads), **line_threads.stats},
+        })
+
+
+def create_app(server: WebhookServer | None = None) -> Starlette:
+    server = server or WebhookServer()
+
+    @asynccontextmanager
+    async def lifespan(app):
+        if server.answer is agent_answer:
+            from ai.tools import knowledge_base
+            knowledge_base.start_warmup()
+        await server.start()
+        try:
+            yield
+        finally:
+            await server.stop()
+
+    app = Starlette(
+        routes=[
+            Route("/callback", server.callback, methods=["POST"]),
+            Route("/health", server.health, methods=["GET"]),
+            Route("/stats", server.stats_endpoint, methods=["GET"]),
+        ],
+        lifespan=lifespan,
+    )
+    app.state.webhook = server
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    if not CHANNEL_SECRET:
+        raise SystemExit("請在 .env 設定 CHANNEL_SECRET")
+    uvicorn.run(create_app(), host="0.0.0.0", port=PORT)
@@ -1,17 +1,21 @@
+import os
 from langchain_mcp_adapters.client import MultiServerMCPClient
+from mcp_client.session_pool import SessionPool
 
+CONNECTIONS = {
+    "LINE_Notify": {
+        "transport": "streamable-http",
+        "url": "http://127.0.0.1:8001/mcp",
+    },
+    "Weather": {
+        "transport": "streamable-http",
+        "url": "http://127.0.0.1:8002/mcp",
+    },
+}
 
-def get_mcp_client():
 
-    return MultiServerMCPClient(
-        {
-            "LINE_Notify": {
-                "transport": "streamable-http",
-                "url": "http://127.0.0.1:8001/mcp",
-            },
-            "Weather": {
-                "transport": "streamable-http",
-                "url": "http://127.0.0.1:8002/mcp",
-            },
-        }
-    )
\ No newline at end of file
+def get_mcp_client():
+    # MCP_SESSION_POOL=0 時退回每次呼叫都重新握手的 MultiServerMCPClient
+    if os.getenv("MCP_SESSION_POOL", "1") == "0":
+        return MultiServerMCPClient(CONNECTIONS)
+    return SessionPool(CONNECTIONS)
@@ -0,0 +1,306 @@
+"""
+MCP 連線池。
+
+MultiServerMCPClient 預設每次呼叫工具都重新建立 MCP session (HTTP 連線 + initialize 握手)。
+這裡每台伺服器維持幾個長駐的 session，每個 session 由自己的背景 task 持有
+(anyio 的 cancel scope 必須在同一個 task 進出)，工具呼叫透過 proxy 分派：
+
+- 每台伺服器以 semaphore 限制同時呼叫數
+- 定期 ping 檢查，斷線的 session 在下次使用時自動重連
+- 依 (伺服器, 工具) 記錄延遲直方圖
+"""
+
+import asyncio
+import bisect
+import itertools
+import logging
+import os
+import time
+
+import anyio
+from mcp import ClientSession
+from mcp.shared.exceptions import McpError
+
+from mcp_servers import tracing
+
+try:
+    from mcp.client.streamable_http import streamable_http_client
+except ImportError:  # 較舊的 mcp 版本
+    from mcp.client.streamable_http import streamablehttp_client as streamable_http_client
+
+logger = logging.getLogger(__name__)
+
+SESSIONS_PER_SERVER = int(os.getenv("MCP_POOL_SESSIONS", "2"))
+MAX_CONCURRENCY = int(os.getenv("MCP_POOL_CONCURRENCY", "8"))
+PING_INTERVAL = float(os.getenv("MCP_POOL_PING_INTERVAL", "30"))
+CONNECT_TIMEOUT = float(os.getenv("MCP_POOL_CONNECT_TIMEOUT", "10"))
+
+# 延遲直方圖的 bucket 上界 (毫秒)
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# 請求還沒送出 session 就已關閉，重送不會造成重複執行
+_NOT_SENT = (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream)
+# 伺服器重啟後不認得舊 session id (HTTP 404)，請求同樣沒有被執行
+_SESSION_TERMINATED = "Session terminated"
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total_ms = 0.0
+        self.errors = 0
+
+    def observe(self, ms: float, error: bool = False):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.total_ms += ms
+        self.errors += error
+
+    def quantile(self, q: float) -> float | None:
+        """以 bucket 上界估計分位數"""
+        total = sum(self.counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        total = sum(self.counts)
+        return {
+            "count": total,
+            "errors": self.errors,
+            "mean_ms": round(self.total_ms / total, 2) if total else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "buckets": {
+                f"le_{bound}": count
+                for bound, count in zip(LATENCY_BUCKETS_MS + ("inf",), self.counts)
+            },
+        }
+
+
+class PooledSession:
+    """一條長駐的 MCP session，由自己的 task 開啟、保持與關閉"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.session: ClientSession | None = None
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.error: BaseException | None = None
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def start(self):
+        self._ready.clear()
+        self._stop.clear()
+        self.error = None
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._ready.wait(), CONNECT_TIMEOUT)
+        except asyncio.TimeoutError:
+            await self.close()
+            raise ConnectionError(f"MCP 連線逾時：{self.url}")
+        if self.session is None:
+            raise ConnectionError(f"MCP 連線失敗：{self.url}：{self.error}")
+
+    async def _run(self):
+        try:
+            async with streamable_http_client(self.url) as (read, write, _):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    self.session = session
+                    self._ready.set()
+                    await self._stop.wait()
+        except Exception as exc:
+            self.error = exc
+            logger.warning("MCP session 中斷 %s：%s", self.url, exc)
+        finally:
+            self.session = None
+            self._ready.set()
+
+    async def close(self):
+        self._stop.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, 5)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self._task.cancel()
+        self.session = None
+
+
+class ServerPool:
+    def __init__(self, name: str, url: str, size: int = SESSIONS_PER_SERVER,
+                 max_concurrency: int = MAX_CONCURRENCY):
+        self.name = name
+        self.url = url
+        self._sessions = [PooledSession(url) for _ in range(size)]
+        self._next = itertools.cycle(range(size))
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._locks = [asyncio.Lock() for _ in range(size)]
+        self.reconnects = 0
+
+    async def acquire(self) -> PooledSession:
+        """輪流取出 session；已斷線的先重連"""
+        i = next(self._next)
+        pooled = self._sessions[i]
+        if pooled.alive:
+            return pooled
+        async with self._locks[i]:
+            if not pooled.alive:
+                if pooled.error is not None:
+                    self.reconnects += 1
+                await pooled.close()
+                await pooled.start()
+        return pooled
+
+    async def discard(self, pooled: PooledSession, error: BaseException):
+        """標記為斷線並關閉，下次取用時重連"""
+        pooled.error = error
+        async with self._locks[self._sessions.index(pooled)]:
+            await pooled.close()
+
+    async def ping(self):
+        for pooled in self._sessions:
+            if not pooled.alive:
+                continue
+            try:
+                await asyncio.wait_for(pooled.session.send_ping(), CONNECT_TIMEOUT)
+            except Exception as exc:
+                logger.warning("MCP %s ping 失敗，下次使用時重連：%s", self.name, exc)
+                await self.discard(pooled, exc)
+
+    async def close(self):
+        await asyncio.gather(*(pooled.close() for pooled in self._sessions))
+
+    def alive_sessions(self) -> int:
+        return sum(pooled.alive for pooled in self._sessions)
+
+
+class SessionProxy:
+    """
+    交給 load_mcp_tools 的 session 替身。
+    工具呼叫時才向連線池取 session，受同時呼叫數限制並記錄延遲。
+    """
+
+    def __init__(self, pool: "SessionPool", server: str):
+        self._pool = pool
+        self._server = pool.servers[server]
+
+    async def _with_session(self, method: str, *args, **kwargs):
+        async with self._server._semaphore:
+            for attempt in range(2):
+                pooled = await self._server.acquire()
+                try:
+                    return await getattr(pooled.session, method)(*args, **kwargs)
+                except McpError as exc:
+                    if exc.error.message != _SESSION_TERMINATED:
+                        raise
+                    await self._server.discard(pooled, exc)
+                    if attempt:
+                        raise
+                except _NOT_SENT as exc:
+                    # 請求沒有送到伺服器：重連後重送一次
+                    await self._server.discard(pooled, exc)
+                    if attempt:
+                        raise
+                except Exception as exc:
+                    # 其他連線錯誤無法確定伺服器是否已執行，不重送，只換掉 session
+                    await self._server.discard(pooled, exc)
+                    raise
+
+    async def call_tool(self, name: str, arguments: dict | None = None, *args, **kwargs):
+        start = time.perf_counter()
+        error = True
+        with tracing.span("mcp.client", key=name, server=self._server.name) as current:
+            # 伺服器端從 _meta.traceparent 接續同一個 trace
+            header = tracing.traceparent()
+            if header:
+                kwargs["meta"] = {**(kwargs.get("meta") or {}), "traceparent": header}
+            try:
+                result = await self._with_session("call_tool", name, arguments, *args, **kwargs)
+                error = bool(getattr(result, "isError", False))
+                if error:
+                    current.error = "ToolError"
+                return result
+            finally:
+                self._pool.observe(self._server.name, name, (time.perf_counter() - start) * 1000, error)
+
+    async def list_tools(self, *args, **kwargs):
+        return await self._with_session("list_tools", *args, **kwargs)
+
+    async def initialize(self):
+        # 連線池的 session 建立時已經 initialize 過
+        return None
+
+    def __getattr__(self, name):
+        async def call(*args, **kwargs):
+            return await self._with_session(name, *args, **kwargs)
+        return call
+
+
+class SessionPool:
+    """
+    介面與 MultiServerMCPClient 相容 (get_tools)，connections 也使用相同格式；
+    目前只支援 streamable-http。
+    """
+
+    def __init__(self, connections: dict):
+        self.servers = {
+            name: ServerPool(name, connection["url"])
+            for name, connection in connections.items()
+        }
+        self._histograms: dict[tuple[str, str], LatencyHistogram] = {}
+        self._health_task: asyncio.Task | None = None
+
+    def proxy(self, server: str) -> SessionProxy:
+        return SessionProxy(self, server)
+
+    def observe(self, server: str, tool: str, ms: float, error: bool):
+        self._histograms.setdefault((server, tool), LatencyHistogram()).observe(ms, error)
+
+    def _ensure_health_check(self):
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(PING_INTERVAL)
+            await asyncio.gather(*(server.ping() for server in self.servers.values()))
+
+    async def get_tools(self, *, server_name: str | None = None) -> list:
+        from langchain_mcp_adapters.tools import load_mcp_tools
+
+        self._ensure_health_check()
+        names = [server_name] if server_name else list(self.servers)
+        tools = []
+        for name in names:
+            tools.extend(await load_mcp_tools(self.proxy(name)))
+        return tools
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+        await asyncio.gather(*(server.close() for server in self.servers.values()))
+
+    def stats(self) -> dict:
+        return {
+            "servers": {
+                name: {
+                    "alive_sessions": server.alive_sessions(),
+                    "reconnects": server.reconnects,
+                }
+                for name, server in self.servers.items()
+            },
+            "tools": {
+                f"{server}.{tool}": histogram.snapshot()
+                for (server, tool), histogram in sorted(self._histograms.items())
+            },
+        }
@@ -0,0 +1,220 @@
+"""
+Flex Message 模板註冊表。
+
+每個模板在啟動 (或檔案變更) 時驗證一次，並預先序列化成完整的
+broadcast 請求 JSON bytes，只留下 {region} / {time} / {weather} 幾個插槽。
+產生訊息時只需把插槽值接進 bytes 片段，不用重建 dict、也不用再跑 json.dumps。
+"""
+
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+SLOTS = ("region", "time", "weather")
+_SLOT_PATTERN = re.compile(rb"\{(" + b"|".join(s.encode() for s in SLOTS) + rb")\}")
+_ANY_SLOT = re.compile(r"\{(\w+)\}")
+_COLOR = re.compile(r"^#[0-9A-Fa-f]{6}$")
+
+REQUIRED_FIELDS = ("altText", "hero_url", "title", "title_color", "status_text", "status_color", "body")
+# 檔案變更檢查的最短間隔 (秒)
+RELOAD_INTERVAL = float(os.getenv("FLEX_TEMPLATE_RELOAD_INTERVAL", "2"))
+
+TAIPEI = ZoneInfo("Asia/Taipei")
+
+
+def build_flex_message(template: dict) -> dict:
+    """根據模板配置建構 LINE Flex Message"""
+    return {
+        "type": "flex",
+        "altText": template["altText"],
+        "contents": {
+            "type": "bubble",
+            "hero": {
+                "type": "image",
+                "url": template["hero_url"],
+                "size": "full",
+                "aspectRatio": "20:13",
+                "aspectMode": "cover",
+            },
+            "body": {
+                "type": "box",
+                "layout": "vertical",
+                "contents": [
+                    {
+                        "type": "text",
+                        "text": template["title"],
+                        "weight": "bold",
+                        "size": "lg",
+                        "wrap": True,
+                        "color": template["title_color"],
+                    },
+                    {
+                        "type": "box",
+                        "layout": "vertical",
+                        "margin": "lg",
+                        "spacing": "sm",
+                        "contents": [
+                            _info_row("地區", "{region}"),
+                            _info_row("時間", "{time}"),
+                            _info_row("天氣", "{weather}"),
+                            {
+                                "type": "box",
+                                "layout": "baseline",
+                                "spacing": "sm",
+                                "contents": [
+                                    {"type": "text", "text": "狀態", "color": "#aaaaaa", "size": "sm", "flex": 1},
+                                    {"type": "text", "text": template["status_text"], "wrap": True, "color": template["status_color"], "size": "lg", "flex": 6, "weight": "bold"},
+                                ],
+                            },
+                        ],
+                    },
+                    {"type": "separator", "margin": "xl", "color": "#0099FF"},
+                    {
+                        "type": "text",
+                        "text": template["body"],
+                        "margin": "lg",
+                        "size": "md",
+                        "color": "#555555",
+                        "wrap": True,
+                        "lineSpacing": "4px",
+                    },
+                ],
+            },
+        },
+    }
+
+
+def _info_row(label: str, value: str) -> dict:
+    return {
+        "type": "box",
+        "layout": "baseline",
+        "spacing": "sm",
+        "contents": [
+            {"type": "text", "text": label, "color": "#aaaaaa", "size": "sm", "flex": 1},
+            {"type": "text", "text": value, "wrap": True, "color": "#666666", "size": "sm", "flex": 4},
+        ],
+    }
+
+
+def validate_template(name: str, template: dict):
+    """檢查必要欄位、顏色格式、圖片網址與插槽名稱，不合格時丟出 ValueError"""
+    missing = [field for field in REQUIRED_FIELDS if not template.get(field)]
+    if missing:
+        raise ValueError(f"模板 {name} 缺少欄位：{', '.join(missing)}")
+    for field in ("title_color", "status_color"):
+        if not _COLOR.match(template[field]):
+            raise ValueError(f"模板 {name} 的 {field} 不是 #RRGGBB 格式")
+    if not template["hero_url"].startswith("https://"):
+        raise ValueError(f"模板 {name} 的 hero_url 必須是 https")
+    if len(template["altText"]) > 400:
+        raise ValueError(f"模板 {name} 的 altText 超過 400 字")
+    for field in REQUIRED_FIELDS:
+        unknown = set(_ANY_SLOT.findall(template[field])) - set(SLOTS)
+        if unknown:
+            raise ValueError(f"模板 {name} 的 {field} 有未知插槽：{', '.join(unknown)}")
+
+
+@lru_cache(maxsize=512)
+def _escape(value: str) -> bytes:
+    """插槽值轉成 JSON 字串內容 (不含引號)；地區、天氣文字重複率高，直接快取"""
+    return json.dumps(value, ensure_ascii=False)[1:-1].encode()
+
+
+class CompiledTemplate:
+    """預先序列化的 broadcast 請求：bytes 片段與插槽交錯"""
+
+    def __init__(self, name: str, template: dict):
+        validate_template(name, template)
+        self.name = name
+        self.default_weather = template.get("weather", "")
+
+        payload = json.dumps(
+            {"messages": [build_flex_message(template)]},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode()
+
+        self._parts: list[bytes] = []
+        self._slots: list[str] = []
+        last = 0
+        for match in _SLOT_PATTERN.finditer(payload):
+            self._parts.append(payload[last:match.start()])
+            self._slots.append(match.group(1).decode())
+            last = match.end()
+        self._parts.append(payload[last:])
+
+        # 以範例值試產一次，確保結果是合法 JSON
+        json.loads(self.render(region="霧峰區", time="00:00", weather="晴"))
+
+    def render(self, **values: str) -> bytes:
+        out = [self._parts[0]]
+        for slot, part in zip(self._slots, self._parts[1:]):
+            out.append(_escape(str(values.get(slot, ""))))
+            out.append(part)
+        return b"".join(out)
+
+
+class TemplateRegistry:
+    """
+    內建模板 + 模板資料夾中的 *.json (檔名即模板名稱)。
+    資料夾內的檔案變更時自動重新載入，格式錯誤的檔案會略過並記錄警告。
+    """
+
+    def __init__(self, builtin: dict, template_dir: str | None = None):
+        self._builtin = {name: CompiledTemplate(name, t) for name, t in builtin.items()}
+        self._dir = Path(template_dir) if template_dir else None
+        self._files: dict[str, CompiledTemplate] = {}
+        self._mtimes: dict[Path, float] = {}
+        self._checked = 0.0
+        self._reload()
+
+    def _reload(self):
+        self._checked = time.monotonic()
+        if not self._dir or not self._dir.is_dir():
+            return
+
+        current = {path: path.stat().st_mtime for path in self._dir.glob("*.json")}
+        if current == self._mtimes:
+            return
+
+        files = {}
+        for path in current:
+            try:
+                template = json.loads(path.read_text(encoding="utf-8"))
+                files[path.stem] = CompiledTemplate(path.stem, template)
+            except (OSError, ValueError, TypeError, AttributeError) as exc:
+                logger.warning("略過模板 %s：%s", path.name, exc)
+        self._files = files
+        self._mtimes = current
+        logger.info("已載入模板：%s", ", ".join(sorted({**self._builtin, **files})))
+
+    def _maybe_reload(self):
+        if time.monotonic() - self._checked > RELOAD_INTERVAL:
+            self._reload()
+
+    def names(self) -> list[str]:
+        self._maybe_reload()
+        return sorted({**self._builtin, **self._files})
+
+    def get(self, name: str) -> CompiledTemplate | None:
+        self._maybe_reload()
+        return self._files.get(name) or self._builtin.get(name)
+
+    def render(self, name: str, region: str, weather: str = "", when: datetime | None = None) -> bytes:
+        template = self.get(name)
+        if template is None:
+            raise KeyError(name)
+        when = when or datetime.now(TAIPEI)
+        return template.render(
+            region=region,
+            time=when.strftime("%m/%d %H:%M"),
+            weather=weather or template.default_weather,
+        )
@@ -0,0 +1,236 @@
+"""
+鄉鎮預報的欄式 (columnar) 模型。
+
+整段預報只解析一次：所有天氣因子對齊到同一條逐時時間軸，
+每個因子一個 NumPy 陣列。查詢先用 searchsorted 定位區間 (O(log n))，
+區間最大值與「第一個超過門檻的時間」再用 sparse table 在 O(1) / O(log n) 內完成。
+"""
+
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+HOUR = 3600
+TAIPEI = ZoneInfo("Asia/Taipei")
+
+# 各天氣因子在 ElementValue 裡的欄位名稱
+VALUE_KEYS = {
+    "溫度": "Temperature",
+    "體感溫度": "ApparentTemperature",
+    "3小時降雨機率": "ProbabilityOfPrecipitation",
+    "天氣現象": "Weather",
+    "天氣預報綜合描述": "WeatherDescription",
+}
+NUMERIC_ELEMENTS = {"溫度", "體感溫度", "3小時降雨機率"}
+
+# 工具參數允許的別名
+ELEMENT_ALIASES = {"降雨機率": "3小時降雨機率", "氣溫": "溫度"}
+
+
+def _epoch(text: str) -> int:
+    return int(datetime.fromisoformat(text).timestamp())
+
+
+def _element_value(record: dict, element_name: str):
+    value = record["ElementValue"][0]
+    key = VALUE_KEYS.get(element_name)
+    return value[key] if key in value else next(iter(value.values()))
+
+
+def resolve_element(name: str) -> str:
+    name = ELEMENT_ALIASES.get(name, name)
+    if name not in VALUE_KEYS:
+        raise ValueError(f"不支援的天氣因子：{name}")
+    return name
+
+
+class ForecastSeries:
+    """單一行政區的完整預報，times 為逐時時間軸 (epoch 秒)"""
+
+    def __init__(self, location: str, times: np.ndarray, values: dict, periods: dict):
+        self.location = location
+        self.times = times
+        self.values = values
+        # 區間型因子 (例如 3 小時降雨機率) 每個時槽所屬區段的起訖
+        self.periods = periods
+        self._columns: dict[str, np.ndarray] = {}
+        self._tables: dict[str, list[np.ndarray]] = {}
+
+    @classmethod
+    def from_location(cls, location_data: dict) -> "ForecastSeries":
+        elements = location_data["WeatherElement"]
+
+        # 先找出整段預報涵蓋的時間範圍，建立逐時時間軸
+        points = []
+        for item in elements:
+            for record in item["Time"]:
+                if "DataTime" in record:
+                    points.append(_epoch(record["DataTime"]))
+                else:
+                    points.append(_epoch(record["StartTime"]))
+                    points.append(_epoch(record["EndTime"]) - HOUR)
+        start, end = min(points), max(points)
+        times = np.arange(start, end + HOUR, HOUR, dtype=np.int64)
+
+        values, periods = {}, {}
+        for item in elements:
+            name = item["ElementName"]
+            numeric = name in NUMERIC_ELEMENTS
+            column = (
+                np.full(len(times), np.nan)
+                if numeric
+                else np.full(len(times), None, dtype=object)
+            )
+
+            if item["Time"] and "DataTime" in item["Time"][0]:
+                # 時間點型：值維持到下一個時間點
+                stamps = np.array([_epoch(r["DataTime"]) for r in item["Time"]])
+                idx = np.searchsorted(times, stamps)
+                bounds = np.append(idx, len(times))
+                for i, record in enumerate(item["Time"]):
+                    column[bounds[i]:bounds[i + 1]] = _element_value(record, name)
+            else:
+                # 區間型：值套用在 [StartTime, EndTime)
+                span_start = np.zeros(len(times), dtype=np.int64)
+                span_end = np.zeros(len(times), dtype=np.int64)
+                for record in item["Time"]:
+                    s, e = _epoch(record["StartTime"]), _epoch(record["EndTime"])
+                    lo, hi = np.searchsorted(times, [s, e])
+                    column[lo:hi] = _element_value(record, name)
+                    span_start[lo:hi] = s
+                    span_end[lo:hi] = e
+                periods[name] = (span_start, span_end)
+
+            values[name] = column.astype(float) if numeric else column
+
+        return cls(location_data["LocationName"], times, values, periods)
+
+    # ---------- 定位 ----------
+
+    def index_at(self, ts: float) -> int:
+        """ts 所在的時槽 (超出範圍時夾在頭尾)"""
+        i = int(np.searchsorted(self.times, ts, side="right")) - 1
+        return min(max(i, 0), len(self.times) - 1)
+
+    def _start_index(self, start: float) -> int:
+        """包含 start 的時槽；start 早於預報起點時從頭開始"""
+        return max(int(np.searchsorted(self.times, start, side="right")) - 1, 0)
+
+    def _slice(self, start: float, end: float) -> tuple[int, int]:
+        lo = self._start_index(start)
+        hi = int(np.searchsorted(self.times, end, side="left"))
+        return lo, max(hi, lo)
+
+    # ---------- 查詢 ----------
+
+    def row(self, i: int) -> dict:
+        row = {"time": _iso(self.times[i])}
+        for name, column in self.values.items():
+            value = column[i]
+            if isinstance(value, float):
+                value = None if np.isnan(value) else _format_number(value)
+            row[name] = value
+        return row
+
+    def window(self, start: float, end: float) -> list[dict]:
+        lo, hi = self._slice(start, end)
+        return [self.row(i) for i in range(lo, hi)]
+
+    def summary(self, ts: float) -> dict:
+        """ts 當下的精簡天氣 (getWeather 的輸出格式)"""
+        i = self.index_at(ts)
+        row = self.row(i)
+        if "天氣預報綜合描述" in self.periods:
+            span_start, span_end = self.periods["天氣預報綜合描述"]
+            period = f"{_iso(span_start[i])} ~ {_iso(span_end[i])}"
+        else:
+            period = row["time"]
+        return {
+            "location": self.location,
+            "time": period,
+            "溫度": row.get("溫度"),
+            "體感溫度": row.get("體感溫度"),
+            "降雨機率": row.get("3小時降雨機率"),
+            "天氣現象": row.get("天氣現象"),
+        }
+
+    def max_in(self, element: str, start: float, end: float) -> dict | None:
+        """區間內的最大值與發生時間，區間內沒有資料時回傳 None"""
+        lo, hi = self._slice(start, end)
+        if lo >= hi:
+            return None
+        i = self._argmax(element, lo, hi - 1)
+        value = self.values[element][i]
+        if np.isnan(value):
+            return None
+        return {"value": _format_number(value), "time": _iso(self.times[i])}
+
+    def first_above(self, element: str, threshold: float, start: float) -> dict | None:
+        """start 之後第一個超過 threshold 的時槽，找不到時回傳 None"""
+        table = self._table(element)
+        column = self._numeric(element)
+        lo = self._start_index(start)
+        if start >= self.times[-1] + HOUR:
+            return None
+
+        # 以 2 的次方往前跳，只要跳過的區段最大值都不超過門檻就整段略過
+        i = lo
+        for level in range(len(table) - 1, -1, -1):
+            width = 1 << level
+            if i + width <= len(column) and column[table[level][i]] <= threshold:
+                i += width
+        if i >= len(column):
+            return None
+        return {"value": _format_number(column[i]), "time": _iso(self.times[i])}
+
+    # ---------- sparse table ----------
+
+    def _numeric(self, element: str) -> np.ndarray:
+        """缺值換成 -inf 的數值欄位 (第一次查詢時建立)"""
+        if element not in self._columns:
+            if element not in NUMERIC_ELEMENTS or element not in self.values:
+                raise ValueError(f"{element} 不是可查詢的數值型天氣因子")
+            self._columns[element] = np.nan_to_num(self.values[element], nan=-np.inf)
+        return self._columns[element]
+
+    def _table(self, element: str) -> list[np.ndarray]:
+        """table[k][i] = [i, i + 2^k) 區間內最大值的索引"""
+        if element not in self._tables:
+            column = self._numeric(element)
+            table = [np.arange(len(column))]
+            k = 1
+            while (1 << k) <= len(column):
+                prev = table[-1]
+                half = 1 << (k - 1)
+                left = prev[: len(column) - (1 << k) + 1]
+                right = prev[half: half + len(left)]
+                table.append(np.where(column[left] >= column[right], left, right))
+                k += 1
+            self._tables[element] = table
+        return self._tables[element]
+
+    def _argmax(self, element: str, lo: int, hi: int) -> int:
+        """閉區間 [lo, hi] 的最大值索引"""
+        table = self._table(element)
+        column = self._numeric(element)
+        k = (hi - lo + 1).bit_length() - 1
+        a, b = table[k][lo], table[k][hi - (1 << k) + 1]
+        return int(a if column[a] >= column[b] else b)
+
+
+def _iso(ts) -> str:
+    return datetime.fromtimestamp(int(ts), TAIPEI).isoformat()
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else f"{value:g}"
+
+
+def parse_forecast(data: dict) -> dict[str, ForecastSeries]:
+    """把整份 CWA 回應解析成 {行政區: ForecastSeries}"""
+    return {
+        location["LocationName"]: ForecastSeries.from_location(location)
+        for locations in data["records"]["Locations"]
+        for location in locations["Location"]
+    }
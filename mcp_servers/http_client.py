@@ -0,0 +1,108 @@
+"""
+MCP 伺服器共用的非同步 HTTP 層：
+- 單一 httpx.AsyncClient，keep-alive 連線池
+- 每個 host 各自的併發上限
+- 連線 / 讀取逾時
+- 連線錯誤、429、5xx 時以指數退避 + 抖動重試
+"""
+
+import asyncio
+import logging
+import os
+import random
+from urllib.parse import urlsplit
+
+import httpx
+
+# MCP 伺服器以 mcp_servers/ 為工作目錄直接執行；benchmark 則以 mcp_servers.http_client 匯入
+try:
+    import tracing
+except ImportError:
+    from mcp_servers import tracing
+
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3"))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+PER_HOST_LIMIT = int(os.getenv("HTTP_PER_HOST_LIMIT", "10"))
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.2"))
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_client: httpx.AsyncClient | None = None
+_host_limits: dict[str, asyncio.Semaphore] = {}
+
+
+def get_client() -> httpx.AsyncClient:
+    """取得共用的 AsyncClient (第一次呼叫時建立)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                READ_TIMEOUT, connect=CONNECT_TIMEOUT, read=READ_TIMEOUT
+            ),
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_CONNECTIONS,
+            ),
+        )
+    return _client
+
+
+async def aclose():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    _host_limits.clear()
+
+
+def _host_limit(url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).netloc
+    if host not in _host_limits:
+        _host_limits[host] = asyncio.Semaphore(PER_HOST_LIMIT)
+    return _host_limits[host]
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE) -> float:
+    """第 attempt 次重試前的等待秒數 (full jitter)"""
+    return random.uniform(0, base * (2**attempt))
+
+
+async def request(
+    method: str, url: str, *, retries: int = MAX_RETRIES, **kwargs
+) -> httpx.Response:
+    """
+    送出請求，回傳最後一次的 Response。
+    可重試的狀態碼用完重試次數後照樣回傳，由呼叫端決定如何處理。
+    """
+    client = get_client()
+    limit = _host_limit(url)
+
+    with tracing.span("http.client", key=urlsplit(url).netloc, method=method) as current:
+        for attempt in range(retries + 1):
+            current.set(attempts=attempt + 1)
+            try:
+                async with limit:
+                    response = await client.request(method, url, **kwargs)
+            except (httpx.TransportError, httpx.TimeoutException) as exc:
+                if attempt == retries:
+                    raise
+                logger.warning("%s %s 失敗 (%s)，準備重試", method, url, exc)
+            else:
+                if response.status_code not in RETRY_STATUS or attempt == retries:
+                    current.set(status=response.status_code)
+                    return response
+                logger.warning("%s %s 回傳 %s，準備重試", method, url, response.status_code)
+
+            await asyncio.sleep(backoff_delay(attempt))
+
+
+async def get(url: str, **kwargs) -> httpx.Response:
+    return await request("GET", url, **kwargs)
+
+
+async def post(url: str, **kwargs) -> httpx.Response:
+    return await request("POST", url, **kwargs)
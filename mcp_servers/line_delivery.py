@@ -0,0 +1,369 @@
+"""
+LINE 推播的發送管線：
+- 依 LINE API 配額的 token bucket 限流
+- 429 / 5xx 依 Retry-After 或指數退避重試 (同一把 X-Line-Retry-Key，不會重複發送)
+- 回報真實的 HTTP 狀態與 X-Line-Request-Id
+- 持久化 outbox：工具呼叫排入佇列後立即回傳，由背景 worker 發送，重啟後補送
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+
+import httpx
+
+import http_client
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = int(os.getenv("LINE_MAX_ATTEMPTS", "5"))
+BACKOFF_BASE = float(os.getenv("LINE_BACKOFF_BASE", "1"))
+BACKOFF_MAX = float(os.getenv("LINE_BACKOFF_MAX", "60"))
+OUTBOX_WORKERS = int(os.getenv("LINE_OUTBOX_WORKERS", "4"))
+# multicast 每次最多 500 人，同時送出的批次數上限
+MULTICAST_CHUNK = 500
+MULTICAST_CONCURRENCY = int(os.getenv("LINE_MULTICAST_CONCURRENCY", "10"))
+# 推播佇列的 SQLite 檔，已完成的紀錄保留天數
+OUTBOX_DB = os.getenv("LINE_OUTBOX_DB", "line_outbox.db")
+OUTBOX_RETENTION = float(os.getenv("LINE_OUTBOX_RETENTION_DAYS", "7")) * 86400
+
+# LINE Messaging API 各端點的速率上限：(次數, 秒)
+RATE_LIMITS = {
+    "/message/broadcast": (60, 3600),
+    "/message/narrowcast": (60, 3600),
+    "/message/multicast": (200, 1),
+    "/message/push": (2000, 1),
+    "/message/reply": (2000, 1),
+}
+
+
+class TokenBucket:
+    """每秒補充 rate 個 token，最多累積 capacity 個"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while (wait := self._paused_until - time.monotonic()) > 0:
+                await asyncio.sleep(wait)
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+    def pause(self, seconds: float):
+        """收到 429 時暫停發放 token，後續請求一起等待 Retry-After"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+_buckets: dict[str, TokenBucket] = {}
+
+
+def _bucket(path: str) -> TokenBucket:
+    if path not in _buckets:
+        count, per = RATE_LIMITS.get(path, (2000, 1))
+        _buckets[path] = TokenBucket(count / per, count)
+    return _buckets[path]
+
+
+def _retry_after(response: httpx.Response, attempt: int) -> float:
+    header = response.headers.get("Retry-After")
+    if header and header.isdigit():
+        return float(header)
+    return min(BACKOFF_MAX, http_client.backoff_delay(attempt, BACKOFF_BASE))
+
+
+def _result(status: str, response: httpx.Response | None, attempts: int, error: str = "") -> dict:
+    result = {"status": status, "attempts": attempts}
+    if response is not None:
+        result["http_status"] = response.status_code
+        result["request_id"] = response.headers.get("X-Line-Request-Id")
+        accepted = response.headers.get("X-Line-Accepted-Request-Id")
+        if accepted:
+            result["accepted_request_id"] = accepted
+    if error:
+        result["error"] = error
+    return result
+
+
+async def send(path: str, body: bytes, retry_key: str | None = None) -> dict:
+    """
+    送出一個 LINE API 請求並回傳真實結果：
+    {status: sent/failed, http_status, request_id, attempts, error}
+    """
+    # 在呼叫時才讀設定，確保 .env 已載入
+    url = os.getenv("LINE_API_BASE", "https://api.line.me/v2/bot") + path
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {os.getenv('CHANNEL_ACCESS_TOKEN')}",
+        # 重試時帶同一把 key，LINE 端不會重複發送
+        "X-Line-Retry-Key": retry_key or str(uuid.uuid4()),
+    }
+    bucket = _bucket(path)
+    response = None
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        await bucket.acquire()
+        try:
+            response = await http_client.post(url, headers=headers, content=body, retries=0)
+        except httpx.HTTPError as exc:
+            if attempt == MAX_ATTEMPTS:
+                return _result("failed", None, attempt, f"{type(exc).__name__}: {exc}")
+            await asyncio.sleep(http_client.backoff_delay(attempt, BACKOFF_BASE))
+            continue
+
+        if response.status_code < 300:
+            return _result("sent", response, attempt)
+        if response.status_code == 409 and response.headers.get("X-Line-Accepted-Request-Id"):
+            # 同一把 retry key 之前已被接受，視為成功
+            return _result("sent", response, attempt)
+        if response.status_code != 429 and response.status_code < 500:
+            return _result("failed", response, attempt, _error_message(response))
+        if attempt == MAX_ATTEMPTS:
+            break
+
+        delay = _retry_after(response, attempt)
+        if response.status_code == 429:
+            bucket.pause(delay)
+        logger.warning("LINE %s 回傳 %s，%.1f 秒後重試", path, response.status_code, delay)
+        await asyncio.sleep(delay)
+
+    return _result("failed", response, MAX_ATTEMPTS, _error_message(response))
+
+
+def _error_message(response: httpx.Response) -> str:
+    try:
+        return response.json().get("message", "")
+    except ValueError:
+        return response.text[:200]
+
+
+async def multicast(body: bytes, user_ids: list[str], concurrency: int = MULTICAST_CONCURRENCY) -> dict:
+    """
+    把 {"messages": [...]} 的請求 body 以 multicast 發給 user_ids：
+    每 500 人一批、最多 concurrency 批同時發送，回傳彙總結果。
+    """
+    chunks = [user_ids[i:i + MULTICAST_CHUNK] for i in range(0, len(user_ids), MULTICAST_CHUNK)]
+    limit = asyncio.Semaphore(concurrency)
+
+    async def send_chunk(chunk: list[str]) -> dict:
+        # 直接在預先序列化的 body 前面接上收件人，不重新序列化訊息
+        payload = b'{"to":' + json.dumps(chunk).encode() + b"," + body.lstrip()[1:]
+        async with limit:
+            return await send("/message/multicast", payload)
+
+    results = await asyncio.gather(*(send_chunk(chunk) for chunk in chunks))
+
+    failed = [
+        {"chunk": i, "recipients": len(chunks[i]), **{k: v for k, v in r.items() if k != "status"}}
+        for i, r in enumerate(results)
+        if r["status"] != "sent"
+    ]
+    sent_recipients = sum(len(c) for c, r in zip(chunks, results) if r["status"] == "sent")
+    if not failed:
+        status = "sent"
+    elif sent_recipients:
+        status = "partial"
+    else:
+        status = "failed"
+
+    return {
+        "status": status,
+        "recipients": len(user_ids),
+        "sent_recipients": sent_recipients,
+        "chunks": len(chunks),
+        "failed_chunks": failed,
+        "request_ids": [r.get("request_id") for r in results if r["status"] == "sent"][:5],
+    }
+
+
+class Outbox:
+    """
+    持久化的推播佇列 (SQLite)：
+    - enqueue 寫入資料庫後立即回傳 delivery_id，背景 worker 負責發送
+    - 相同冪等 key 在抑制時間窗內重複推播會被擋下，回傳原本的 delivery_id
+    - 重啟後把尚未完成的推播重新排入；X-Line-Retry-Key 由 delivery_id 固定推導，
+      即使上次其實已送達，LINE 也只會接受一次
+    """
+
+    def __init__(self, path: str = OUTBOX_DB, workers: int = OUTBOX_WORKERS):
+        self._workers = workers
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._done: dict[str, asyncio.Event] = {}
+        self.metrics = {"enqueued": 0, "suppressed": 0, "replayed": 0, "sent": 0, "failed": 0}
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id TEXT PRIMARY KEY,
+                    idem_key TEXT,
+                    path TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    info TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_idem ON outbox (idem_key, created_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status)")
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self._workers)]
+
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM outbox WHERE updated_at < ? AND status IN ('sent', 'failed')",
+                (time.time() - OUTBOX_RETENTION,),
+            )
+            pending = self._conn.execute(
+                "SELECT id FROM outbox WHERE status IN ('queued', 'sending') ORDER BY created_at"
+            ).fetchall()
+        for (delivery_id,) in pending:
+            self._done[delivery_id] = asyncio.Event()
+            self._queue.put_nowait(delivery_id)
+        if pending:
+            self.metrics["replayed"] += len(pending)
+            logger.info("重新排入 %d 筆未完成的推播", len(pending))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def close(self):
+        self._conn.close()
+
+    def find_recent(self, idem_key: str, window: float) -> str | None:
+        """抑制時間窗內同一冪等 key 且未失敗的推播 id"""
+        row = self._conn.execute(
+            "SELECT id FROM outbox WHERE idem_key = ? AND created_at > ? AND status != 'failed' "
+            "ORDER BY created_at DESC LIMIT 1",
+            (idem_key, time.time() - window),
+        ).fetchone()
+        return row[0] if row else None
+
+    def enqueue(self, path: str, body: bytes, idem_keys: tuple = (), window: float = 0, **info) -> tuple[str, bool]:
+        """
+        排入推播，回傳 (delivery_id, 是否被抑制)。
+        idem_keys 的第一個是本次的 key，其餘 (例如上一個時間區段) 只用來比對重複。
+        """
+        self.start()
+        for key in idem_keys if window else ():
+            existing = self.find_recent(key, window)
+            if existing:
+                self.metrics["suppressed"] += 1
+                return existing, True
+
+        delivery_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO outbox (id, idem_key, path, body, info, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+                (
+                    delivery_id,
+                    idem_keys[0] if idem_keys else None,
+                    path,
+                    body,
+                    json.dumps(info, ensure_ascii=False),
+                    now,
+                    now,
+                ),
+            )
+        self.metrics["enqueued"] += 1
+        self._done[delivery_id] = asyncio.Event()
+        self._queue.put_nowait(delivery_id)
+        return delivery_id, False
+
+    async def wait(self, delivery_id: str, timeout: float | None = None) -> dict:
+        """等待發送完成 (最多 timeout 秒)，回傳當下狀態"""
+        event = self._done.get(delivery_id)
+        if event:
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.status(delivery_id)
+
+    def status(self, delivery_id: str) -> dict:
+        row = self._conn.execute(
+            "SELECT status, info, result FROM outbox WHERE id = ?", (delivery_id,)
+        ).fetchone()
+        if row is None:
+            return {"status": "unknown", "delivery_id": delivery_id}
+        status, info, result = row
+        return {
+            "delivery_id": delivery_id,
+            **json.loads(info),
+            **(json.loads(result) if result else {}),
+            "status": status,
+        }
+
+    def counts(self) -> dict:
+        rows = self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        return dict(rows)
+
+    def _set_status(self, delivery_id: str, status: str, result: dict | None = None):
+        with self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, result = COALESCE(?, result), updated_at = ? WHERE id = ?",
+                (
+                    status,
+                    json.dumps(result, ensure_ascii=False) if result else None,
+                    time.time(),
+                    delivery_id,
+                ),
+            )
+
+    async def _worker(self):
+        while True:
+            delivery_id = await self._queue.get()
+            row = self._conn.execute(
+                "SELECT path, body FROM outbox WHERE id = ?", (delivery_id,)
+            ).fetchone()
+            if row is None:
+                self._queue.task_done()
+                continue
+
+            path, body = row
+            self._set_status(delivery_id, "sending")
+            try:
+                result = await send(path, body, str(uuid.uuid5(uuid.NAMESPACE_URL, delivery_id)))
+            except Exception as exc:
+                logger.exception("推播 %s 發生錯誤", delivery_id)
+                result = {"status": "failed", "error": str(exc)}
+
+            final = result.pop("status")
+            self._set_status(delivery_id, final, result)
+            self.metrics[final] += 1
+            event = self._done.pop(delivery_id, None)
+            if event:
+                event.set()
+            self._queue.task_done()
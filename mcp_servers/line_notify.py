@@ -1,22 +1,32 @@
+import asyncio
 import os
-import requests
+import time
 from dotenv import load_dotenv
 from mcp.server.fastmcp import FastMCP
+import http_client
+import tracing
+from flex_templates import TemplateRegistry
+from line_delivery import Outbox, multicast
+from line_segments import SegmentStore
 
 load_dotenv()
 
 mcp = FastMCP("LINE_Message_Server", port=8001)
+tracing.instrument_server(mcp)
 
-# LINE API 設定
-CHANNEL_ACCESS_TOKEN = os.getenv("CHANNEL_ACCESS_TOKEN")
-LINE_API_BASE = "https://api.line.me/v2/bot"
+# 推播佇列 (SQLite 持久化)：工具呼叫立即回傳，背景 worker 負責限流、重試與回報結果
+outbox = Outbox()
+# 相同類型 + 地區的推播在這段時間內 (秒) 只會發送一次
+PUSH_DEDUP_WINDOW = float(os.getenv("PUSH_DEDUP_WINDOW", "1800"))
 
 # =========== Flex Message 模板配置 ==========
+# 文字中可使用 {region} / {time} / {weather} 插槽；weather 為預設的天氣文字
 TEMPLATES = {
     "rainy": {
         "altText": "雨天特報",
+        "weather": "雨天",
         "hero_url": "https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcRTxPURVBuFZ5bdIZ-fypFf9-yxKYpgr48OMg&s",
-        "title": "喔吼... 勇者們請注意！霧峰區 正降下神祕的洗塵之雨 🌧️",
+        "title": "喔吼... 勇者們請注意！{region} 正降下神祕的洗塵之雨 🌧️",
         "title_color": "#1F1F1F",
         "status_text": "⚠️ 結界微調 (部分開放)",
         "status_color": "#E67E22",
@@ -24,6 +34,7 @@ TEMPLATES = {
     },
     "sunny": {
         "altText": "晴天好天氣",
+        "weather": "晴天",
         "hero_url": "https://images.unsplash.com/photo-1501973801540-537f08ccae7b",
         "title": "☀️ 天氣放晴啦！",
         "title_color": "#1F1F1F",
@@ -33,6 +44,7 @@ TEMPLATES = {
     },
     "typhoon": {
         "altText": "颱風警報",
+        "weather": "颱風",
         "hero_url": "https://images.unsplash.com/photo-1500673922987-e212871fec22",
         "title": "🌪️ 颱風來襲！",
         "title_color": "#D32F2F",
@@ -43,94 +55,127 @@ TEMPLATES = {
 }
 
 
-def _build_flex_message(template: dict) -> dict:
-    """根據模板配置建構 LINE Flex Message"""
-    return {
-        "type": "flex",
-        "altText": template["altText"],
-        "contents": {
-            "type": "bubble",
-            "hero": {
-                "type": "image",
-                "url": template["hero_url"],
-                "size": "full",
-                "aspectRatio": "20:13",
-                "aspectMode": "cover",
-            },
-            "body": {
-                "type": "box",
-                "layout": "vertical",
-                "contents": [
-                    {
-                        "type": "text",
-                        "text": template["title"],
-                        "weight": "bold",
-                        "size": "lg",
-                        "wrap": True,
-                        "color": template["title_color"],
-                    },
-                    {
-                        "type": "box",
-                        "layout": "vertical",
-                        "margin": "lg",
-                        "spacing": "sm",
-                        "contents": [
-                            {
-                                "type": "box",
-                                "layout": "baseline",
-                                "spacing": "sm",
-                                "contents": [
-                                    {"type": "text", "text": "地區", "color": "#aaaaaa", "size": "sm", "flex": 1},
-                                    {"type": "text", "text": "霧峰區", "wrap": True, "color": "#666666", "size": "sm", "flex": 4},
-                                ],
-                            },
-                            {
-                                "type": "box",
-                                "layout": "baseline",
-                                "spacing": "sm",
-                                "contents": [
-                                    {"type": "text", "text": "狀態", "color": "#aaaaaa", "size": "sm", "flex": 1},
-                                    {"type": "text", "text": template["status_text"], "wrap": True, "color": template["status_color"], "size": "lg", "flex": 6, "weight": "bold"},
-                                ],
-                            },
-                        ],
-                    },
-                    {"type": "separator", "margin": "xl", "color": "#0099FF"},
-                    {
-                        "type": "text",
-                        "text": template["body"],
-                        "margin": "lg",
-                        "size": "md",
-                        "color": "#555555",
-                        "wrap": True,
-                        "lineSpacing": "4px",
-                    },
-                ],
-            },
-        },
-    }
+# 啟動時驗證並預先序列化；FLEX_TEMPLATE_DIR 內的 *.json 會自動載入並隨檔案變更重載
+templates = TemplateRegistry(
+    TEMPLATES,
+    os.getenv("FLEX_TEMPLATE_DIR", os.path.join(os.path.dirname(__file__), "templates")),
+)
+
+
+# 員工分眾名單 (含 user ID，請勿提交版控)
+segments = SegmentStore(os.getenv("LINE_SEGMENT_FILE", "line_segments.json"))
 
 
 # =========== 單一推播工具 ==========
+def _idempotency_keys(weather_type: str, region: str) -> tuple[str, str]:
+    """(本時間區段的 key, 上一個時間區段的 key)，兩者一起比對即為滑動時間窗"""
+    bucket = int(time.time() // PUSH_DEDUP_WINDOW) if PUSH_DEDUP_WINDOW else 0
+    return (
+        f"broadcast|{weather_type}|{region}|{bucket}",
+        f"broadcast|{weather_type}|{region}|{bucket - 1}",
+    )
+
+
 @mcp.tool()
-def push_message(weather_type: str) -> dict:
-    """推播天氣通知。weather_type: rainy/sunny/typhoon"""
+async def push_message(
+    weather_type: str,
+    region: str = "霧峰區",
+    weather: str = "",
+    wait: bool = False,
+    force: bool = False,
+) -> dict:
+    """
+    推播天氣通知。weather_type: rainy/sunny/typhoon (或模板資料夾中的其他模板)
+    region 為地區，weather 為要顯示的天氣文字 (例如「短暫陣雨 25°C」，未填用模板預設)
+    預設排入佇列後立即回傳 status=queued 與 delivery_id；wait=True 時等待發送結果
+    短時間內重複的相同推播會被抑制 (status=suppressed)；用戶明確要求再發一次時才用 force=True
+    """
+
+    try:
+        body = templates.render(weather_type, region=region, weather=weather)
+    except KeyError:
+        return {
+            "status": "error",
+            "error": f"未知的天氣類型：{weather_type}",
+            "available": templates.names(),
+        }
 
+    delivery_id, suppressed = outbox.enqueue(
+        "/message/broadcast",
+        body,
+        idem_keys=_idempotency_keys(weather_type, region),
+        window=0 if force else PUSH_DEDUP_WINDOW,
+        weather=weather_type,
+        region=region,
+    )
+    if suppressed:
+        return {
+            **outbox.status(delivery_id),
+            "status": "suppressed",
+            "reason": f"{int(PUSH_DEDUP_WINDOW // 60)} 分鐘內已發送過相同推播",
+        }
+    if wait:
+        return await outbox.wait(delivery_id, timeout=30)
+    return {"status": "queued", "delivery_id": delivery_id, "weather": weather_type}
 
-    template = TEMPLATES[weather_type]
-    flex_msg = _build_flex_message(template)
 
-    url = f"{LINE_API_BASE}/message/broadcast"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {CHANNEL_ACCESS_TOKEN}",
-    }
-    data = {"messages": [flex_msg]}
+# =========== 分眾推播工具 ==========
+@mcp.tool()
+async def push_to_segment(
+    segment: str, weather_type: str, region: str = "霧峰區", weather: str = ""
+) -> dict:
+    """
+    只推播給特定員工分眾 (例如 ride_operators 設施人員、guest_services 客服)，
+    不會發給所有好友。weather_type 同 push_message。回傳各批次的發送彙總。
+    """
 
-    requests.post(url, headers=headers, json=data)
-    return {"status": "success", "weather": weather_type}
+    user_ids = segments.get(segment)
+    if user_ids is None:
+        return {"status": "error", "error": f"找不到分眾：{segment}", "available": list(segments.sizes())}
+    if not user_ids:
+        return {"status": "error", "error": f"分眾 {segment} 沒有成員"}
 
+    try:
+        body = templates.render(weather_type, region=region, weather=weather)
+    except KeyError:
+        return {
+            "status": "error",
+            "error": f"未知的天氣類型：{weather_type}",
+            "available": templates.names(),
+        }
 
-if __name__ == "__main__":
-    mcp.run(transport="streamable-http")
+    result = await multicast(body, user_ids)
+    return {"segment": segment, "weather": weather_type, **result}
+
+
+@mcp.tool()
+async def list_segments() -> dict:
+    """列出可推播的員工分眾與人數"""
+    return segments.sizes()
 
+
+@mcp.tool()
+async def get_delivery_status(delivery_id: str) -> dict:
+    """查詢推播的實際發送結果 (queued/sending/sent/failed、HTTP 狀態與 LINE request id)"""
+    return outbox.status(delivery_id)
+
+
+@mcp.tool()
+async def get_push_metrics() -> dict:
+    """推播統計：本次啟動後的排入 / 抑制 / 重啟補送 / 成功 / 失敗數，以及佇列中各狀態筆數"""
+    return {**outbox.metrics, "outbox": outbox.counts()}
+
+
+async def main():
+    # 啟動時補送上次未完成的推播
+    outbox.start()
+    try:
+        await mcp.run_streamable_http_async()
+    finally:
+        await outbox.stop()
+        await http_client.aclose()
+        outbox.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
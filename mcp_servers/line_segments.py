@@ -0,0 +1,41 @@
+import json
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class SegmentStore:
+    """
+    員工分眾名單：JSON 檔 {"分眾名稱": ["U...", ...]}。
+    檔案變更時自動重新讀取，名單中重複的 user ID 會去除。
+    """
+
+    def __init__(self, path: str):
+        self._path = Path(path)
+        self._mtime = None
+        self._segments: dict[str, list[str]] = {}
+
+    def _reload(self):
+        try:
+            mtime = self._path.stat().st_mtime
+        except FileNotFoundError:
+            self._segments, self._mtime = {}, None
+            return
+        if mtime == self._mtime:
+            return
+
+        data = json.loads(self._path.read_text(encoding="utf-8"))
+        self._segments = {
+            name: list(dict.fromkeys(ids)) for name, ids in data.items()
+        }
+        self._mtime = mtime
+        logger.info("已載入分眾名單：%s", ", ".join(self._segments))
+
+    def get(self, name: str) -> list[str] | None:
+        self._reload()
+        return self._segments.get(name)
+
+    def sizes(self) -> dict[str, int]:
+        self._reload()
+        return {name: len(ids) for name, ids in self._segments.items()}
@@ -0,0 +1,66 @@
+import json
+import sqlite3
+import threading
+import time
+
+# 每個 key 保留的版本數，舊的自動清掉
+KEEP_VERSIONS = 5
+
+
+class SnapshotStore:
+    """
+    以 SQLite 保存每次抓到的預報原始 JSON (含版本號與抓取時間)。
+    伺服器重啟後可從最新快照開始服務，上游失敗時也能退回最後一份快照。
+    """
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    key TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    payload TEXT NOT NULL,
+                    PRIMARY KEY (key, version)
+                )
+                """
+            )
+
+    def save(self, key: str, payload: dict, fetched_at: float | None = None) -> dict:
+        """寫入新版本，回傳快照資訊 {version, fetched_at}"""
+        fetched_at = fetched_at or time.time()
+        body = json.dumps(payload, ensure_ascii=False)
+        with self._lock, self._conn:
+            (latest,) = self._conn.execute(
+                "SELECT COALESCE(MAX(version), 0) FROM snapshots WHERE key = ?", (key,)
+            ).fetchone()
+            version = latest + 1
+            self._conn.execute(
+                "INSERT INTO snapshots (key, version, fetched_at, payload) VALUES (?, ?, ?, ?)",
+                (key, version, fetched_at, body),
+            )
+            self._conn.execute(
+                "DELETE FROM snapshots WHERE key = ? AND version <= ?",
+                (key, version - KEEP_VERSIONS),
+            )
+        return {"version": version, "fetched_at": fetched_at}
+
+    def latest(self, key: str) -> dict | None:
+        """最新一份快照 {version, fetched_at, payload}，沒有時回傳 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version, fetched_at, payload FROM snapshots "
+                "WHERE key = ? ORDER BY version DESC LIMIT 1",
+                (key,),
+            ).fetchone()
+        if row is None:
+            return None
+        version, fetched_at, body = row
+        return {"version": version, "fetched_at": fetched_at, "payload": json.loads(body)}
+
+    def close(self):
+        self._conn.close()
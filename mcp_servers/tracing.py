@@ -0,0 +1,265 @@
+"""
+輕量的 span 追蹤與延遲指標，app 與 MCP 伺服器共用 (MCP 伺服器以 `import tracing` 載入)。
+
+- 一則使用者訊息一個 trace id，以 contextvars 往下傳；MCP 工具呼叫時放進
+  request 的 _meta.traceparent (W3C 格式)，伺服器端接續同一個 trace
+- 每個 span 都計入延遲直方圖 (成本很低)，伺服器以 /metrics 輸出 Prometheus 格式
+- 完整 span 只在取樣到的 trace，或本行程內的根 span 超過 TRACE_SLOW_MS 時寫入 JSONL
+
+環境變數：
+    TRACING=0             完全停用 (span 變成空操作)
+    TRACE_FILE            JSONL 輸出檔，未設定時不輸出 span，只保留指標
+    TRACE_SAMPLE_RATE     trace 取樣率 (預設 0.05)
+    TRACE_SLOW_MS         超過此時間的 trace 一律輸出 (預設 5000，0 表示停用)
+"""
+
+import bisect
+import json
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+ENABLED = os.getenv("TRACING", "1") != "0"
+TRACE_FILE = os.getenv("TRACE_FILE")
+SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.05"))
+SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "5000"))
+SERVICE = os.getenv("TRACE_SERVICE") or os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+
+# 直方圖 bucket 上界 (秒)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class _Trace:
+    __slots__ = ("trace_id", "sampled", "spans")
+
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: list[dict] = []
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "key", "attrs",
+                 "start", "_t0", "duration", "error", "local_root")
+
+    def __init__(self, trace: _Trace, parent_id: str | None, name: str, key: str | None,
+                 attrs: dict, local_root: bool):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.key = key
+        self.attrs = attrs
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.duration = None
+        self.error = None
+        self.local_root = local_root
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._t0
+        metrics.observe(self.name, self.key, self.duration, self.error is not None)
+        if not TRACE_FILE:
+            return
+        self.trace.spans.append({
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "service": SERVICE,
+            "name": self.name,
+            "key": self.key,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration * 1000, 3),
+            "error": self.error,
+            "attrs": self.attrs,
+        })
+        if self.local_root:
+            slow = SLOW_MS and self.duration * 1000 >= SLOW_MS
+            if self.trace.sampled or slow:
+                _export(self.trace.spans)
+            self.trace.spans = []
+
+
+class _Remote:
+    """其他行程傳來的父 span"""
+
+    __slots__ = ("trace", "span_id")
+
+    def __init__(self, trace: _Trace, span_id: str):
+        self.trace = trace
+        self.span_id = span_id
+
+
+class _NoopSpan:
+    trace_id = None
+    span_id = None
+    key = None
+    error = None
+
+    def set(self, **attrs):
+        pass
+
+    def finish(self):
+        pass
+
+
+_NOOP = _NoopSpan()
+_current: ContextVar["Span | _Remote | None"] = ContextVar("trace_span", default=None)
+_export_lock = threading.Lock()
+
+
+def _export(spans: list[dict]):
+    lines = "".join(json.dumps(span, ensure_ascii=False, default=str) + "\n" for span in spans)
+    with _export_lock, open(TRACE_FILE, "a", encoding="utf-8") as f:
+        f.write(lines)
+
+
+def start_span(name: str, key: str | None = None, **attrs) -> Span | _NoopSpan:
+    """
+    建立 span 但不設為目前的 span，需自行呼叫 finish()；
+    給 callback 這類無法用 with 包住的地方使用
+    """
+    if not ENABLED:
+        return _NOOP
+    parent = _current.get()
+    if parent is None:
+        trace = _Trace(os.urandom(16).hex(), random.random() < SAMPLE_RATE)
+        return Span(trace, None, name, key, attrs, local_root=True)
+    return Span(parent.trace, parent.span_id, name, key, attrs,
+                local_root=isinstance(parent, _Remote))
+
+
+@contextmanager
+def span(name: str, key: str | None = None, **attrs):
+    """
+    with span("mcp.client", key="getWeather") as s: ...
+    name 與 key 組成指標的標籤；key 應為有限集合 (工具名稱、host 等)
+    """
+    if not ENABLED:
+        yield _NOOP
+        return
+    current = start_span(name, key, **attrs)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as exc:
+        current.error = type(exc).__name__
+        raise
+    finally:
+        _current.reset(token)
+        current.finish()
+
+
+def traceparent() -> str | None:
+    """目前 span 的 W3C traceparent，跨行程傳遞用"""
+    current = _current.get()
+    if current is None:
+        return None
+    return f"00-{current.trace.trace_id}-{current.span_id}-{'01' if current.trace.sampled else '00'}"
+
+
+@contextmanager
+def remote_parent(header: str | None):
+    """接續其他行程傳來的 trace；header 無效時開新的 trace"""
+    parts = (header or "").split("-")
+    if not ENABLED or len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        yield
+        return
+    token = _current.set(_Remote(_Trace(parts[1], parts[3] == "01"), parts[2]))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "errors")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.errors = 0
+
+
+class Metrics:
+    def __init__(self):
+        self._histograms: dict[tuple[str, str], _Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, key: str | None, seconds: float, error: bool = False):
+        with self._lock:
+            histogram = self._histograms.get((name, key or ""))
+            if histogram is None:
+                histogram = self._histograms[(name, key or "")] = _Histogram()
+            histogram.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+            histogram.total += seconds
+            histogram.errors += error
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = [
+            "# HELP span_duration_seconds Span duration.",
+            "# TYPE span_duration_seconds histogram",
+        ]
+        errors = [
+            "# HELP span_errors_total Spans that ended with an exception.",
+            "# TYPE span_errors_total counter",
+        ]
+        with self._lock:
+            items = sorted(self._histograms.items())
+            for (name, key), histogram in items:
+                labels = f'span="{_escape(name)}",key="{_escape(key)}"'
+                seen = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), histogram.counts):
+                    seen += count
+                    lines.append(f'span_duration_seconds_bucket{{{labels},le="{bound}"}} {seen}')
+                lines.append(f"span_duration_seconds_sum{{{labels}}} {histogram.total:.6f}")
+                lines.append(f"span_duration_seconds_count{{{labels}}} {seen}")
+                errors.append(f"span_errors_total{{{labels}}} {histogram.errors}")
+        return "\n".join(lines + errors) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = Metrics()
+
+
+def instrument_server(mcp):
+    """
+    FastMCP 伺服器：工具呼叫接續 client 的 trace 並記錄 span，加上 /metrics。
+    FastMCP 在建構時就把 call_tool 註冊給底層 server，所以這裡改寫底層的 handler。
+    """
+    from mcp import types
+    from starlette.responses import PlainTextResponse
+
+    handler = mcp._mcp_server.request_handlers[types.CallToolRequest]
+
+    async def call_tool(request: types.CallToolRequest):
+        meta = request.params.meta
+        header = (meta.model_extra or {}).get("traceparent") if meta is not None else None
+        with remote_parent(header), span("mcp.server", key=request.params.name) as current:
+            result = await handler(request)
+            if getattr(result.root, "isError", False):
+                current.error = "ToolError"
+            return result
+
+    mcp._mcp_server.request_handlers[types.CallToolRequest] = call_tool
+
+    @mcp.custom_route("/metrics", methods=["GET"])
+    async def metrics_endpoint(request):
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
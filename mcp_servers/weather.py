@@ -1,67 +1,352 @@
-import requests
+import asyncio
+import json
+import logging
 import os
+import time
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from mcp.server.fastmcp import FastMCP
+from starlette.responses import JSONResponse
+import http_client
+import tracing
+from forecast_model import parse_forecast, resolve_element
+from snapshot_store import SnapshotStore
+from weather_cache import TAIPEI, ForecastCache, next_issue_time
+from weather_scenario import classify_weather
 
 mcp = FastMCP("Weather_MCP_Server", port=8002)
+tracing.instrument_server(mcp)
 load_dotenv()
+logger = logging.getLogger(__name__)
 
+CWA_API_BASE = os.getenv(
+    "CWA_API_BASE", "https://opendata.cwa.gov.tw/api/v1/rest/datastore"
+)
+DATASET = "F-D0047-073"
+ELEMENTS = ("天氣預報綜合描述", "3小時降雨機率", "溫度", "天氣現象", "體感溫度")
 
-@mcp.tool()
-def getWeather(LocationName: str = "霧峰區") -> list:
+# 測試模式：指定錄製好的 CWA JSON 檔，改為離線回放，不呼叫氣象署
+WEATHER_FIXTURE = os.getenv("WEATHER_FIXTURE")
+
+# 背景預抓的行政區 (逗號分隔，留空則停用) 與快照檔位置
+PREFETCH_LOCATIONS = [
+    name.strip()
+    for name in os.getenv("WEATHER_PREFETCH_LOCATIONS", "霧峰區").split(",")
+    if name.strip()
+]
+PREFETCH_RETRY_SECONDS = int(os.getenv("WEATHER_PREFETCH_RETRY_SECONDS", "300"))
+SNAPSHOT_DB = os.getenv("WEATHER_SNAPSHOT_DB", "weather_snapshots.db")
+
+forecast_cache = ForecastCache()
+snapshot_store = SnapshotStore(SNAPSHOT_DB)
+
+
+def _replay_fixture(path: str, location_name: str) -> dict:
     """
-    取得今天霧峰區的天氣預報
+    從錄製檔回放，只留下查詢的地區 (模擬 LocationName 篩選)。
+    時間以整天為單位平移到涵蓋現在，讓「未來幾小時」這類查詢在離線時也有資料。
     """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    wanted = set(location_name.split(","))
+    for locations in data["records"]["Locations"]:
+        locations["Location"] = [
+            loc for loc in locations["Location"] if loc["LocationName"] in wanted
+        ]
+
+    records = [
+        record
+        for locations in data["records"]["Locations"]
+        for loc in locations["Location"]
+        for item in loc["WeatherElement"]
+        for record in item["Time"]
+    ]
+    if records:
+        first = min(
+            datetime.fromisoformat(r.get("StartTime") or r["DataTime"]) for r in records
+        )
+        now = datetime.now(TAIPEI)
+        offset = timedelta(days=(now.date() - first.astimezone(TAIPEI).date()).days)
+        if first + offset > now:
+            offset -= timedelta(days=1)
+        for record in records:
+            for field in ("StartTime", "EndTime", "DataTime"):
+                if field in record:
+                    shifted = datetime.fromisoformat(record[field]) + offset
+                    record[field] = shifted.isoformat()
+    return data
+
+
+async def _fetch_forecast(dataset: str, location_name: str, elements: tuple) -> dict:
+    if WEATHER_FIXTURE:
+        return _replay_fixture(WEATHER_FIXTURE, location_name)
 
     API_Key = os.getenv("Weather_API_KEY")
 
-    # API URL
-    API_URL = (
-        "https://opendata.cwa.gov.tw/api/v1/rest/datastore/F-D0047-073"
-        f"?Authorization={API_Key}"
-        f"&LocationName={LocationName}"
-        "&ElementName=天氣預報綜合描述,3小時降雨機率,溫度,天氣現象,體感溫度"
+    # 發送請求
+    res = await http_client.get(
+        f"{CWA_API_BASE}/{dataset}",
+        params={
+            "Authorization": API_Key,
+            "LocationName": location_name,
+            "ElementName": ",".join(elements),
+        },
     )
+    res.raise_for_status()
+    return res.json()
 
-    # 發送請求
-    res = requests.get(API_URL)
-    data = res.json()
 
-    # 直接定位到 Location
-    location_data = data["records"]["Locations"][0]["Location"][0]
-    weather_elements = location_data["WeatherElement"]
+def _snapshot_key(key: tuple) -> str:
+    dataset, location_name, elements = key
+    return f"{dataset}|{location_name}|{','.join(elements)}"
+
+
+def _split_locations(data: dict) -> dict[str, dict]:
+    """把多地區的回應拆成每個地區各自一份 (與單獨查詢的格式相同)"""
+    result = {}
+    for locations in data["records"]["Locations"]:
+        for location in locations["Location"]:
+            result[location["LocationName"]] = {
+                "records": {"Locations": [{**locations, "Location": [location]}]}
+            }
+    return result
+
+
+def _to_forecast(raw: dict, snapshot: dict, degraded: bool = False) -> dict:
+    return {
+        "series": parse_forecast(raw),
+        "version": snapshot["version"],
+        "fetched_at": snapshot["fetched_at"],
+        "degraded": degraded,
+    }
+
+
+def _snapshot_info(forecast: dict, now: float) -> dict:
+    info = {"snapshot_age_s": int(now - forecast["fetched_at"])}
+    if forecast["degraded"]:
+        info["degraded"] = "氣象署 API 暫時無法連線，使用最後一份快照"
+    return info
+
+
+async def get_forecast(location_name: str, dataset: str = DATASET, elements: tuple = ELEMENTS) -> dict:
+    """
+    經快取取得解析好的預報，key 為 (資料集, 地區, 天氣因子)。
+    回傳 {series: {行政區: ForecastSeries}, version, fetched_at, degraded}。
+    整份 JSON 只在抓取時解析一次；上游失敗且快取也沒有資料時，退回最後一份快照。
+    """
+    key = (dataset, location_name, elements)
+    snapshot_key = _snapshot_key(key)
+
+    async def fetch():
+        raw = await _fetch_forecast(dataset, location_name, elements)
+        snapshot = await asyncio.to_thread(snapshot_store.save, snapshot_key, raw)
+        return _to_forecast(raw, snapshot)
+
+    try:
+        return await forecast_cache.get(key, fetch)
+    except Exception as exc:
+        snapshot = await asyncio.to_thread(snapshot_store.latest, snapshot_key)
+        if snapshot is None:
+            raise
+        logger.warning("取得 %s 預報失敗 (%s)，改用快照 v%s", location_name, exc, snapshot["version"])
+        return _to_forecast(snapshot["payload"], snapshot, degraded=True)
+
+
+async def _get_series(location_name: str):
+    forecast = await get_forecast(location_name)
+    series = forecast["series"].get(location_name)
+    if series is None:
+        raise ValueError(f"查無 {location_name} 的預報")
+    return series, forecast
+
+
+# =========== 背景預抓 ==========
+def restore_snapshots():
+    """啟動時把預抓地區的最新快照放回快取，第一個查詢就不用等上游"""
+    for name in PREFETCH_LOCATIONS:
+        key = (DATASET, name, ELEMENTS)
+        snapshot = snapshot_store.latest(_snapshot_key(key))
+        if snapshot:
+            forecast_cache.put(key, _to_forecast(snapshot["payload"], snapshot), snapshot["fetched_at"])
+
+
+async def prefetch_once():
+    """一次抓回所有預抓地區，拆開後各自存成快照並寫入快取"""
+    raw = await _fetch_forecast(DATASET, ",".join(PREFETCH_LOCATIONS), ELEMENTS)
+    for name, payload in _split_locations(raw).items():
+        key = (DATASET, name, ELEMENTS)
+        snapshot = await asyncio.to_thread(snapshot_store.save, _snapshot_key(key), payload)
+        forecast_cache.put(key, _to_forecast(payload, snapshot), snapshot["fetched_at"])
+
+
+async def prefetch_loop():
+    """依氣象署發布時刻預抓，失敗時隔一段時間再試"""
+    while True:
+        try:
+            await prefetch_once()
+            delay = next_issue_time(datetime.now(TAIPEI)).timestamp() - time.time()
+        except Exception as exc:
+            logger.warning("預抓失敗：%s", exc)
+            delay = PREFETCH_RETRY_SECONDS
+        await asyncio.sleep(max(delay, 1))
+
+
+def _parse_time(text: str | None, default: float) -> float:
+    """支援 "14:00"、"14" (今天) 或完整 ISO 時間，未指定時使用 default"""
+    if not text:
+        return default
+    try:
+        if len(text) <= 5:
+            hour, _, minute = text.partition(":")
+            today = datetime.now(TAIPEI)
+            return today.replace(
+                hour=int(hour), minute=int(minute or 0), second=0, microsecond=0
+            ).timestamp()
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"無法解析時間：{text}，請使用 \"14:00\" 或 ISO 格式") from None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=TAIPEI)
+    return parsed.timestamp()
+
+
+@mcp.tool()
+async def getWeather(LocationName: str = "霧峰區") -> list:
+    """
+    取得今天霧峰區的天氣預報
+    """
+
+    series, forecast = await _get_series(LocationName)
+    now = time.time()
+
+    return {**series.summary(now), **_snapshot_info(forecast, now)}
+
+
+@mcp.tool()
+async def classifyWeather(LocationName: str = "霧峰區") -> dict:
+    """
+    取得目前天氣並依營運手冊 §3 判定情境 (typhoon > rainy > sunny)，
+    scenario 可直接對應 push_message 的 weather_type
+    """
+
+    series, forecast = await _get_series(LocationName)
+    now = time.time()
+    weather = {**series.summary(now), **_snapshot_info(forecast, now)}
+    description = series.row(series.index_at(now)).get("天氣預報綜合描述")
+
+    return {
+        **classify_weather({**weather, "天氣預報綜合描述": description}),
+        "weather": weather,
+    }
+
+
+@mcp.tool()
+async def getWeatherBatch(locations: list[str]) -> list:
+    """
+    一次取得多個行政區的天氣預報 (例如霧峰區與鄰近行政區)，
+    只呼叫一次氣象署 API。locations 例：["霧峰區", "大里區", "太平區"]
+    """
+
+    # 去除重複 (保留順序)；快取 key 用排序後的名單，同一組地區共用快取
+    names = list(dict.fromkeys(name.strip() for name in locations if name.strip()))
+    if not names:
+        return []
+
+    forecast = await get_forecast(",".join(sorted(names)))
+    by_name = forecast["series"]
+    now = time.time()
+    info = _snapshot_info(forecast, now)
+
+    return [
+        {**by_name[name].summary(now), **info}
+        if name in by_name
+        else {"location": name, "error": "查無此地區的預報"}
+        for name in names
+    ]
 
-    # 整理API回傳所有的第一筆資料
-    parsed_data = {}
-    time_info = {}
 
-    for item in weather_elements:
-        element_name = item["ElementName"]
+@mcp.tool()
+async def getForecastWindow(LocationName: str = "霧峰區", hours: int = 6) -> list:
+    """
+    取得接下來 hours 小時的逐時預報 (溫度、體感溫度、降雨機率、天氣現象)
+    """
 
-        # 直接取第一筆 (最近的時段)，移除空值檢查
-        first_record = item["Time"][0]
+    series, _ = await _get_series(LocationName)
+    now = time.time()
+    rows = series.window(now, now + hours * 3600)
+    for row in rows:
+        row.pop("天氣預報綜合描述", None)
+    return rows
 
-        # 直接抓取數值
-        val = list(first_record["ElementValue"][0].values())[0]
-        parsed_data[element_name] = val
 
-        # 抓取時間區段
-        if element_name == "天氣預報綜合描述":
-            time_info["StartTime"] = first_record["StartTime"]
-            time_info["EndTime"] = first_record["EndTime"]
+@mcp.tool()
+async def getMaxInWindow(
+    element: str = "降雨機率",
+    start: str = "",
+    end: str = "",
+    LocationName: str = "霧峰區",
+) -> dict:
+    """
+    查詢時段內某天氣因子的最大值與發生時間。
+    element: 溫度 / 體感溫度 / 降雨機率；start、end 例："14:00"、"18:00"，未填時為現在起 6 小時
+    """
+
+    series, _ = await _get_series(LocationName)
+    name = resolve_element(element)
+    now = time.time()
+    start_ts = _parse_time(start, now)
+    end_ts = _parse_time(end, start_ts + 6 * 3600)
+    if end_ts <= start_ts:
+        raise ValueError(f"結束時間 {end} 必須晚於開始時間 {start or '現在'}")
 
-    # 整理成精簡結果
-    result = {
+    return {
         "location": LocationName,
-        "time": f"{time_info['StartTime']} ~ {time_info['EndTime']}",
-        "溫度": parsed_data["溫度"],
-        "體感溫度": parsed_data["體感溫度"],
-        "降雨機率": parsed_data["3小時降雨機率"],
-        "天氣現象": parsed_data["天氣現象"],
+        "element": name,
+        "max": series.max_in(name, start_ts, end_ts),
     }
 
-    return result
+
+@mcp.tool()
+async def getFirstAbove(
+    element: str = "體感溫度",
+    threshold: float = 35,
+    start: str = "",
+    LocationName: str = "霧峰區",
+) -> dict:
+    """
+    查詢從 start (預設現在) 起，第一個超過門檻值的時段。
+    例：體感溫度第一次超過 35 度是幾點；找不到時 first 為 null
+    """
+
+    series, _ = await _get_series(LocationName)
+    name = resolve_element(element)
+
+    return {
+        "location": LocationName,
+        "element": name,
+        "threshold": threshold,
+        "first": series.first_above(name, threshold, _parse_time(start, time.time())),
+    }
+
+
+@mcp.custom_route("/cache/stats", methods=["GET"])
+async def cache_stats(request):
+    """快取命中統計 (hit / stale / miss / 合併請求數)"""
+    return JSONResponse(forecast_cache.snapshot_stats())
+
+
+async def main():
+    restore_snapshots()
+    prefetcher = asyncio.create_task(prefetch_loop()) if PREFETCH_LOCATIONS else None
+    try:
+        await mcp.run_streamable_http_async()
+    finally:
+        if prefetcher:
+            prefetcher.cancel()
+        await http_client.aclose()
+        snapshot_store.close()
 
 
 if __name__ == "__main__":
-    mcp.run(transport="streamable-http")
+    asyncio.run(main())
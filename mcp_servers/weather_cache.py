@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+TAIPEI = ZoneInfo("Asia/Taipei")
+
+# 氣象署鄉鎮預報的發布時刻 (台北時間)，發布後稍待幾分鐘資料才會上架
+ISSUE_HOURS = tuple(
+    int(h) for h in os.getenv("WEATHER_ISSUE_HOURS", "5,11,17,23").split(",")
+)
+ISSUE_DELAY = timedelta(minutes=int(os.getenv("WEATHER_ISSUE_DELAY_MIN", "10")))
+# 過期後仍可先回舊資料的時間，期間由背景刷新補上新資料
+STALE_TTL = timedelta(hours=int(os.getenv("WEATHER_STALE_HOURS", "6")))
+
+
+def next_issue_time(now: datetime) -> datetime:
+    """回傳 now 之後下一次預報發布 (含上架延遲) 的時間"""
+    local = now.astimezone(TAIPEI)
+    for day in range(2):
+        base = (local + timedelta(days=day)).replace(
+            minute=0, second=0, microsecond=0
+        )
+        for hour in sorted(ISSUE_HOURS):
+            candidate = base.replace(hour=hour) + ISSUE_DELAY
+            if candidate > local:
+                return candidate
+    return local + timedelta(hours=6)
+
+
+class _Entry:
+    __slots__ = ("value", "fetched_at", "expires_at", "stale_until")
+
+    def __init__(self, value, fetched_at: float, expires_at: float):
+        self.value = value
+        self.fetched_at = fetched_at
+        self.expires_at = expires_at
+        self.stale_until = expires_at + STALE_TTL.total_seconds()
+
+
+class ForecastCache:
+    """
+    依發布週期過期的預報快取。
+    - 新鮮資料直接回傳
+    - 過期但仍在 stale 區間：先回舊資料，背景只跑一個刷新
+    - 完全沒有資料：同一個 key 的併發請求合併成一次上游呼叫
+    """
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._entries: dict[tuple, _Entry] = {}
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+        }
+
+    def _expiry(self, now: float) -> float:
+        issued = next_issue_time(datetime.fromtimestamp(now, TAIPEI))
+        return issued.timestamp()
+
+    async def get(self, key: tuple, fetch):
+        """取得 key 的資料，fetch 為無參數的 coroutine function"""
+        now = self._clock()
+        entry = self._entries.get(key)
+
+        if entry and now < entry.expires_at:
+            self.stats["hits"] += 1
+            return entry.value
+
+        if entry and now < entry.stale_until:
+            self.stats["stale_hits"] += 1
+            if key not in self._inflight:
+                self._start_fetch(key, fetch, background=True)
+            return entry.value
+
+        if key in self._inflight:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(self._inflight[key])
+
+        self.stats["misses"] += 1
+        return await asyncio.shield(self._start_fetch(key, fetch))
+
+    def _start_fetch(self, key: tuple, fetch, background: bool = False):
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+
+        async def run():
+            try:
+                value = await fetch()
+            except Exception as exc:
+                if background:
+                    self.stats["refresh_errors"] += 1
+                    logger.warning("背景刷新失敗 %s: %s", key, exc)
+                    future.set_result(self._entries[key].value)
+                else:
+                    future.set_exception(exc)
+            else:
+                now = self._clock()
+                self._entries[key] = _Entry(value, now, self._expiry(now))
+                if background:
+                    self.stats["refreshes"] += 1
+                future.set_result(value)
+            finally:
+                self._inflight.pop(key, None)
+
+        task = asyncio.create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        # 背景刷新沒有人等待結果，避免 "exception was never retrieved" 警告
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return future
+
+    def put(self, key: tuple, value, fetched_at: float | None = None):
+        """直接寫入 (預抓或從快照還原)，過期時間依抓取時間計算"""
+        fetched_at = fetched_at or self._clock()
+        self._entries[key] = _Entry(value, fetched_at, self._expiry(fetched_at))
+
+    def snapshot_stats(self) -> dict:
+        total = self.stats["hits"] + self.stats["stale_hits"] + self.stats["misses"]
+        hit_rate = (self.stats["hits"] + self.stats["stale_hits"]) / total if total else 0.0
+        return {**self.stats, "entries": len(self._entries), "hit_rate": round(hit_rate, 4)}
@@ -0,0 +1,103 @@
+"""
+依營運手冊 §3.1 / §3.2 判定天氣情境 (颱風 > 雨天 > 晴天)。
+
+關鍵字在 import 時編成一台 Aho–Corasick 自動機，描述文字只需掃描一次
+就能找出所有命中的關鍵字，結果與 LLM 無關、可重現。
+"""
+
+from collections import deque
+
+# 關鍵字 -> 情境；None 表示中性詞，用來遮蔽誤判 (例如「降雨機率0%」不代表下雨)
+KEYWORDS = {
+    "颱風": "typhoon",
+    "雨": "rainy",
+    "雷": "rainy",
+    "雷雨": "rainy",
+    "陣雨": "rainy",
+    "晴": "sunny",
+    "降雨機率": None,
+}
+
+# 手冊 §3.2 優先順序
+PRIORITY = ("typhoon", "rainy", "sunny")
+
+# 會被檢查的欄位 (getWeather 輸出與 CWA 原始描述)
+TEXT_FIELDS = ("天氣現象", "天氣預報綜合描述", "description")
+
+
+def _build_automaton(keywords: dict):
+    goto = [{}]
+    fail = [0]
+    output = [[]]
+
+    for word in keywords:
+        state = 0
+        for ch in word:
+            if ch not in goto[state]:
+                goto.append({})
+                fail.append(0)
+                output.append([])
+                goto[state][ch] = len(goto) - 1
+            state = goto[state][ch]
+        output[state].append(word)
+
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        for ch, nxt in goto[state].items():
+            queue.append(nxt)
+            f = fail[state]
+            while f and ch not in goto[f]:
+                f = fail[f]
+            fail[nxt] = goto[f].get(ch, 0) if goto[f].get(ch, 0) != nxt else 0
+            output[nxt] = output[nxt] + output[fail[nxt]]
+
+    return goto, fail, output
+
+
+_GOTO, _FAIL, _OUTPUT = _build_automaton(KEYWORDS)
+
+
+def find_keywords(text: str) -> list[tuple[int, int, str]]:
+    """回傳所有命中的 (起點, 終點, 關鍵字)"""
+    matches = []
+    state = 0
+    for i, ch in enumerate(text):
+        while state and ch not in _GOTO[state]:
+            state = _FAIL[state]
+        state = _GOTO[state].get(ch, 0)
+        for word in _OUTPUT[state]:
+            matches.append((i - len(word) + 1, i + 1, word))
+    return matches
+
+
+def classify_text(text: str) -> tuple[str, list[str]]:
+    """回傳 (情境, 命中的關鍵字)；沒有任何天氣關鍵字時視為晴天"""
+    matches = find_keywords(text)
+    neutral = [(s, e) for s, e, word in matches if KEYWORDS[word] is None]
+
+    hits = [
+        word
+        for s, e, word in matches
+        if KEYWORDS[word] is not None
+        and not any(ns <= s and e <= ne for ns, ne in neutral)
+    ]
+    found = {KEYWORDS[word] for word in hits}
+
+    for scenario in PRIORITY:
+        if scenario in found:
+            return scenario, list(dict.fromkeys(hits))
+    return "sunny", []
+
+
+def classify_weather(weather: dict | list) -> dict:
+    """
+    把 getWeather (或 getWeatherBatch) 的輸出對應到 rainy / sunny / typhoon。
+    多個地區時取風險最高的情境 (手冊第七章：規則衝突時採風險較高者)。
+    """
+    items = weather if isinstance(weather, list) else [weather]
+    text = "。".join(
+        str(item[field]) for item in items for field in TEXT_FIELDS if item.get(field)
+    )
+    scenario, keywords = classify_text(text)
+    return {"scenario": scenario, "keywords": keywords}
@@ -0,0 +1,77 @@
+"""
+中文手冊用的 BM25 倒排索引與 reciprocal rank fusion。
+
+MiniLM 對繁體中文的設施名稱、規則關鍵字不敏感，BM25 以 CJK bigram
+(再加上英數字詞) 做字面比對，兩邊的排名再用 RRF 合併。
+"""
+
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+_CJK_RUN = re.compile(r"[㐀-鿿豈-﫿]+")
+_WORD = re.compile(r"[a-z0-9_]+(?:\.[0-9]+)?")
+
+# RRF 的平滑常數 (原論文建議值)
+RRF_K = 60
+
+
+def tokenize(text: str) -> list[str]:
+    """CJK 連續字串切成 bigram (單字字串保留單字)，英數字以詞為單位"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = []
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.extend(_WORD.findall(text))
+    return tokens
+
+
+class BM25Index:
+    def __init__(self, ids: list[str], texts: list[str], k1: float = 1.5, b: float = 0.75):
+        self.ids = ids
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        self._lengths = []
+
+        for n, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            self._lengths.append(sum(counts.values()))
+            for token, tf in counts.items():
+                self._postings[token].append((n, tf))
+
+        total = len(texts)
+        self._avg_length = sum(self._lengths) / total if total else 0.0
+        self._idf = {
+            token: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for token, postings in self._postings.items()
+        }
+
+    def search(self, query: str, k: int = 3) -> list[tuple[str, float]]:
+        """回傳分數最高的 (id, 分數)，沒有任何字面命中時回傳空列表"""
+        scores: dict[int, float] = defaultdict(float)
+        for token in set(tokenize(query)):
+            idf = self._idf.get(token)
+            if idf is None:
+                continue
+            for n, tf in self._postings[token]:
+                norm = 1 - self.b + self.b * self._lengths[n] / self._avg_length
+                scores[n] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.ids[n], score) for n, score in top]
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = RRF_K) -> list[str]:
+    """多組排名 (id 列表，最好的在前) 合併成一組"""
+    scores: dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
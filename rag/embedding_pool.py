@@ -0,0 +1,65 @@
+"""
+建索引時的平行批次嵌入。
+
+chunk 切成大批次分給多個行程，每個行程各自載入一份嵌入模型 (torch 限單執行緒，
+避免行程之間搶核心)。chunk 數量少時直接在本行程嵌入，省下啟動行程與載入模型的成本。
+"""
+
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.getenv("RAG_EMBED_WORKERS", str(os.cpu_count() or 1)))
+BATCH_SIZE = int(os.getenv("RAG_EMBED_BATCH_SIZE", "256"))
+# chunk 數低於此值時不開行程池
+PARALLEL_MIN_CHUNKS = int(os.getenv("RAG_EMBED_PARALLEL_MIN", "1024"))
+
+_model = None
+
+
+def _init_worker(model_name: str):
+    global _model
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+    from langchain_huggingface import HuggingFaceEmbeddings
+    _model = HuggingFaceEmbeddings(model_name=model_name)
+
+
+def _embed_batch(texts: list[str]) -> list[list[float]]:
+    return _model.embed_documents(texts)
+
+
+def embed_documents(embeddings, texts: list[str], model_name: str,
+                    workers: int = WORKERS, batch_size: int = BATCH_SIZE) -> list[list[float]]:
+    """回傳與 texts 同順序的向量，並記錄吞吐量 (chunks/s)"""
+    start = time.perf_counter()
+    workers = min(workers, -(-len(texts) // batch_size)) if texts else 1
+
+    if workers <= 1 or len(texts) < PARALLEL_MIN_CHUNKS:
+        workers = 1
+        vectors = embeddings.embed_documents(texts) if texts else []
+    else:
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        # torch 在 fork 後不安全，一律用 spawn
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_name,),
+        ) as pool:
+            vectors = [vector for batch in pool.map(_embed_batch, batches) for vector in batch]
+
+    elapsed = time.perf_counter() - start
+    if texts:
+        logger.info(
+            "嵌入 %d 個 chunk：%.1f 秒，%.0f chunks/s (%d 個行程)",
+            len(texts), elapsed, len(texts) / elapsed if elapsed else 0.0, workers,
+        )
+    return vectors
@@ -0,0 +1,42 @@
+"""向量檢索與 BM25 的混合檢索，兩邊各取候選再以 RRF 排名"""
+
+from rag.bm25 import BM25Index, reciprocal_rank_fusion
+
+MODES = ("vector", "bm25", "hybrid")
+# 每個檢索器先取的候選數
+CANDIDATES = 10
+
+
+class HybridRetriever:
+    def __init__(self, store, bm25: BM25Index, mode: str = "hybrid", candidates: int = CANDIDATES):
+        if mode not in MODES:
+            raise ValueError(f"未知的檢索模式：{mode}")
+        self._store = store
+        self._bm25 = bm25
+        self.mode = mode
+        self.candidates = candidates
+
+    def _vector_ids(self, vector, k: int) -> list[str]:
+        return [doc.id for doc in self._store.similarity_search_by_vector(vector, k=k)]
+
+    def _bm25_ids(self, query: str, k: int) -> list[str]:
+        return [doc_id for doc_id, _ in self._bm25.search(query, k=k)]
+
+    def retrieve(self, query: str, vector, k: int = 3) -> list:
+        if self.mode == "vector":
+            ids = self._vector_ids(vector, k)
+        elif self.mode == "bm25":
+            ids = self._bm25_ids(query, k)
+        else:
+            n = max(k, self.candidates)
+            ids = reciprocal_rank_fusion([
+                self._vector_ids(vector, n),
+                self._bm25_ids(query, n),
+            ])[:k]
+
+        docs = []
+        for doc_id in ids:
+            doc = self._store.docstore.search(doc_id)
+            if doc is not None and not isinstance(doc, str):
+                docs.append(doc)
+        return docs
@@ -0,0 +1,211 @@
+"""
+營運手冊的結構化切塊。
+
+PDF 與 Markdown 都先依標題階層 (第X章 / X.Y 節) 切成「節」，每個節帶著
+section_path metadata。小的節整節當一個 chunk，過長的節才再用字數切塊，
+每塊前面補上節標題，查詢時也能把同一節的片段合併回整節。
+"""
+
+import os
+import re
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# 整節不超過此字數就不再切塊
+SECTION_MAX_CHARS = 800
+# 過長的節再切塊時使用的參數
+CHUNK_SIZE = 600
+CHUNK_OVERLAP = 150
+# 查詢命中片段時，節的全文不超過此字數就改回傳整節
+EXPAND_MAX_CHARS = 1600
+
+PATH_SEP = " > "
+
+_CHAPTER = re.compile(r"^第[一二三四五六七八九十百]+章")
+_SECTION_NO = re.compile(r"^(\d+\.\d+)\s*(.*)$")
+_LABEL = re.compile(r"^(第[一二三四五六七八九十百]+章|\d+\.\d+)")
+_MD_HEADING = re.compile(r"^(#{1,6})\s+(.*)$")
+
+
+def _section(source: str, path: list[str], lines: list[str], **metadata) -> Document | None:
+    text = "\n".join(lines).strip()
+    if not text or not path:
+        return None
+    return Document(
+        page_content=text,
+        metadata={"source": source, "section_path": PATH_SEP.join(path), **metadata},
+    )
+
+
+def load_markdown(path: str) -> list[Document]:
+    """## 為章、### 為節；更深的標題 (例如 #### 【關閉設施】) 留在節內，規則表不會被拆開"""
+    with open(path, encoding="utf-8") as f:
+        content = f.read()
+
+    sections, current, lines = [], [], []
+
+    def flush():
+        doc = _section(path, current, lines)
+        if doc:
+            sections.append(doc)
+        lines.clear()
+
+    for line in content.splitlines():
+        heading = _MD_HEADING.match(line)
+        if heading and len(heading.group(1)) <= 3:
+            level, title = len(heading.group(1)), heading.group(2).strip()
+            flush()
+            if level == 2:
+                current = [title]
+            elif level == 3:
+                current = current[:1] + [title]
+            # level 1 是文件標題，不放進路徑
+            continue
+        if heading:
+            lines.append(heading.group(2).strip())
+        elif line.strip() != "---":
+            lines.append(line.rstrip())
+
+    flush()
+    return sections
+
+
+def _clean_pdf_lines(text: str) -> list[str]:
+    """
+    PDF 轉出的文字有粗體重複 (同一行連續出現兩次)、
+    「1\\n. \\n項目」這類被拆開的編號，先整理成乾淨的行
+    """
+    text = re.sub(r"^(\d+)\n\.\s*\n", r"\1. ", text, flags=re.M)
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and (not lines or line != lines[-1]):
+            lines.append(line)
+    return lines
+
+
+def load_pdf(path: str) -> list[Document]:
+    from langchain_community.document_loaders import PyPDFLoader
+
+    sections, current, lines = [], [], []
+    start_page = 0
+
+    def flush():
+        doc = _section(path, current, lines, page=start_page)
+        if doc:
+            sections.append(doc)
+        lines.clear()
+
+    for page in PyPDFLoader(path).load():
+        page_no = page.metadata.get("page", 0)
+        cleaned = _clean_pdf_lines(page.page_content)
+        i = 0
+        while i < len(cleaned):
+            line = cleaned[i]
+            i += 1
+            if _CHAPTER.match(line):
+                # 標題中的括號被斷行時，接到括號閉合為止
+                while line.count("（") > line.count("）") and i < len(cleaned):
+                    line += cleaned[i]
+                    i += 1
+                flush()
+                current, start_page = [line], page_no
+                continue
+            number = _SECTION_NO.match(line)
+            if number and current:
+                title = number.group(2)
+                if not title and i < len(cleaned):
+                    title = cleaned[i]
+                    i += 1
+                flush()
+                current, start_page = current[:1] + [f"{number.group(1)} {title}"], page_no
+                continue
+            lines.append(line)
+
+    flush()
+    return sections
+
+
+LOADERS = {
+    ".md": load_markdown,
+    ".pdf": load_pdf,
+}
+
+
+def section_key(doc: Document) -> tuple:
+    """以章節編號 (第X章 / X.Y) 識別同一節，不受不同來源的標題排版差異影響"""
+    labels = []
+    for part in doc.metadata["section_path"].split(PATH_SEP):
+        match = _LABEL.match(part)
+        labels.append(match.group(1) if match else part)
+    return tuple(labels)
+
+
+def load_sections(sources: list[str]) -> list[Document]:
+    """
+    依序讀取所有來源並切成節。
+    同一節出現在多個來源時只保留排在前面的來源 (來源清單由新到舊排列)。
+    """
+    seen, sections = set(), []
+    for source in sources:
+        loader = LOADERS.get(os.path.splitext(source)[1].lower())
+        if loader is None:
+            raise ValueError(f"不支援的來源格式：{source}")
+        for doc in loader(source):
+            key = section_key(doc)
+            if key in seen:
+                continue
+            seen.add(key)
+            sections.append(doc)
+    return sections
+
+
+def split_section(section: Document) -> list[Document]:
+    """小的節整節回傳；過長的節切塊，每塊前面加上節路徑並記錄在節中的位置"""
+    text = section.page_content
+    if len(text) <= SECTION_MAX_CHARS:
+        return [Document(
+            page_content=f"{section.metadata['section_path']}\n{text}",
+            metadata={**section.metadata, "chunk": 0, "chunks": 1},
+        )]
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP
+    )
+    pieces = splitter.split_text(text)
+    metadata = dict(section.metadata)
+    if len(text) <= EXPAND_MAX_CHARS:
+        metadata["section_text"] = text
+    return [
+        Document(
+            page_content=f"{section.metadata['section_path']}\n{piece}",
+            metadata={**metadata, "chunk": n, "chunks": len(pieces)},
+        )
+        for n, piece in enumerate(pieces)
+    ]
+
+
+def expand_sections(docs: list[Document]) -> list[Document]:
+    """
+    把同一節的多個片段合併成一筆；節夠小時直接換成整節全文。
+    結果依第一次命中的順序排列。
+    """
+    merged: dict[str, list[Document]] = {}
+    for doc in docs:
+        key = f"{doc.metadata.get('source')}#{doc.metadata.get('section_path')}"
+        merged.setdefault(key, []).append(doc)
+
+    results = []
+    for parts in merged.values():
+        first = parts[0]
+        if "section_text" in first.metadata:
+            content = f"{first.metadata['section_path']}\n{first.metadata['section_text']}"
+        elif len(parts) > 1:
+            parts.sort(key=lambda d: d.metadata.get("chunk", 0))
+            content = "\n…\n".join(d.page_content for d in parts)
+        else:
+            content = first.page_content
+        results.append(Document(page_content=content, metadata=first.metadata))
+    return results
@@ -1,35 +1,285 @@
+import hashlib
+import json
+import logging
 import os
+import shutil
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from rag import ingestion
+from rag.bm25 import BM25Index
+from rag.embedding_pool import embed_documents
+
+try:
+    import fcntl
+except ImportError:  # Windows：不做跨行程鎖
+    fcntl = None
+
+logger = logging.getLogger(__name__)
 
 VECTOR_DIR = "./faiss_index"
 PDF_file_path = "./樂園營運手冊.pdf"
+MD_file_path = "./樂園營運手冊Ver3.md"
+# 由新到舊排列，同一節只取最前面的來源
+SOURCES = [MD_file_path, PDF_file_path]
+MANIFEST_FILE = os.path.join(VECTOR_DIR, "manifest.json")
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# 以唯讀 mmap 開啟索引，多個 worker 共用同一份 page cache
+USE_MMAP = os.getenv("RAG_INDEX_MMAP", "1") != "0"
+
+
+def _hash(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:20]
+
+
+def _sources_hash(paths: list[str]) -> str:
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.encode("utf-8"))
+        with open(path, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def _index_params() -> dict:
+    """會影響向量內容的設定；任何一項改變都必須整個重建"""
+    return {
+        "embedding_model": EMBEDDING_MODEL,
+        "splitter": {
+            "type": "sections",
+            "section_max_chars": ingestion.SECTION_MAX_CHARS,
+            "expand_max_chars": ingestion.EXPAND_MAX_CHARS,
+            "chunk_size": ingestion.CHUNK_SIZE,
+            "chunk_overlap": ingestion.CHUNK_OVERLAP,
+        },
+    }
+
+
+def _read_manifest() -> dict | None:
+    try:
+        with open(MANIFEST_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(manifest: dict):
+    manifest["index_version"] = _hash(
+        *sorted(cid for entry in manifest["sections"].values() for cid in entry["chunks"])
+    )
+    tmp = f"{MANIFEST_FILE}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, MANIFEST_FILE)
+
+
+_version_cache: tuple[float, str | None] = (0.0, None)
+
+
+def get_index_version() -> str | None:
+    """目前索引內容的版本 (所有 chunk hash 的摘要)，內容變動時就會改變"""
+    global _version_cache
+    try:
+        mtime = os.stat(MANIFEST_FILE).st_mtime
+    except OSError:
+        return None
+    if mtime != _version_cache[0]:
+        manifest = _read_manifest()
+        _version_cache = (mtime, manifest.get("index_version") if manifest else None)
+    return _version_cache[1]
+
+
+def _section_key(section) -> str:
+    return f"{section.metadata['source']}#{section.metadata['section_path']}"
+
+
+def _split_sections(sections) -> tuple[dict, list, list]:
+    """
+    逐節切塊並計算 hash。
+    回傳 ({節 key: {hash, chunks}}, 所有 chunk Document, 對應的 chunk id)
+    """
+    entries, docs, ids = {}, [], []
+    for section in sections:
+        key = _section_key(section)
+        chunk_ids = []
+        for n, chunk in enumerate(ingestion.split_section(section)):
+            # 同一節內容相同的 chunk 以出現順序區分
+            chunk_id = _hash(key, chunk.page_content, str(n))
+            chunk_ids.append(chunk_id)
+            docs.append(chunk)
+            ids.append(chunk_id)
+        entries[key] = {
+            "hash": _hash(section.page_content),
+            "chunks": chunk_ids,
+        }
+    return entries, docs, ids
+
 
+def _save(db):
+    """
+    先寫到暫存資料夾再逐檔 rename。
+    已經 mmap 舊索引的 worker 仍指向舊檔案，不會讀到寫到一半的內容。
+    """
+    tmp_dir = os.path.join(VECTOR_DIR, f".tmp-{os.getpid()}")
+    db.save_local(tmp_dir)
+    for name in ("index.pkl", "index.faiss"):
+        os.replace(os.path.join(tmp_dir, name), os.path.join(VECTOR_DIR, name))
+    shutil.rmtree(tmp_dir, ignore_errors=True)
 
-def load_vector_store():
-    
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
+
+def _open_shared(embeddings):
+    """以唯讀 mmap 開啟索引；索引類型或平台不支援時退回一般載入"""
+    if USE_MMAP:
+        import faiss
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+        try:
+            return FAISS.load_local(
+                VECTOR_DIR, embeddings, allow_dangerous_deserialization=True, io_flags=flags
+            )
+        except RuntimeError as exc:
+            logger.warning("無法以 mmap 開啟索引，改為一般載入：%s", exc)
+    return FAISS.load_local(
+        VECTOR_DIR, embeddings, allow_dangerous_deserialization=True
+    )
+
+
+def _embed(embeddings, docs) -> list:
+    texts = [doc.page_content for doc in docs]
+    return list(zip(texts, embed_documents(embeddings, texts, EMBEDDING_MODEL)))
+
+
+def _rebuild(embeddings, sections, source_hash: str):
+    entries, docs, ids = _split_sections(sections)
+    logger.info("重建向量索引：%d 個 chunk", len(docs))
+
+    db = FAISS.from_embeddings(
+        _embed(embeddings, docs), embeddings,
+        metadatas=[doc.metadata for doc in docs], ids=ids,
     )
+    os.makedirs(VECTOR_DIR, exist_ok=True)
+    _save(db)
+    _write_manifest({
+        "params": _index_params(),
+        "source_hash": source_hash,
+        "sections": entries,
+    })
+    return db
 
-    if os.path.exists(VECTOR_DIR):
-        return FAISS.load_local(
-            VECTOR_DIR, embeddings, allow_dangerous_deserialization=True
+
+def _update(db, embeddings, manifest: dict, sections, source_hash: str):
+    """只重新切塊、嵌入內容有變動的節，並移除已不存在的 chunk"""
+    old_entries = manifest["sections"]
+    changed = [
+        section for section in sections
+        if old_entries.get(_section_key(section), {}).get("hash") != _hash(section.page_content)
+    ]
+    entries, docs, ids = _split_sections(changed)
+    for section in sections:
+        key = _section_key(section)
+        if key not in entries:
+            entries[key] = old_entries[key]
+    ids_all = {cid for entry in entries.values() for cid in entry["chunks"]}
+    old_ids = {cid for entry in old_entries.values() for cid in entry["chunks"]}
+
+    # 以索引實際內容為準，manifest 與索引不同步時也不會刪到不存在的 id
+    stored = set(db.index_to_docstore_id.values())
+    removed = list((old_ids - ids_all) & stored)
+    added = [(doc, cid) for doc, cid in zip(docs, ids) if cid not in stored]
+
+    if removed:
+        db.delete(removed)
+    if added:
+        db.add_embeddings(
+            _embed(embeddings, [doc for doc, _ in added]),
+            metadatas=[doc.metadata for doc, _ in added],
+            ids=[cid for _, cid in added],
         )
+    logger.info("增量更新向量索引：新增 %d、移除 %d 個 chunk", len(added), len(removed))
 
-    loader = PyPDFLoader(PDF_file_path)
-    docs = loader.load()
+    _save(db)
+    _write_manifest({
+        "params": manifest["params"],
+        "source_hash": source_hash,
+        "sections": entries,
+    })
+    return db
 
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=600,
-        chunk_overlap=150
+
+def _is_current(manifest: dict | None, source_hash: str) -> bool:
+    return bool(
+        manifest
+        and os.path.exists(os.path.join(VECTOR_DIR, "index.faiss"))
+        and manifest["params"] == _index_params()
+        and manifest.get("source_hash") == source_hash
     )
 
-    texts = splitter.split_documents(docs)
 
-    db = FAISS.from_documents(texts, embeddings)
-    db.save_local(VECTOR_DIR)
-    
-    return db
\ No newline at end of file
+def _build(embeddings, source_hash: str):
+    """重建或增量更新索引並存檔；呼叫端需持有建置鎖"""
+    manifest = _read_manifest()
+    sections = ingestion.load_sections(SOURCES)
+    index_exists = os.path.exists(os.path.join(VECTOR_DIR, "index.faiss"))
+
+    # 模型或切塊參數不同 (或是舊版沒有 manifest 的索引)：整個重建
+    if not index_exists or not manifest or manifest["params"] != _index_params():
+        _rebuild(embeddings, sections, source_hash)
+        return
+
+    # 增量更新需要可寫的索引，這裡不用 mmap
+    db = FAISS.load_local(
+        VECTOR_DIR, embeddings, allow_dangerous_deserialization=True
+    )
+    _update(db, embeddings, manifest, sections, source_hash)
+
+
+def _open_current(embeddings):
+    """
+    開啟索引並把載入當下的版本記在 store.index_version；
+    開啟期間剛好有其他 worker 重建完成 (版本變了) 時重新開啟
+    """
+    for _ in range(3):
+        version = get_index_version()
+        db = _open_shared(embeddings)
+        if get_index_version() == version:
+            break
+    db.index_version = version
+    return db
+
+
+def load_vector_store(embeddings=None):
+    """
+    開啟 (必要時先建立) 向量庫，store.index_version 是這份 store 的內容版本。
+    重新載入時可傳入原本的 embeddings，不必再載一次模型。
+    """
+    embeddings = embeddings or HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL,
+    )
+
+    source_hash = _sources_hash(SOURCES)
+
+    # 手冊沒變：直接開啟，不必重新解析來源
+    if _is_current(_read_manifest(), source_hash):
+        return _open_current(embeddings)
+
+    # 多個 worker 同時啟動時只讓一個建索引，其餘等它完成後直接開啟
+    os.makedirs(VECTOR_DIR, exist_ok=True)
+    with open(os.path.join(VECTOR_DIR, ".build.lock"), "w") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        if not _is_current(_read_manifest(), source_hash):
+            _build(embeddings, source_hash)
+
+    return _open_current(embeddings)
+
+
+def build_bm25_index(db) -> BM25Index:
+    """以向量庫 docstore 中的同一批 chunk 建 BM25 索引，兩邊的 id 一致"""
+    ids = list(db.index_to_docstore_id.values())
+    texts = [db.docstore.search(doc_id).page_content for doc_id in ids]
+    return BM25Index(ids, texts)
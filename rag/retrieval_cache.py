@@ -0,0 +1,145 @@
+"""
+search_knowledge_base 的兩層快取。
+
+第一層：正規化後的問題文字 -> 查詢向量，重複的問題不必再跑嵌入模型。
+第二層：(向量 bucket, k) -> 檢索結果。
+只用 BM25 時不需要查詢向量：不跑嵌入模型，第二層直接以 (正規化問題, k) 為 key。
+
+一個 RetrievalCache 綁定一份載入的 store；索引重建後由呼叫端載入新的 store
+並換一個新的 RetrievalCache，結果快取不會混用新舊索引。
+"""
+
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+from mcp_servers import tracing
+
+# 向量量化的小數位數；幾乎相同的向量會落在同一個 bucket
+BUCKET_DECIMALS = 3
+
+_SPACES = re.compile(r"\s+")
+_TRAILING = re.compile(r"[\s?？!！。.,，~～]+$")
+
+
+def normalize_query(query: str) -> str:
+    """全半形統一、去頭尾空白與句尾標點、連續空白合併、英文轉小寫"""
+    text = unicodedata.normalize("NFKC", query).strip().lower()
+    text = _TRAILING.sub("", text)
+    return _SPACES.sub(" ", text)
+
+
+def embedding_bucket(vector) -> str:
+    quantized = np.round(np.asarray(vector, dtype=np.float32), BUCKET_DECIMALS)
+    # -0.0 與 0.0 視為同一值
+    quantized += 0.0
+    return hashlib.blake2b(quantized.tobytes(), digest_size=16).hexdigest()
+
+
+class _LRU:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key):
+        if key not in self._data:
+            return None
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RetrievalCache:
+    """
+    包住向量庫的檢索。
+    version 是 store 載入時的索引版本 (store.index_version)，隨結果一起提供給上層快取。
+    retrieve(正規化問題, 查詢向量, k) 預設只做向量檢索，可換成混合檢索；
+    needs_vector=False (只用 BM25) 時查詢向量傳入 None。
+    """
+
+    def __init__(self, store, version: str | None = None, retrieve=None,
+                 max_queries: int = 512, max_results: int = 512, needs_vector: bool = True):
+        self._store = store
+        self.version = version
+        self.needs_vector = needs_vector
+        self._retrieve = retrieve or (
+            lambda query, vector, k: store.similarity_search_by_vector(vector, k=k)
+        )
+        self._embeddings = _LRU(max_queries)
+        self._results = _LRU(max_results)
+        self._lock = threading.Lock()
+        self.stats = {
+            "embed_hits": 0,
+            "embed_misses": 0,
+            "result_hits": 0,
+            "result_misses": 0,
+        }
+
+    def embed(self, query: str) -> list[float]:
+        key = normalize_query(query)
+        with self._lock:
+            vector = self._embeddings.get(key)
+            if vector is not None:
+                self.stats["embed_hits"] += 1
+                return vector
+            self.stats["embed_misses"] += 1
+
+        with tracing.span("rag.embed"):
+            vector = self._store.embeddings.embed_query(key)
+        with self._lock:
+            self._embeddings.put(key, vector)
+        return vector
+
+    def search(self, query: str, k: int = 3) -> list:
+        normalized = normalize_query(query)
+        if self.needs_vector:
+            vector = self.embed(query)
+            key = (embedding_bucket(vector), k)
+        else:
+            vector, key = None, (normalized, k)
+        with self._lock:
+            docs = self._results.get(key)
+            if docs is not None:
+                self.stats["result_hits"] += 1
+                return docs
+            self.stats["result_misses"] += 1
+
+        with tracing.span("rag.search", k=k):
+            docs = self._retrieve(normalized, vector, k)
+        with self._lock:
+            self._results.put(key, docs)
+        return docs
+
+    @property
+    def store(self):
+        return self._store
+
+    def index_version(self):
+        return self.version
+
+    def snapshot_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            embed_total = stats["embed_hits"] + stats["embed_misses"]
+            result_total = stats["result_hits"] + stats["result_misses"]
+            stats["embed_hit_rate"] = round(stats["embed_hits"] / embed_total, 3) if embed_total else 0.0
+            stats["result_hit_rate"] = round(stats["result_hits"] / result_total, 3) if result_total else 0.0
+            stats["cached_queries"] = len(self._embeddings)
+            stats["cached_results"] = len(self._results)
+            stats["index_version"] = self.version
+        return stats
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 與 benchmarks 相同，從專案根目錄匯入 ai / line_api / rag
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,62 @@
+import asyncio
+from types import SimpleNamespace
+
+from line_api.webhook_server import LineThreads
+
+
+class FakeRuntime:
+    """記錄每個 thread 的訊息；每次回答加入 使用者 → 工具呼叫 → 工具結果 → 回覆"""
+
+    def __init__(self):
+        self.threads: dict[str, list] = {}
+        self.ended: list[str] = []
+
+    def answer(self, thread_id: str, n: int):
+        self.threads.setdefault(thread_id, []).extend([
+            SimpleNamespace(type="human", content=f"q{n}"),
+            SimpleNamespace(type="ai", content=""),
+            SimpleNamespace(type="tool", content="result"),
+            SimpleNamespace(type="ai", content=f"a{n}"),
+        ])
+
+    async def history(self, thread_id):
+        return list(self.threads.get(thread_id, []))
+
+    async def replace_history(self, thread_id, messages):
+        self.threads[thread_id] = list(messages)
+
+    def end_session(self, thread_id):
+        self.ended.append(thread_id)
+        self.threads.pop(thread_id, None)
+
+
+async def _turns(threads, runtime, user_id, n):
+    for i in range(n):
+        async with threads.turn(user_id) as thread_id:
+            runtime.answer(thread_id, i)
+
+
+def test_history_is_capped_at_a_user_message():
+    runtime = FakeRuntime()
+    threads = LineThreads(runtime, max_messages=10, ttl=3600)
+    asyncio.run(_turns(threads, runtime, "U1", 50))
+
+    messages = runtime.threads["line:U1"]
+    assert len(messages) <= 10
+    assert messages[0].type == "human"
+    assert messages[-1].content == "a49"
+
+
+def test_idle_threads_are_deleted():
+    runtime = FakeRuntime()
+    threads = LineThreads(runtime, max_messages=10, ttl=60, sweep_interval=0)
+    asyncio.run(_turns(threads, runtime, "U1", 1))
+    asyncio.run(_turns(threads, runtime, "U2", 1))
+
+    threads.sweep(now=threads._active["line:U2"] + 30)
+    assert runtime.ended == []
+
+    threads.sweep(now=threads._active["line:U2"] + 61)
+    assert sorted(runtime.ended) == ["line:U1", "line:U2"]
+    assert len(threads) == 0
+    assert runtime.threads == {}
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from ai import router
+
+# 詢問狀態、主詞、原因、過去或排定時間的推播：都不能由快速路徑直接發送
+NOT_COMMANDS = [
+    "發送雨天推播了沒",
+    "雨天推播發送了沒",
+    "發送雨天推播好了沒",
+    "雨天推播發送狀態",
+    "發送雨天推播的結果",
+    "發送雨天推播失敗了",
+    "查詢雨天推播",
+    "誰發送了雨天推播",
+    "為何發送雨天推播",
+    "剛剛發送雨天推播",
+    "已經發送雨天推播",
+    "昨天發送雨天推播",
+    "明天發送雨天推播",
+    "下午三點發送雨天推播",
+    "一小時後發送雨天推播",
+    "發送雨天推播的時間",
+]
+
+COMMANDS = ["發送雨天推播", "請幫我發送颱風通知", "再發雨天推播", "發送高溫推播到大里區"]
+
+
+def _handle(text: str) -> list[str]:
+    called = []
+
+    async def call_tool(name, args):
+        called.append(name)
+        return {"status": "sent"}
+
+    asyncio.run(router.handle(text, call_tool))
+    return called
+
+
+@pytest.mark.parametrize("text", NOT_COMMANDS)
+def test_non_command_never_pushes(text):
+    assert "push_message" not in _handle(text)
+
+
+@pytest.mark.parametrize("text", COMMANDS)
+def test_bare_command_pushes(text):
+    assert _handle(text) == ["push_message"]